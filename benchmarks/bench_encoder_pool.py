@@ -0,0 +1,83 @@
+"""
+Бенчмарк на EncoderPool от encoder_pool.py срещу кодиране в нишки на основния процес.
+
+N записа с прекодиране (RecordingWorker) получават по 15 кадъра 720p в секунда в реално
+време. За всеки вариант се показва какъв дял от подадените кадри е записан, колко са
+изпуснати, средното време за кодиране на кадър и колко CPU е използвал основният процес
+(при пула кодирането е в отделните процеси и не влиза в това число).
+
+Пускане:  python benchmarks/bench_encoder_pool.py [--seconds N] [--processes N]
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QCoreApplication
+
+from encoder_pool import EncoderPool, default_process_count
+from video_worker import RecordingWorker
+
+FRAME_SHAPE = (720, 1280, 3)
+FPS = 15
+
+
+def make_frames(rng, count=30):
+    # Движещ се шум, за да не е тривиално за кодера.
+    base = cv2.GaussianBlur(rng.integers(0, 255, (FRAME_SHAPE[0], FRAME_SHAPE[1] * 2, 3), dtype=np.uint8), (0, 0), 2)
+    return [np.ascontiguousarray(base[:, i * 8:i * 8 + FRAME_SHAPE[1]]) for i in range(count)]
+
+
+def bench(recordings, pool, seconds, frames, folder):
+    workers = [RecordingWorker(str(folder / f"rec_{i}.mp4"), FPS, encoder_pool=pool) for i in range(recordings)]
+    for worker in workers:
+        worker.start()
+    cpu_started, started = time.process_time(), time.perf_counter()
+    offered = 0
+    while time.perf_counter() - started < seconds:
+        now = time.time()
+        for worker in workers:
+            worker.add_frame(frames[offered % len(frames)], now)
+        offered += 1
+        time.sleep(max(0.0, started + offered / FPS - time.perf_counter()))
+    stats = [worker.stats() for worker in workers]
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.wait()
+    cpu = (time.process_time() - cpu_started) / (time.perf_counter() - started) * 100
+    dropped = sum(s["dropped"] for s in stats)
+    encode_ms = sum(s["encode_ms"] for s in stats) / len(stats)
+    return 100 - 100 * dropped / (offered * recordings), dropped, encode_ms, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10, help="продължителност на всяко пускане")
+    parser.add_argument("--processes", type=int, default=default_process_count(), help="процеси в пула")
+    args = parser.parse_args()
+
+    QCoreApplication([])
+    frames = make_frames(np.random.default_rng(0))
+    folder = Path(tempfile.mkdtemp())
+    pool = EncoderPool(args.processes)
+    pool.start()
+    try:
+        print(f"{'записи':>6} {'кодиране':>12} {'записани %':>11} {'изпуснати':>10} {'ms/кадър':>9} {'CPU % осн.':>11}")
+        for recordings in (1, 4, 8):
+            for label, encoder_pool in (("нишки", None), (f"пул x{args.processes}", pool)):
+                kept, dropped, encode_ms, cpu = bench(recordings, encoder_pool, args.seconds, frames, folder)
+                print(f"{recordings:>6} {label:>12} {kept:>11.1f} {dropped:>10} {encode_ms:>9.1f} {cpu:>11.0f}")
+    finally:
+        pool.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Бенчмарк на детекторите на движение от motion_detection.py.
+
+Сравнява досегашната обработка в VideoWorker (преоразмеряване до 1280x720 и разлика
+между кадрите с праг 500/4 пиксела) с новите детектори върху синтетична 1080p сцена:
+
+  ms/кадър     - средно време за един анализиран кадър
+  фалшиви %    - дял на кадрите със засечено движение при неподвижна сцена с шум на сензора
+  осветление % - дял на кадрите със засечено движение при плавна и рязка смяна на осветлението
+  движение %   - дял на засечените кадри, в които през сцената минава обект
+
+Втората таблица сравнява BackgroundModelDetector във всеки worker поотделно с общия
+BatchMotionAnalyzer при 4-64 камери. Кадрите са вече с размера на анализа (320x180), за да се
+мери самият анализ, а не общото за двата пътя намаляване на кадъра.
+
+Третата таблица показва цената на зоните на движение: маските се растеризират веднъж,
+затова времето на кадър зависи от броя зони, но не и от броя върхове на многоъгълниците.
+
+Пускане:  python benchmarks/bench_motion_detectors.py [--frames N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from motion_detection import BackgroundModelDetector, BatchMotionAnalyzer, FrameDiffDetector, Mog2Detector
+
+FRAME_SHAPE = (1080, 1920, 3)
+
+
+class LegacyDetector:
+    """Обработката на VideoWorker.handle_motion_detection преди отделянето на детекторите."""
+    def __init__(self):
+        self._prev_frame_gray = None
+
+    def detect(self, frame):
+        processed_frame = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2GRAY)
+        is_motion = False
+        if self._prev_frame_gray is not None:
+            frame_delta = cv2.absdiff(self._prev_frame_gray, gray)
+            thresh = cv2.threshold(frame_delta, 30, 255, cv2.THRESH_BINARY)[1]
+            is_motion = cv2.countNonZero(thresh) > 500 / 4
+        self._prev_frame_gray = gray
+        return is_motion, 0.0
+
+
+def make_scene(rng):
+    """Неподвижна сцена с плавни градиенти и няколко контрастни правоъгълника."""
+    h, w = FRAME_SHAPE[:2]
+    x = np.linspace(0, 1, w, dtype=np.float32)
+    y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+    base = (60 + 120 * x * (1 - y) + 40 * y).astype(np.float32)
+    scene = np.dstack([base, base * 0.9, base * 0.8])
+    for _ in range(12):
+        x0, y0 = rng.integers(0, w - 200), rng.integers(0, h - 200)
+        scene[y0:y0 + rng.integers(40, 200), x0:x0 + rng.integers(40, 200)] = rng.integers(0, 255, 3)
+    return scene
+
+
+def render(scene, rng, noise, gain=1.0, obj_x=None):
+    frame = scene * gain + rng.normal(0, noise, FRAME_SHAPE).astype(np.float32)
+    if obj_x is not None:
+        frame[500:700, obj_x:obj_x + 120] = (30, 200, 40)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_sequences(frames, rng):
+    scene = make_scene(rng)
+    static = [render(scene, rng, noise=6) for _ in range(frames)]
+    lighting = [render(scene, rng, noise=6, gain=1.0 + 0.4 * i / frames + (0.25 if i >= frames // 2 else 0))
+                for i in range(frames)]
+    moving = [render(scene, rng, noise=6, obj_x=int(100 + i * (1600 / frames))) for i in range(frames)]
+    return scene, static, lighting, moving
+
+
+def detection_rate(detector, warmup, sequence):
+    for frame in warmup:
+        detector.detect(frame)
+    hits = sum(1 for frame in sequence if detector.detect(frame)[0])
+    return 100.0 * hits / len(sequence)
+
+
+class BenchClient:
+    """Заместител на VideoWorker за BatchMotionAnalyzer."""
+    def __init__(self, cam_id):
+        self.cam_id = cam_id
+        self.motion_detector = BackgroundModelDetector()
+        self.last_score = 0.0
+
+    def report_motion(self, score, zone="", timestamp=None):
+        self.last_score = score
+
+
+def bench_batched(cameras, frames):
+    rounds = len(frames)
+    detectors = [BackgroundModelDetector() for _ in range(cameras)]
+    clients = [BenchClient(f"cam{i}") for i in range(cameras)]
+    analyzer = BatchMotionAnalyzer()
+
+    started = time.perf_counter()
+    for n in range(rounds):
+        separate = [detector.score(frames[n]) for detector in detectors]
+    separate_ms = (time.perf_counter() - started) * 1000 / rounds
+
+    started = time.perf_counter()
+    for n in range(rounds):
+        for client in clients:
+            analyzer.submit(client, client.motion_detector.prepare(frames[n]))
+        batched = analyzer.analyze_pending()
+    batched_ms = (time.perf_counter() - started) * 1000 / rounds
+
+    difference = max(abs(batched[c.cam_id] - s) for c, s in zip(clients, separate))
+    return separate_ms, batched_ms, difference
+
+
+def make_zones(count, vertices, rng):
+    """count включващи зони с по vertices върха и една изключваща зона."""
+    zones = [{"name": "изключена", "type": "exclude", "points": [[0.0, 0.0], [0.3, 0.0], [0.3, 0.2], [0.0, 0.2]]}]
+    for i in range(count):
+        cx, cy = rng.uniform(0.2, 0.8, 2)
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+        radius = rng.uniform(0.08, 0.25)
+        points = np.stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)], axis=1).clip(0, 1)
+        zones.append({"name": f"зона {i + 1}", "type": "include", "points": points.tolist()})
+    return zones
+
+
+def bench_zones(zones, warmup, sequence):
+    detector = BackgroundModelDetector(zones=zones)
+    for frame in warmup:
+        detector.detect(frame)
+    started = time.perf_counter()
+    for frame in sequence:
+        detector.detect(frame)
+    return (time.perf_counter() - started) * 1000 / len(sequence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=40, help="кадри във всяка последователност")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scene, static, lighting, moving = make_sequences(args.frames, rng)
+    warmup = [render(scene, rng, noise=6) for _ in range(10)]
+
+    detectors = (
+        ("стар (1280x720)", LegacyDetector),
+        ("FrameDiff", FrameDiffDetector),
+        ("Background 320", BackgroundModelDetector),
+        ("MOG2 320", Mog2Detector),
+    )
+    print(f"{'детектор':>16} {'ms/кадър':>9} {'фалшиви %':>10} {'осветление %':>13} {'движение %':>11}")
+    for name, detector_cls in detectors:
+        detector = detector_cls()
+        for frame in warmup:
+            detector.detect(frame)
+        started = time.perf_counter()
+        for frame in static:
+            detector.detect(frame)
+        ms = (time.perf_counter() - started) * 1000 / len(static)
+
+        false_rate = detection_rate(detector_cls(), warmup, static)
+        lighting_rate = detection_rate(detector_cls(), warmup, lighting)
+        moving_rate = detection_rate(detector_cls(), warmup, moving)
+        print(f"{name:>16} {ms:>9.2f} {false_rate:>10.0f} {lighting_rate:>13.0f} {moving_rate:>11.0f}")
+
+    print()
+    print(f"{'камери':>6} {'поотделно ms':>13} {'общо ms':>8} {'разлика в оценката':>19}")
+    small_frames = [cv2.resize(frame, (320, 180), interpolation=cv2.INTER_AREA) for frame in warmup + moving]
+    for cameras in (4, 16, 32, 64):
+        separate_ms, batched_ms, difference = bench_batched(cameras, small_frames)
+        print(f"{cameras:>6} {separate_ms:>13.2f} {batched_ms:>8.2f} {difference:>19.4f}")
+
+    print()
+    print(f"{'зони':>5} {'върха':>6} {'ms/кадър':>9}")
+    print(f"{0:>5} {'-':>6} {bench_zones([], warmup, moving):>9.2f}")
+    for count in (1, 4, 16):
+        for vertices in (4, 64):
+            ms = bench_zones(make_zones(count, vertices, rng), warmup, moving)
+            print(f"{count:>5} {vertices:>6} {ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
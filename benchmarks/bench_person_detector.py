@@ -0,0 +1,105 @@
+"""
+Бенчмарк на PersonDetectorPool от person_detection.py.
+
+Първата таблица е времето на една HOG проверка на 1080p кадър при различна ширина на
+анализа. Втората пуска пула с 2 нишки срещу N камери, всяка от които съобщава движение
+4 пъти в секунда, и показва колко проверки в секунда са направени, колко заявки са
+отхвърлени и какъв дял от едно ядро е използван - с бюджет 4/s и без ограничение.
+Бюджетът ограничава броя проверки, а не процесора: натоварването е приблизително
+бюджет x времето за проверка от първата таблица.
+
+Пускане:  python benchmarks/bench_person_detector.py [--seconds N]
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from person_detection import PERSON_DETECTION_ENABLED, PersonDetectorPool
+
+FRAME_SHAPE = (1080, 1920, 3)
+
+
+def make_frame(rng):
+    frame = rng.integers(40, 200, FRAME_SHAPE, dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (0, 0), 3)
+
+
+class BenchClient:
+    """Заместител на VideoWorker: връща копие на кадъра като get_latest_frame()."""
+    def __init__(self, cam_id, frame):
+        self.cam_id = cam_id
+        self.frame = frame
+        self.persons = 0
+
+    def get_latest_frame(self):
+        return self.frame.copy()
+
+    def report_person(self, count):
+        self.persons += count
+
+
+def bench_single(frame, width):
+    pool = PersonDetectorPool(width=width)
+    hog = cv2.HOGDescriptor()
+    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    pool.detect(hog, frame)
+    started = time.perf_counter()
+    for _ in range(5):
+        pool.detect(hog, frame)
+    return (time.perf_counter() - started) * 1000 / 5
+
+
+def bench_pool(cameras, budget, seconds, frame):
+    pool = PersonDetectorPool(workers=2, budget_per_second=budget)
+    clients = [BenchClient(f"cam{i}", frame) for i in range(cameras)]
+    pool.start()
+    stop = threading.Event()
+
+    def report_motion():
+        while not stop.is_set():
+            for client in clients:
+                pool.submit(client)
+            time.sleep(0.25)
+
+    submitter = threading.Thread(target=report_motion, daemon=True)
+    cpu_started, started = time.process_time(), time.perf_counter()
+    submitter.start()
+    time.sleep(seconds)
+    stop.set()
+    pool.stop()
+    elapsed = time.perf_counter() - started
+    cpu = (time.process_time() - cpu_started) / elapsed * 100
+    submitted = pool.processed + pool.dropped
+    return pool.processed / elapsed, 100 * pool.dropped / max(1, submitted), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5, help="продължителност на всяко пускане на пула")
+    args = parser.parse_args()
+    if not PERSON_DETECTION_ENABLED:
+        sys.exit(f"OpenCV {cv2.__version__} няма HOGDescriptor - проверката за хора не е налична.")
+
+    frame = make_frame(np.random.default_rng(0))
+    print(f"{'ширина':>7} {'ms/проверка':>12}")
+    for width in (480, 640, 800):
+        print(f"{width:>7} {bench_single(frame, width):>12.1f}")
+
+    print()
+    print(f"{'камери':>6} {'бюджет':>7} {'проверки/s':>11} {'отхвърлени %':>13} {'CPU % ядро':>11}")
+    for cameras in (1, 4, 16, 64):
+        for budget in (4, 1000):
+            rate, dropped, cpu = bench_pool(cameras, budget, args.seconds, frame)
+            label = "4/s" if budget == 4 else "без"
+            print(f"{cameras:>6} {label:>7} {rate:>11.1f} {dropped:>13.0f} {cpu:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Бенчмарк на TamperDetector от tamper_detection.py върху синтетична 1080p сцена.
+
+За всеки случай детекторът първо вижда нормалната сцена, а после 4 проверки с
+променената картина. Таблицата показва съобщеното състояние и времето за проверка;
+разходът на камера е времето за проверка спрямо интервала между проверките (3 s).
+
+Пускане:  python benchmarks/bench_tamper_detection.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from tamper_detection import TamperDetector
+
+FRAME_SHAPE = (1080, 1920, 3)
+
+
+def make_scene(rng):
+    h, w = FRAME_SHAPE[:2]
+    x = np.linspace(0, 1, w, dtype=np.float32)
+    y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+    base = (60 + 120 * x * (1 - y) + 40 * y).astype(np.float32)
+    scene = np.dstack([base, base * 0.9, base * 0.8])
+    for _ in range(40):
+        x0, y0 = rng.integers(0, w - 200), rng.integers(0, h - 200)
+        scene[y0:y0 + rng.integers(20, 200), x0:x0 + rng.integers(20, 200)] = rng.integers(0, 255, 3)
+    return scene
+
+
+def render(scene, rng):
+    return np.clip(scene + rng.normal(0, 4, FRAME_SHAPE).astype(np.float32), 0, 255).astype(np.uint8)
+
+
+def make_cases(scene, rng):
+    normal = render(scene, rng)
+    passing = normal.copy()
+    passing[300:900, 700:1100] = (40, 60, 200)
+    covered = np.clip(np.full(FRAME_SHAPE, 170, np.float32) + rng.normal(0, 2, FRAME_SHAPE), 0, 255).astype(np.uint8)
+    return (
+        ("нормална", normal),
+        ("минаващ обект", passing),
+        ("черна картина", np.clip(rng.normal(4, 2, FRAME_SHAPE), 0, 255).astype(np.uint8)),
+        ("покрита", covered),
+        ("размазан фокус", cv2.GaussianBlur(normal, (0, 0), 12)),
+        ("преместена", np.ascontiguousarray(np.roll(normal[:, ::-1], 400, axis=1))),
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    scene = make_scene(rng)
+    warmup = [render(scene, rng) for _ in range(5)]
+
+    print(f"{'случай':>16} {'съобщено':>14} {'ms/проверка':>12} {'разход %':>9}")
+    for name, frame in make_cases(scene, rng):
+        detector = TamperDetector()
+        now = 0.0
+        for normal in warmup:
+            detector.check(normal, now)
+            now += detector.interval
+        detector.cpu_seconds, detector.checks = 0.0, 0
+        reported = None
+        for _ in range(4):
+            result = detector.check(frame, now)
+            now += detector.interval
+            if result is not None:
+                reported = result
+        ms = detector.cpu_seconds * 1000 / detector.checks
+        overhead = detector.cpu_seconds / (detector.checks * detector.interval) * 100
+        print(f"{name:>16} {reported or '-':>14} {ms:>12.2f} {overhead:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
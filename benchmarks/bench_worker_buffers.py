@@ -0,0 +1,151 @@
+"""
+Микро-бенчмарк за заделянето на памет в горещия цикъл на VideoWorker.
+
+Сравнява стария път (нов масив от всяко извикване на OpenCV) с работните буфери
+на VideoWorker при 4/16/32 симулирани камери с 1080p кадри.
+
+  временни KB/кадър - памет, заделена и освободена в рамките на един кадър (tracemalloc)
+  задържани MB      - буфери, които остават заделени между кадрите
+  faults/кадър      - minor page faults, т.е. нови страници, поискани от ОС
+  GC / GC ms        - брой и продължителност на събиранията на боклука
+
+QImage, който се предава на GUI нишката, се заделя от Qt и не се вижда от tracemalloc;
+той остава единственото заделяне на кадър в новия път и личи в колоната faults.
+
+Пускане:  python benchmarks/bench_worker_buffers.py [--frames N]
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+from PySide6.QtGui import QImage
+
+from video_worker import VideoWorker
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FRAME_SHAPE = (1080, 1920, 3)
+TILE_SIZE = (640, 360)
+
+
+class LegacyPipeline:
+    """Старата обработка: всяко извикване връща нов масив."""
+    def __init__(self):
+        self._prev_frame_gray = None
+        self._frame_counter = 0
+
+    def process(self, frame):
+        display_frame = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
+        self._frame_counter += 1
+        if self._frame_counter % 3 == 0:
+            gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
+            if self._prev_frame_gray is not None:
+                frame_delta = cv2.absdiff(self._prev_frame_gray, gray)
+                thresh = cv2.threshold(frame_delta, 30, 255, cv2.THRESH_BINARY)[1]
+                cv2.countNonZero(thresh)
+            self._prev_frame_gray = gray
+        display_frame = cv2.resize(display_frame, TILE_SIZE, interpolation=cv2.INTER_AREA)
+        rgb_image = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
+        h, w, ch = rgb_image.shape
+        QImage(rgb_image.data, w, h, ch * w, QImage.Format.Format_RGB888)
+
+    def retained_bytes(self):
+        return self._prev_frame_gray.nbytes if self._prev_frame_gray is not None else 0
+
+
+class WorkerPipeline:
+    """Текущата обработка на VideoWorker, без да се стартират нишките му."""
+    def __init__(self, index):
+        self.worker = VideoWorker({"id": f"bench{index}", "name": f"Bench {index}", "rtsp_url": ""})
+        self.worker.set_display_size(TILE_SIZE)
+
+    def process(self, frame):
+        self.worker._process_frame(frame, time.time())
+
+    def retained_bytes(self):
+        return self.worker.motion_detector.buffer_bytes()
+
+
+def page_faults():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+
+
+def run(pipeline_cls, cameras, frames):
+    rng = np.random.default_rng(0)
+    sources = [rng.integers(0, 255, FRAME_SHAPE, dtype=np.uint8) for _ in range(2)]
+    pipelines = [pipeline_cls(i) if pipeline_cls is WorkerPipeline else pipeline_cls() for i in range(cameras)]
+
+    gc_runs = [0]
+    gc_time = [0.0]
+    gc_started = [0.0]
+
+    def on_gc(phase, info):
+        if phase == "start":
+            gc_started[0] = time.perf_counter()
+        else:
+            gc_runs[0] += 1
+            gc_time[0] += time.perf_counter() - gc_started[0]
+
+    # Загряване: работните буфери на детекцията на движение се заделят при първите анализирани кадри.
+    for n in range(6):
+        for pipeline in pipelines:
+            pipeline.process(sources[n % 2])
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    tracemalloc.start()
+    temporary = 0
+    elapsed = 0.0
+    faults_before = page_faults()
+    for n in range(frames):
+        frame = sources[n % 2]
+        for pipeline in pipelines:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            started = time.perf_counter()
+            pipeline.process(frame)
+            elapsed += time.perf_counter() - started
+            temporary += tracemalloc.get_traced_memory()[1] - current
+    faults = page_faults() - faults_before
+    tracemalloc.stop()
+    gc.callbacks.remove(on_gc)
+
+    total_frames = frames * cameras
+    return {
+        "ms_per_frame": elapsed * 1000 / total_frames,
+        "temp_kb": temporary / total_frames / 1024,
+        "retained_mb": sum(p.retained_bytes() for p in pipelines) / (1024 ** 2),
+        "faults_per_frame": faults / total_frames,
+        "gc_runs": gc_runs[0],
+        "gc_ms": gc_time[0] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=15, help="кадри на камера")
+    args = parser.parse_args()
+
+    print(f"{'камери':>6} {'път':>8} {'ms/кадър':>9} {'временни KB/кадър':>18} {'задържани MB':>13} "
+          f"{'faults/кадър':>13} {'GC':>4} {'GC ms':>7}")
+    for cameras in (4, 16, 32):
+        for name, pipeline_cls in (("стар", LegacyPipeline), ("буфери", WorkerPipeline)):
+            r = run(pipeline_cls, cameras, args.frames)
+            print(f"{cameras:>6} {name:>8} {r['ms_per_frame']:>9.2f} {r['temp_kb']:>18.0f} {r['retained_mb']:>13.1f} "
+                  f"{r['faults_per_frame']:>13.1f} {r['gc_runs']:>4} {r['gc_ms']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
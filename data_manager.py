@@ -1,7 +1,10 @@
 import json
+import threading
 from pathlib import Path
 
 DATA_DIR = Path(__file__).parent / "data"
+# Индексът на сегментите се допълва от нишките на записите.
+_segments_lock = threading.Lock()
 
 class Translator:
     def __init__(self):
@@ -95,6 +98,58 @@ class DataManager:
         events_file = DATA_DIR / "events.json"
         with open(events_file, "w", encoding="utf-8") as f:
             json.dump(events_data, f, indent=4, ensure_ascii=False)
+
+    @staticmethod
+    def append_events(new_events):
+        """Добавя няколко събития в началото на events.json с едно записване на файла."""
+        if not new_events:
+            return
+        all_events = DataManager.load_events()
+        all_events[:0] = new_events
+        DataManager.save_events(all_events)
+
+    @staticmethod
+    def load_segments():
+        """
+        Индексът на сегментите от записите по график (segments.jsonl) като списък, подреден
+        по начало. Всеки ред е JSON обект; ред със същия file_path допълва предишния
+        (напр. добавя края), така че файлът само се допълва и при срив губи най-много един ред.
+        """
+        with _segments_lock:
+            return DataManager._read_segments()
+
+    @staticmethod
+    def _read_segments():
+        segments = {}
+        try:
+            with open(DATA_DIR / "segments.jsonl", "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    segments.setdefault(record.get("file_path"), {}).update(record)
+        except FileNotFoundError:
+            return []
+        return sorted(segments.values(), key=lambda s: s.get("start") or 0)
+
+    @staticmethod
+    def append_segment(segment):
+        DATA_DIR.mkdir(exist_ok=True)
+        with _segments_lock, open(DATA_DIR / "segments.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(segment, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def remove_segments(file_paths):
+        """Премахва сегментите с тези файлове от индекса, като го записва наново без тях."""
+        file_paths = set(file_paths)
+        if not file_paths:
+            return
+        with _segments_lock:
+            remaining = [s for s in DataManager._read_segments() if s.get("file_path") not in file_paths]
+            with open(DATA_DIR / "segments.jsonl", "w", encoding="utf-8") as f:
+                for segment in remaining:
+                    f.write(json.dumps(segment, ensure_ascii=False) + "\n")
             
     @staticmethod
     def load_settings():
@@ -105,7 +160,21 @@ class DataManager:
             "default_grid": "2x2",
             "recording_path": str(Path.home() / "Videos" / "TSA-Security"),
             "language": "bg",
-            "recording_structure": "single"
+            "recording_structure": "single",
+            "live_renderer": "widgets",
+            "display_fps": 0,
+            "recording_backend": "remux",
+            "preroll_seconds": 5,
+            "preroll_memory_mb": 256,
+            "batched_motion_analysis": True,
+            "adaptive_recording": False,
+            "adaptive_idle_fps": 1,
+            "adaptive_idle_scale": 50,
+            "person_detection": False,
+            "person_detection_budget": 4,
+            "segment_minutes": 15,
+            "encoder_pool": True,
+            "recording_volumes": []
         }
         if not settings_file.exists():
             return defaults
@@ -0,0 +1,266 @@
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import cv2
+import numpy as np
+
+from storage_io import get_storage_io
+from video_timing import open_video_writer
+
+
+def default_process_count():
+    """Половината ядра (поне 1, най-много 4) - другата половина остава за приемането на кадри и интерфейса."""
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+def _encoder_main(pipe):
+    """
+    Цикълът на един процес за кодиране. Кадрите са в споделената памет на всеки запис;
+    по канала идват само команди ("open", "frame", "close", "io_stats") и се връщат освободените
+    слотове. Файловете се пишат от собствения storage_io слой на процеса.
+    """
+    writers = {}
+    while True:
+        try:
+            command = pipe.recv()
+        except EOFError:
+            break
+        if command is None:
+            break
+        kind, writer_id = command[0], command[1]
+        if kind == "open":
+            _, _, shm_name, filename, fps, size, start_time, slots, fsync = command
+            try:
+                shm = shared_memory.SharedMemory(name=shm_name)
+                frames = np.ndarray((slots, size[1], size[0], 3), dtype=np.uint8, buffer=shm.buf)
+                writer = open_video_writer(filename, fps, size, start_time, fsync)
+            except (OSError, ValueError, cv2.error) as e:
+                print(f"Процесът за кодиране не може да отвори {filename}: {e}")
+                pipe.send(("opened", writer_id, False))
+                continue
+            writers[writer_id] = (writer, shm, frames)
+            pipe.send(("opened", writer_id, writer.isOpened()))
+        elif kind == "frame":
+            _, _, slot, timestamp = command
+            if writer_id not in writers:
+                # Файлът не се е отворил - слотът се връща, а записът се маркира като затворен.
+                pipe.send(("done", writer_id, slot, 0.0, False))
+                continue
+            writer, _, frames = writers[writer_id]
+            started = time.perf_counter()
+            try:
+                writer.write(frames[slot], timestamp)
+            except (cv2.error, ValueError) as e:
+                print(f"Грешка при запис на кадър: {e}")
+            pipe.send(("done", writer_id, slot, (time.perf_counter() - started) * 1000, writer.isOpened()))
+        elif kind == "close":
+            item = writers.pop(writer_id, None)
+            if item is not None:
+                writer, shm, frames = item
+                writer.release()
+                del frames
+                shm.close()
+            pipe.send(("closed", writer_id))
+        elif kind == "io_stats":
+            pipe.send(("io_stats", writer_id, get_storage_io().stats()))
+    for writer, shm, frames in writers.values():
+        writer.release()
+        del frames
+        shm.close()
+    get_storage_io().stop()
+
+
+class EncoderPool:
+    """
+    Общ пул от процеси за кодиране на записите с прекодиране, за да не се борят кодерите с
+    приемането на кадри и интерфейса за GIL и ядрата на основния процес. Всеки запис получава
+    PooledVideoWriter с няколко слота за кадри в споделена памет: кадърът се копира в свободен
+    слот, а до процеса отива само номерът му. Записите се разпределят към процеса с най-малко записи.
+    """
+    def __init__(self, processes=None):
+        self.process_count = processes or default_process_count()
+        # spawn и под Linux: fork от процес с Qt и работещи нишки не е безопасен.
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._writers = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def start(self):
+        for _ in range(self.process_count):
+            pipe, child_pipe = self._context.Pipe()
+            process = self._context.Process(target=_encoder_main, args=(child_pipe,), daemon=True)
+            process.start()
+            child_pipe.close()
+            self._processes.append({"process": process, "pipe": pipe, "send_lock": threading.Lock(), "writers": 0,
+                                    "io_stats": {}})
+        self._listener = threading.Thread(target=self._dispatch_results, daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        """Спира процесите, след като довършат вече изпратените кадри (записите трябва да са затворени)."""
+        for item in self._processes:
+            self._send(item, None)
+        for item in self._processes:
+            item["process"].join(timeout=10)
+            if item["process"].is_alive():
+                item["process"].terminate()
+        # Слушащата нишка спира сама, щом процесите затворят каналите си.
+        self._listener.join(timeout=1)
+        for item in self._processes:
+            item["pipe"].close()
+        self._processes = []
+
+    def open_writer(self, filename, fps, size, start_time, fsync=None):
+        """Записващ обект с интерфейса на open_video_writer(), който кодира в процес от пула."""
+        with self._lock:
+            self._next_id += 1
+            item = min(self._processes, key=lambda p: p["writers"])
+            item["writers"] += 1
+            writer = PooledVideoWriter(self, item, self._next_id, filename, fps, size, start_time)
+            self._writers[writer.writer_id] = writer
+        self._send(item, ("open", writer.writer_id, writer.shm_name, filename, fps, size, start_time, writer.slots,
+                          fsync))
+        return writer
+
+    def _send(self, item, command):
+        # В канала пишат нишките на няколко записа.
+        with item["send_lock"]:
+            try:
+                item["pipe"].send(command)
+            except OSError as e:
+                print(f"Процесът за кодиране не е достъпен: {e}")
+
+    def _forget(self, writer):
+        with self._lock:
+            if self._writers.pop(writer.writer_id, None) is not None:
+                writer.process_item["writers"] -= 1
+
+    def stats(self):
+        """{файл: статистика} за отворените записи (виж PooledVideoWriter.stats)."""
+        with self._lock:
+            writers = list(self._writers.values())
+        return {writer.filename: writer.stats() for writer in writers}
+
+    def io_stats(self):
+        """
+        Статистиката на storage_io по дискове за всеки процес ({"процес N: диск": статистика}).
+        Връща последно получените стойности и иска нови, така че са отпреди едно извикване.
+        """
+        stats = {}
+        for index, item in enumerate(self._processes):
+            self._send(item, ("io_stats", 0))
+            for disk, disk_stats in item["io_stats"].items():
+                stats[f"процес {index + 1}: {disk}"] = disk_stats
+        return stats
+
+    def _dispatch_results(self):
+        pipes = [item["pipe"] for item in self._processes]
+        while pipes:
+            for pipe in connection.wait(pipes):
+                try:
+                    message = pipe.recv()
+                except (EOFError, OSError):
+                    # Процесът е спрял; записите му забелязват това при следващия кадър.
+                    pipes.remove(pipe)
+                    continue
+                if message[0] == "io_stats":
+                    for item in self._processes:
+                        if item["pipe"] is pipe:
+                            item["io_stats"] = message[2]
+                    continue
+                with self._lock:
+                    writer = self._writers.get(message[1])
+                if writer is not None:
+                    writer._on_result(message)
+
+
+class PooledVideoWriter:
+    """
+    Запис от EncoderPool. write() блокира, докато се освободи слот: така изоставащият процес
+    забавя нишката на записа, нейната опашка се пълни и новите кадри се изпускват там.
+    """
+    SLOTS = 4
+    # Ако процесът не върне слот за толкова секунди, се проверява дали още работи.
+    SLOT_TIMEOUT = 5.0
+
+    def __init__(self, pool, process_item, writer_id, filename, fps, size, start_time):
+        self._pool = pool
+        self.process_item = process_item
+        self.writer_id = writer_id
+        self.filename = filename
+        self.size = size
+        self.slots = self.SLOTS
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * size[0] * size[1] * 3)
+        self.shm_name = self._shm.name
+        self._frames = np.ndarray((self.slots, size[1], size[0], 3), dtype=np.uint8, buffer=self._shm.buf)
+        self._free = list(range(self.slots))
+        self._condition = threading.Condition()
+        self._is_open = True
+        self._closed = False
+        self.encode_ms = 0.0
+        self.written = 0
+
+    def isOpened(self):
+        return self._is_open
+
+    @property
+    def pending(self):
+        """Кадри, изпратени на процеса и още некодирани."""
+        with self._condition:
+            return self.slots - len(self._free)
+
+    def stats(self):
+        return {"queue_depth": self.pending, "encode_ms": round(self.encode_ms, 1), "written": self.written}
+
+    def write(self, frame, timestamp):
+        slot = self._take_slot()
+        if slot is None:
+            return False
+        target = self._frames[slot]
+        if frame.shape == target.shape:
+            np.copyto(target, frame)
+        else:
+            cv2.resize(frame, self.size, dst=target, interpolation=cv2.INTER_LINEAR)
+        self._pool._send(self.process_item, ("frame", self.writer_id, slot, timestamp))
+        return True
+
+    def _take_slot(self):
+        with self._condition:
+            while self._is_open and not self._free:
+                if not self._condition.wait(self.SLOT_TIMEOUT) and not self.process_item["process"].is_alive():
+                    print(f"Процесът за кодиране на {self.filename} е спрял.")
+                    self._is_open = False
+            return self._free.pop() if self._is_open else None
+
+    def release(self):
+        if self.process_item["process"].is_alive():
+            self._pool._send(self.process_item, ("close", self.writer_id))
+            with self._condition:
+                # Процесът довършва изпратените кадри и затваря файла.
+                deadline = time.monotonic() + 30
+                while not self._closed and time.monotonic() < deadline and self.process_item["process"].is_alive():
+                    self._condition.wait(1.0)
+        self._pool._forget(self)
+        del self._frames
+        self._shm.close()
+        self._shm.unlink()
+
+    def _on_result(self, message):
+        kind = message[0]
+        with self._condition:
+            if kind == "opened":
+                self._is_open = self._is_open and message[2]
+            elif kind == "done":
+                _, _, slot, encode_ms, is_open = message
+                self._free.append(slot)
+                self.written += 1
+                self.encode_ms = encode_ms if self.written == 1 else 0.9 * self.encode_ms + 0.1 * encode_ms
+                self._is_open = self._is_open and is_open
+            elif kind == "closed":
+                self._closed = True
+            self._condition.notify_all()
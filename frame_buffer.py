@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """
+    Малък пръстен от кадри за една камера. Кадрите се публикуват по индекс, без копиране.
+    Четящите наемат слот, докато работят с него, и копират само ако им трябва стабилен кадър.
+    """
+    def __init__(self, slots=4):
+        self._frames = [None] * slots
+        self._seqs = [0] * slots
+        self._leases = [0] * slots
+        self._latest = -1
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def acquire_write_slot(self):
+        """
+        Връща (индекс, буфер) на най-стария свободен слот. Буферът може да се подаде на
+        cap.read(), за да се декодира направо в него; None е, докато слотът не е заделен.
+        Връща (-1, None), ако всички слотове са заети.
+        """
+        with self._lock:
+            best = -1
+            for i in range(len(self._frames)):
+                if self._leases[i] or i == self._latest:
+                    continue
+                if best < 0 or self._seqs[i] < self._seqs[best]:
+                    best = i
+            if best < 0:
+                return -1, None
+            # Слотът е невалиден, докато пишещият не го публикува отново.
+            self._seqs[best] = 0
+            return best, self._frames[best]
+
+    def publish(self, index, frame):
+        """Публикува кадъра в слота и връща поредния му номер."""
+        with self._lock:
+            self._frames[index] = frame
+            self._seqs[index] = self._next_seq
+            self._next_seq += 1
+            self._latest = index
+            return self._seqs[index]
+
+    def lease(self, index, seq):
+        """Наема слота, ако все още съдържа кадъра с този пореден номер."""
+        with self._lock:
+            if self._seqs[index] != seq:
+                return None
+            self._leases[index] += 1
+            return self._frames[index]
+
+    def lease_latest(self):
+        """Наема последния публикуван кадър. Връща (индекс, кадър) или (-1, None)."""
+        with self._lock:
+            index = self._latest
+            if index < 0 or not self._seqs[index]:
+                return -1, None
+            self._leases[index] += 1
+            return index, self._frames[index]
+
+    def release(self, index):
+        with self._lock:
+            if self._leases[index] > 0:
+                self._leases[index] -= 1
+
+    def copy_latest(self):
+        """Връща копие на последния кадър или None."""
+        index, frame = self.lease_latest()
+        if index < 0:
+            return None
+        try:
+            return frame.copy()
+        finally:
+            self.release(index)
+
+    @property
+    def latest_seq(self):
+        with self._lock:
+            return self._seqs[self._latest] if self._latest >= 0 else 0
+
+    def has_frame(self):
+        return self.latest_seq > 0
+
+
+class FrameMailbox:
+    """
+    Пощенска кутия "последният печели" за кадрите за показване. Worker-ите презаписват
+    слота на своята камера, а GUI нишката прибира всички слотове наведнъж, така че при
+    забавяне на GUI старите кадри се изхвърлят, вместо да се трупат в опашката на Qt.
+    """
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def post(self, key, item):
+        with self._lock:
+            if key in self._items:
+                self.dropped += 1
+            self._items[key] = item
+
+    def take_all(self):
+        """Връща {ключ: последен елемент} и изпразва кутията."""
+        with self._lock:
+            items, self._items = self._items, {}
+        return items
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class ScratchBuffers:
+    """
+    Работни буфери на една нишка, които се подават като dst= на OpenCV.
+    Заделят се наново само когато размерът на източника се промени.
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer
+
+
+class PreEventPool:
+    """
+    Общ бюджет памет за буферите преди събитие на всички камери. Когато бюджетът бъде
+    надхвърлен, се изхвърлят най-старите кадри от буфера, който заема най-много памет.
+    """
+    def __init__(self, seconds=5, budget_bytes=256 * 1024 ** 2, fps=5, max_width=1280, quality=80):
+        self.seconds = seconds
+        self.budget_bytes = budget_bytes
+        self.fps = fps
+        self.max_width = max_width
+        self.quality = quality
+        self._buffers = set()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def configure(self, seconds, budget_bytes):
+        self.seconds = seconds
+        self.budget_bytes = budget_bytes
+        with self._lock:
+            buffers = list(self._buffers)
+        for buffer in buffers:
+            buffer.trim()
+        # По-малък бюджет важи веднага, а не от следващия кадър.
+        with self._lock:
+            self._evict_locked()
+
+    def create_buffer(self):
+        buffer = PreEventBuffer(self)
+        with self._lock:
+            self._buffers.add(buffer)
+        return buffer
+
+    def remove_buffer(self, buffer):
+        with self._lock:
+            self._buffers.discard(buffer)
+            self._total -= buffer.nbytes
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def _adjust(self, buffer, delta):
+        # Редът на заключване е винаги пул -> буфер; буферът не вика пула, докато държи своето.
+        with self._lock:
+            if buffer not in self._buffers:
+                return
+            self._total += delta
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """Изхвърля най-старите кадри от най-големия буфер, докато общата памет влезе в бюджета."""
+        while self._total > self.budget_bytes and self._buffers:
+            victim = max(self._buffers, key=lambda b: b.nbytes)
+            freed = victim.drop_oldest()
+            if not freed:
+                break
+            self._total -= freed
+
+
+class PreEventBuffer:
+    """
+    Последните секунди от една камера като JPEG кадри с намален размер и честота.
+    Всеки нов запис започва с тях, за да се вижда и моментът преди задействането.
+    """
+    def __init__(self, pool):
+        self._pool = pool
+        self._entries = deque()
+        self._lock = threading.Lock()
+        self._last_added = 0.0
+        self._scratch = ScratchBuffers()
+        self.nbytes = 0
+
+    @property
+    def fps(self):
+        return self._pool.fps
+
+    def add(self, frame, timestamp=None):
+        pool = self._pool
+        timestamp = time.time() if timestamp is None else timestamp
+        if pool.seconds <= 0 or timestamp - self._last_added < 1.0 / pool.fps:
+            return
+        self._last_added = timestamp
+        h, w = frame.shape[:2]
+        if w > pool.max_width:
+            size = (pool.max_width, max(1, h * pool.max_width // w))
+            frame = cv2.resize(frame, size, dst=self._scratch.get("small", (size[1], size[0], 3)),
+                               interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, pool.quality])
+        if not ok:
+            return
+        data = encoded.tobytes()
+        with self._lock:
+            self._entries.append((timestamp, data))
+            self.nbytes += len(data)
+            freed = self._trim_locked(timestamp)
+        self._pool._adjust(self, len(data) - freed)
+
+    def _trim_locked(self, now):
+        freed = 0
+        limit = now - self._pool.seconds
+        while self._entries and self._entries[0][0] < limit:
+            freed += len(self._entries.popleft()[1])
+        self.nbytes -= freed
+        return freed
+
+    def trim(self):
+        with self._lock:
+            freed = self._trim_locked(time.time())
+        self._pool._adjust(self, -freed)
+
+    def drop_oldest(self):
+        """Изхвърля най-стария кадър и връща освободените байтове (извиква се от пула)."""
+        with self._lock:
+            if not self._entries:
+                return 0
+            freed = len(self._entries.popleft()[1])
+            self.nbytes -= freed
+            return freed
+
+    def snapshot(self):
+        """Връща списък (време, JPEG байтове) с кадрите в буфера, от най-стария."""
+        with self._lock:
+            return list(self._entries)
+
+
+def iter_pre_event_images(entries, size=None):
+    """Декодира кадрите от PreEventBuffer.snapshot() като (време, кадър), без повтаряне."""
+    for timestamp, data in entries:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        if size is not None and (image.shape[1], image.shape[0]) != size:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+        yield timestamp, image
@@ -0,0 +1,407 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_buffer import ScratchBuffers
+
+
+class MotionZones:
+    """
+    Зони на движение на камера (motion_zones в cameras.json): многоъгълници с име, тип
+    "include" или "exclude" и върхове в относителни координати 0-1.
+
+    Многоъгълниците се растеризират веднъж в маски с размера на анализа. Изключващите
+    зони се изрязват от всяка включваща зона, така че оценката на зона е едно bitwise_and
+    и един countNonZero, независимо от броя върхове. Ако няма включващи зони, целият кадър
+    без изключените части е една зона без име.
+    """
+    def __init__(self, zones=None):
+        self.zones = [zone for zone in zones or [] if len(zone.get("points", [])) >= 3]
+        self._size = None
+        self._masks = []
+        self._scratch = ScratchBuffers()
+
+    def __bool__(self):
+        return bool(self.zones)
+
+    def _polygon(self, zone, size):
+        w, h = size
+        points = np.array(zone["points"], dtype=np.float32) * (w - 1, h - 1)
+        return np.round(points).astype(np.int32)
+
+    def masks(self, size):
+        """[(име, маска 0/255, площ в пиксели)] за размер (w, h); пресмята се само при смяна на размера."""
+        if size == self._size:
+            return self._masks
+        w, h = size
+        allowed = np.full((h, w), 255, dtype=np.uint8)
+        excluded = [self._polygon(z, size) for z in self.zones if z.get("type") == "exclude"]
+        if excluded:
+            cv2.fillPoly(allowed, excluded, 0)
+        include = [z for z in self.zones if z.get("type") != "exclude"]
+        masks = []
+        if not include:
+            masks.append(("", allowed))
+        for zone in include:
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, [self._polygon(zone, size)], 255)
+            masks.append((zone.get("name", ""), cv2.bitwise_and(mask, allowed, dst=mask)))
+        self._masks = [(name, mask, cv2.countNonZero(mask)) for name, mask in masks if cv2.countNonZero(mask)]
+        self._size = size
+        return self._masks
+
+    def score(self, motion_mask):
+        """(оценка, име на зоната) за зоната с най-голям дял на движение спрямо площта ѝ."""
+        h, w = motion_mask.shape
+        best_score, best_name = 0.0, ""
+        masked = self._scratch.get("masked", (h, w))
+        for name, mask, area in self.masks((w, h)):
+            cv2.bitwise_and(motion_mask, mask, dst=masked)
+            score = cv2.countNonZero(masked) / area
+            if score > best_score:
+                best_score, best_name = score, name
+        return best_score, best_name
+
+
+class MotionDetector:
+    """
+    Базов клас за детекторите на движение. detect() получава BGR кадър и връща
+    (има ли движение, оценка, зона), където оценката е делът от площта на кадъра или
+    на зоната в движение, а зоната е името ѝ ("" за целия кадър).
+
+    Наследниците реализират _motion_mask(), която връща маската на движението с размера
+    на анализа или None, когато кадърът не се оценява (първи кадър, смяна на осветлението).
+    """
+    def __init__(self, sensitivity=50, zones=None):
+        self._scratch = ScratchBuffers()
+        self.zones = MotionZones(zones)
+        self.set_sensitivity(sensitivity)
+
+    def set_sensitivity(self, sensitivity):
+        """Чувствителност 1-100 в логаритмична скала: при 1 е нужно 2% от кадъра, при 50 - около 0.15%, при 100 - 0.01%."""
+        self.sensitivity = max(1, min(100, int(sensitivity)))
+        self.min_score = 0.02 * 0.005 ** ((self.sensitivity - 1) / 99)
+
+    def _motion_mask(self, frame):
+        raise NotImplementedError
+
+    def evaluate(self, frame):
+        """(оценка, зона) за кадъра."""
+        mask = self._motion_mask(frame)
+        if mask is None:
+            return 0.0, ""
+        return self.score_mask(mask)
+
+    def score_mask(self, mask):
+        """(оценка, зона) по готова маска на движението с размера на анализа."""
+        if self.zones:
+            return self.zones.score(mask)
+        return cv2.countNonZero(mask) / mask.size, ""
+
+    def score(self, frame):
+        return self.evaluate(frame)[0]
+
+    def detect(self, frame):
+        score, zone = self.evaluate(frame)
+        return score >= self.min_score, score, zone
+
+    def reset(self):
+        pass
+
+    def buffer_bytes(self):
+        return sum(buffer.nbytes for buffer in self._scratch._buffers.values())
+
+    def _analysis_size(self, frame, width):
+        src_h, src_w = frame.shape[:2]
+        width = min(width, src_w)
+        return width, max(1, round(width * src_h / src_w))
+
+    def _luma(self, frame, size):
+        """Намален сив кадър в работен буфер."""
+        w, h = size
+        small = cv2.resize(frame, size, dst=self._scratch.get("small", (h, w, 3)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._scratch.get("luma", (h, w)))
+
+
+class FrameDiffDetector(MotionDetector):
+    """Досегашният алгоритъм: разлика между два поредни сиви кадъра с прагов филтър."""
+    def __init__(self, sensitivity=50, zones=None, width=1280, threshold=30):
+        super().__init__(sensitivity, zones)
+        self.width = width
+        self.threshold = threshold
+        self._prev_gray = None
+        self._parity = 0
+
+    def _motion_mask(self, frame):
+        w, h = self._analysis_size(frame, self.width)
+        # Два буфера за сивия кадър се редуват, за да остане предишният непокътнат.
+        self._parity ^= 1
+        small = cv2.resize(frame, (w, h), dst=self._scratch.get("small", (h, w, 3)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._scratch.get(f"gray_{self._parity}", (h, w)))
+        prev, self._prev_gray = self._prev_gray, gray
+        if prev is None or prev.shape != gray.shape:
+            return None
+        delta = cv2.absdiff(prev, gray, dst=self._scratch.get("delta", (h, w)))
+        return cv2.threshold(delta, self.threshold, 255, cv2.THRESH_BINARY, dst=delta)[1]
+
+    def reset(self):
+        self._prev_gray = None
+
+
+class BackgroundModelDetector(MotionDetector):
+    """
+    Сравнява намален сив кадър (по подразбиране 320 px ширина) с плаващ среден фон.
+    Размазването и морфологичното отваряне махат шума, а рязка промяна на почти целия
+    кадър се приема за смяна на осветлението и само обновява фона.
+
+    Фонът се пази в uint8: при alpha=0.05 закръгляването го спира на до ~10 нива от
+    сцената, което е под прага от 25, а паметта и времето за обновяване са четири пъти по-малко.
+    """
+    LIGHTING_CHANGE_SCORE = 0.6
+
+    def __init__(self, sensitivity=50, zones=None, width=320, alpha=0.05, threshold=25):
+        super().__init__(sensitivity, zones)
+        self.width = width
+        self.alpha = alpha
+        self.threshold = threshold
+        self._has_background = False
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+    def prepare(self, frame):
+        """Намаленият и размазан сив кадър, с който работи моделът (в работен буфер)."""
+        luma = self._luma(frame, self._analysis_size(frame, self.width))
+        return cv2.GaussianBlur(luma, (5, 5), 0, dst=luma)
+
+    def _motion_mask(self, frame):
+        luma = self.prepare(frame)
+        h, w = luma.shape
+        background = self._scratch.get("background", (h, w))
+        if not self._has_background:
+            background[...] = luma
+            self._has_background = True
+            return None
+
+        mask = cv2.absdiff(luma, background, dst=self._scratch.get("mask", (h, w)))
+        cv2.threshold(mask, self.threshold, 255, cv2.THRESH_BINARY, dst=mask)
+        cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel, dst=mask)
+
+        # Смяната на осветлението се преценява по целия кадър, не по зоните.
+        if cv2.countNonZero(mask) >= self.LIGHTING_CHANGE_SCORE * mask.size:
+            background[...] = luma
+            return None
+        cv2.addWeighted(background, 1 - self.alpha, luma, self.alpha, 0, dst=background)
+        return mask
+
+    def reset(self):
+        self._has_background = False
+
+
+class Mog2Detector(MotionDetector):
+    """
+    Модел на фона MOG2 от OpenCV върху същия намален сив кадър. Свиква с повтарящо се
+    движение (листа, вода), но е по-бавен и реагира по-силно на смяна на осветлението.
+    """
+    def __init__(self, sensitivity=50, zones=None, width=320):
+        super().__init__(sensitivity, zones)
+        self.width = width
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.reset()
+
+    def _motion_mask(self, frame):
+        w, h = self._analysis_size(frame, self.width)
+        luma = self._luma(frame, (w, h))
+        mask = self._subtractor.apply(luma, fgmask=self._scratch.get("mask", (h, w)))
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel, dst=mask)
+
+    def reset(self):
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=False)
+
+
+class BatchMotionAnalyzer:
+    """
+    Общ анализ на движението за всички камери с BackgroundModelDetector. Worker-ите подават
+    подготвения си сив кадър, а една нишка с фиксирана честота подрежда кадрите с еднакъв
+    размер в общ масив (N, H+1, W) и смята разликата, прага, морфологията, броя пиксели и
+    обновяването на фона с по едно извикване за всички камери. Допълнителният ред между
+    камерите пречи на морфологията да пренася пиксели от една камера в друга.
+    """
+    LIGHTING_CHANGE_SCORE = BackgroundModelDetector.LIGHTING_CHANGE_SCORE
+
+    def __init__(self, fps=8, alpha=0.05, threshold=25):
+        self.interval = 1.0 / fps
+        self.alpha = alpha
+        self.threshold = threshold
+        self._pending = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._is_running = False
+        self._thread = None
+
+    def start(self):
+        self._is_running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._is_running = False
+
+    def submit(self, client, luma, timestamp=None):
+        """
+        Подава кадър от client (VideoWorker) с времето му на заснемане. Кадърът се копира; ако
+        предишният още не е анализиран, новият го заменя. Резултатът се връща с
+        client.report_motion(score, zone, timestamp).
+        """
+        with self._lock:
+            self._pending[client.cam_id] = (client, luma.copy(), time.time() if timestamp is None else timestamp)
+            self._removed.discard(client.cam_id)
+
+    def remove(self, cam_id):
+        with self._lock:
+            self._pending.pop(cam_id, None)
+            self._removed.add(cam_id)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._is_running:
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+            try:
+                self.analyze_pending()
+            except Exception as e:
+                print(f"Грешка при анализа на движението: {e}")
+
+    def analyze_pending(self):
+        """Анализира всички подадени кадри. Връща {cam_id: оценка}."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            removed, self._removed = self._removed, set()
+        for cam_id in removed:
+            for group in self._groups.values():
+                group.release(cam_id)
+
+        by_shape = {}
+        for cam_id, (client, luma, timestamp) in pending.items():
+            for shape, group in self._groups.items():
+                if shape != luma.shape:
+                    group.release(cam_id)
+            by_shape.setdefault(luma.shape, []).append((client, luma, timestamp))
+
+        scores = {}
+        for shape, items in by_shape.items():
+            group = self._groups.get(shape)
+            if group is None:
+                group = self._groups[shape] = _AnalysisGroup(shape)
+            fresh = [(group.assign(client), client, luma, timestamp) for client, luma, timestamp in items]
+            for slot, client, luma, _ in fresh:
+                group.load(slot, luma)
+            group_scores = self._analyze(group)
+            h = shape[0]
+            for slot, client, _, timestamp in fresh:
+                score, zone = float(group_scores[slot]), ""
+                detector = client.motion_detector
+                if detector.zones and score > 0:
+                    # Маската на слота е непрекъснат блок от общия масив и се оценява директно.
+                    score, zone = detector.zones.score(group.mask[slot, :h])
+                scores[client.cam_id] = score
+                if score >= detector.min_score:
+                    client.report_motion(score, zone, timestamp)
+        return scores
+
+    def _analyze(self, group):
+        h, w = group.shape
+        luma2d = group.luma.reshape(-1, w)
+        mask2d = group.mask.reshape(-1, w)
+        background2d = group.background.reshape(-1, w)
+        cv2.absdiff(luma2d, background2d, dst=mask2d)
+        # Маската е 0/1, за да може сумата по редове да е броят пиксели в движение.
+        cv2.threshold(mask2d, self.threshold, 1, cv2.THRESH_BINARY, dst=mask2d)
+        cv2.morphologyEx(mask2d, cv2.MORPH_OPEN, self._kernel, dst=mask2d)
+        row_counts = cv2.reduce(mask2d, 1, cv2.REDUCE_SUM, dst=group.row_counts, dtype=cv2.CV_32S)
+        scores = row_counts.reshape(len(group.active), h + 1)[:, :h].sum(axis=1) / (h * w)
+
+        cv2.addWeighted(background2d, 1 - self.alpha, luma2d, self.alpha, 0, dst=background2d)
+        # Нови камери и смяна на осветлението: фонът става равен на текущия кадър.
+        reseed = (scores >= self.LIGHTING_CHANGE_SCORE) | ~group.has_background
+        if reseed.any():
+            group.background[reseed] = group.luma[reseed]
+            scores[reseed] = 0.0
+        group.has_background |= group.active
+        return scores
+
+
+class _AnalysisGroup:
+    """Камерите с еднакъв размер на анализа: общи масиви (капацитет, H+1, W) и слот за всяка камера."""
+    def __init__(self, shape, capacity=4):
+        self.shape = shape
+        self.slots = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        h, w = self.shape
+        old = getattr(self, "luma", None)
+        luma = np.zeros((capacity, h + 1, w), dtype=np.uint8)
+        background = np.zeros((capacity, h + 1, w), dtype=np.uint8)
+        has_background = np.zeros(capacity, dtype=bool)
+        active = np.zeros(capacity, dtype=bool)
+        if old is not None:
+            n = len(old)
+            luma[:n], background[:n] = self.luma, self.background
+            has_background[:n], active[:n] = self.has_background, self.active
+        self.luma, self.background = luma, background
+        self.has_background, self.active = has_background, active
+        self.mask = np.zeros_like(luma)
+        self.row_counts = np.zeros((capacity * (h + 1), 1), dtype=np.int32)
+
+    def assign(self, client):
+        slot = self.slots.get(client.cam_id)
+        if slot is None:
+            free = np.flatnonzero(~self.active)
+            if not len(free):
+                self._allocate(len(self.active) * 2)
+                free = np.flatnonzero(~self.active)
+            slot = int(free[0])
+            self.slots[client.cam_id] = slot
+            self.active[slot] = True
+            self.has_background[slot] = False
+        return slot
+
+    def load(self, slot, luma):
+        self.luma[slot, :self.shape[0]] = luma
+
+    def release(self, cam_id):
+        slot = self.slots.pop(cam_id, None)
+        if slot is not None:
+            self.active[slot] = False
+            self.has_background[slot] = False
+            self.luma[slot] = 0
+            self.background[slot] = 0
+
+
+MOTION_DETECTORS = {
+    "background": BackgroundModelDetector,
+    "mog2": Mog2Detector,
+    "frame_diff": FrameDiffDetector,
+}
+
+
+def create_motion_detector(camera_data):
+    """
+    Създава детектора, избран за камерата (motion_detector, motion_sensitivity,
+    motion_zones, motion_analysis_width).
+    """
+    detector_cls = MOTION_DETECTORS.get(camera_data.get("motion_detector", "background"), BackgroundModelDetector)
+    kwargs = {
+        "sensitivity": camera_data.get("motion_sensitivity", 50),
+        "zones": camera_data.get("motion_zones", []),
+    }
+    if camera_data.get("motion_analysis_width"):
+        kwargs["width"] = camera_data["motion_analysis_width"]
+    return detector_cls(**kwargs)
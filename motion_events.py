@@ -0,0 +1,76 @@
+import time
+import uuid
+from datetime import datetime
+
+MOTION_EVENT_TYPE = "Движение"
+
+
+class MotionEventTracker:
+    """
+    Събира засичанията на движение в сегменти по камера и зона. Засичания с интервал до
+    merge_gap секунди удължават отворения сегмент; сегмент без засичане за merge_gap се
+    затваря. Сегментите с по-малко от min_detections засичания се отхвърлят като шум, а
+    продължително движение се разделя на сегменти до max_duration секунди.
+
+    Трекерът само натрупва сегменти в паметта - collect() връща затворените като
+    събития за events.json, които извикващият записва наведнъж.
+    """
+    def __init__(self, merge_gap=5.0, min_detections=2, max_duration=600.0):
+        self.merge_gap = merge_gap
+        self.min_detections = min_detections
+        self.max_duration = max_duration
+        self._open = {}
+        self._closed = []
+
+    def update(self, cam_id, camera_name, score, zone="", file_path="", now=None):
+        now = time.time() if now is None else now
+        key = (cam_id, zone)
+        segment = self._open.get(key)
+        if segment is not None and (now - segment["end"] > self.merge_gap or now - segment["start"] >= self.max_duration):
+            self._closed.append(self._open.pop(key))
+            segment = None
+        if segment is None:
+            segment = self._open[key] = {
+                "cam_id": cam_id, "camera_name": camera_name, "zone": zone,
+                "start": now, "end": now, "peak": score, "detections": 0, "file_path": file_path,
+                "persons": 0,
+            }
+        segment["end"] = max(segment["end"], now)
+        segment["peak"] = max(segment["peak"], score)
+        segment["detections"] += 1
+        if file_path and not segment["file_path"]:
+            segment["file_path"] = file_path
+
+    def mark_person(self, cam_id, count):
+        """Отбелязва, че в отворените сегменти на камерата са намерени хора."""
+        for (segment_cam_id, _), segment in self._open.items():
+            if segment_cam_id == cam_id:
+                segment["persons"] = max(segment["persons"], count)
+
+    def collect(self, now=None, close_all=False):
+        """Затваря изтеклите (или всички) сегменти и връща готовите събития, най-новите първи."""
+        now = time.time() if now is None else now
+        for key, segment in list(self._open.items()):
+            if close_all or now - segment["end"] > self.merge_gap:
+                self._closed.append(self._open.pop(key))
+        closed, self._closed = self._closed, []
+        events = [self._to_event(segment) for segment in closed if segment["detections"] >= self.min_detections]
+        return sorted(events, key=lambda event: event["timestamp"], reverse=True)
+
+    def _to_event(self, segment):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "timestamp": datetime.fromtimestamp(segment["start"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "camera_name": segment["camera_name"],
+            "event_type": MOTION_EVENT_TYPE,
+            "file_path": segment["file_path"],
+            "end": datetime.fromtimestamp(segment["end"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "duration": round(segment["end"] - segment["start"], 1),
+            "peak_score": round(segment["peak"], 4),
+        }
+        if segment["zone"]:
+            event["zone"] = segment["zone"]
+        if segment["persons"]:
+            event["person"] = True
+            event["persons"] = segment["persons"]
+        return event
@@ -0,0 +1,193 @@
+import math
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from motion_detection import FrameDiffDetector
+
+MOTION_INDEX_SUFFIX = ".motion"
+# Заглавие: "TSAM", версия, 3 празни байта и началото на записа (секунди от епохата).
+_HEADER = struct.Struct("<4sB3xd")
+_MAGIC = b"TSAM"
+_VERSION = 1
+
+
+def motion_index_path(video_path):
+    return Path(video_path).with_suffix(MOTION_INDEX_SUFFIX)
+
+
+def quantize_score(score):
+    """Оценка 0-1 към ниво 0-255. Коренът оставя повече нива за малките оценки, които са най-честите."""
+    return min(255, int(round(255 * math.sqrt(max(0.0, min(1.0, score))))))
+
+
+class MotionIndexWriter:
+    """
+    Индекс на движението за един запис: по един байт (най-високото ниво за секундата) за
+    всяка секунда от началото на файла. add() само обновява масив в паметта; завършените
+    секунди се добавят в края на файла <запис>.motion при flush_if_due() от нишката на записа.
+
+    Нулата на индекса трябва да е времето на първия кадър във видеото. Без start_time тя се
+    задава със start() при първия записан кадър или пакет; дотогава оценките се пазят, а
+    файлът (и заглавието му) не се създава.
+    """
+    FLUSH_INTERVAL = 10.0
+    # Толкова секунди назад още могат да пристигнат оценки от анализа.
+    SETTLE_SECONDS = 2
+    # Най-много толкова оценки се пазят до start() (ако потокът изобщо не дава кадри).
+    MAX_PENDING = 1000
+
+    def __init__(self, video_path, start_time=None):
+        self.path = motion_index_path(video_path)
+        self.start_time = start_time
+        # Оценките, дошли преди start().
+        self._pending = deque(maxlen=self.MAX_PENDING)
+        self._levels = bytearray()
+        self._written = 0
+        self._header_written = False
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + self.FLUSH_INTERVAL
+
+    def start(self, start_time):
+        """Задава нулата на индекса (времето на първия кадър), ако още не е зададена."""
+        with self._lock:
+            if self.start_time is not None:
+                return
+            self.start_time = start_time
+            pending = list(self._pending)
+            self._pending.clear()
+        for score, timestamp in pending:
+            self.add(score, timestamp)
+
+    def add(self, score, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.start_time is None:
+            with self._lock:
+                if self.start_time is None:
+                    self._pending.append((score, timestamp))
+                    return
+        second = int(timestamp - self.start_time)
+        if second < 0:
+            return
+        level = quantize_score(score)
+        with self._lock:
+            if second < self._written:
+                return
+            if second >= len(self._levels):
+                self._levels.extend(bytes(second + 1 - len(self._levels)))
+            if level > self._levels[second]:
+                self._levels[second] = level
+
+    def flush_if_due(self):
+        if time.monotonic() >= self._next_flush:
+            self._next_flush = time.monotonic() + self.FLUSH_INTERVAL
+            self.flush()
+
+    def flush(self, end_time=None):
+        """Добавя във файла секундите до end_time (по подразбиране - всички завършени)."""
+        if self.start_time is None:
+            return
+        if end_time is None:
+            end_time = time.time() - self.SETTLE_SECONDS
+        complete = max(0, int(end_time - self.start_time))
+        with self._lock:
+            if complete > len(self._levels):
+                self._levels.extend(bytes(complete - len(self._levels)))
+            chunk = bytes(self._levels[self._written:complete])
+            self._written = max(self._written, complete)
+        if not chunk and self._header_written:
+            return
+        try:
+            with open(self.path, "ab" if self._header_written else "wb") as f:
+                if not self._header_written:
+                    f.write(_HEADER.pack(_MAGIC, _VERSION, self.start_time))
+                    self._header_written = True
+                f.write(chunk)
+        except OSError as e:
+            print(f"Грешка при запис на индекса на движението {self.path}: {e}")
+
+    def close(self):
+        """Записва остатъка, включително започнатата секунда при спиране на записа."""
+        self.flush(time.time() + 1)
+
+
+def load_motion_index(video_path):
+    """(начало на записа, масив uint8 с ниво за всяка секунда) или None, ако няма индекс."""
+    path = motion_index_path(video_path)
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, start_time = _HEADER.unpack(data[:_HEADER.size].tobytes())
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    return start_time, data[_HEADER.size:]
+
+
+def save_motion_index(video_path, levels, start_time=0.0):
+    """Записва готов индекс (напр. от scan_motion_levels) до файла. Връща False, ако папката не позволява запис."""
+    try:
+        with open(motion_index_path(video_path), "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, start_time))
+            f.write(np.asarray(levels, dtype=np.uint8).tobytes())
+        return True
+    except OSError as e:
+        print(f"Индексът на движението не може да бъде запазен: {e}")
+        return False
+
+
+def scan_motion_levels(video_path, samples_per_second=2, progress_callback=None, check_cancel_callback=None):
+    """
+    Индекс за запис без .motion файл: FrameDiffDetector сравнява по samples_per_second
+    кадъра в секунда, а останалите кадри само се прескачат с grab() без преобразуване.
+    Връща масив с ниво за всяка секунда или None при грешка или прекратяване.
+    """
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        return None
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, int(round(fps / samples_per_second)))
+    levels = bytearray(max(1, int(math.ceil(total_frames / fps))))
+    detector = FrameDiffDetector(width=320, threshold=25)
+    frame_index = 0
+    try:
+        while True:
+            if frame_index % step:
+                if not capture.grab():
+                    break
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                is_motion, score, _ = detector.detect(frame)
+                # Времето на кадъра, а не номерът му, за да е вярно и при променлива честота.
+                second = int(capture.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+                if is_motion and second < len(levels):
+                    levels[second] = max(levels[second], quantize_score(score))
+                if check_cancel_callback and check_cancel_callback():
+                    return None
+                if progress_callback and total_frames > 0 and frame_index % (step * 20) == 0:
+                    progress_callback(int(100 * frame_index / total_frames))
+            frame_index += 1
+    finally:
+        capture.release()
+    return np.frombuffer(bytes(levels), dtype=np.uint8)
+
+
+def motion_segments(levels, min_level=1, gap=3):
+    """Отрязъците с движение като [(начална секунда, крайна секунда)], слети при паузи до gap секунди."""
+    seconds = np.flatnonzero(levels >= min_level)
+    if not len(seconds):
+        return []
+    breaks = np.flatnonzero(np.diff(seconds) > gap + 1)
+    starts = np.concatenate(([seconds[0]], seconds[breaks + 1]))
+    ends = np.concatenate((seconds[breaks], [seconds[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# HOG детекторът е махнат от основния модул в OpenCV 5; без него проверката за хора е изключена.
+PERSON_DETECTION_ENABLED = hasattr(cv2, "HOGDescriptor")
+
+
+class PersonDetectorPool:
+    """
+    Проверка за хора с вградения в OpenCV HOG детектор (HOGDescriptor_getDefaultPeopleDetector),
+    споделена от всички камери. Worker-ите подават заявка само когато е засечено движение;
+    нишките на пула сами взимат последния кадър на камерата, когато стигнат до нея.
+
+    Бюджетът budget_per_second ограничава общия брой проверки в секунда за всички камери:
+    заявките над него се отхвърлят, а за всяка камера се пази само последната, така че
+    проверката никога не изостава и не отнема процесора от приемането на кадри.
+    Натоварването се ограничава с бюджета, броя нишки (workers) и ширината на анализа (width);
+    cv2.setNumThreads не се пипа, защото важи за целия процес.
+    """
+    MAX_AGE = 1.0
+
+    def __init__(self, workers=2, budget_per_second=4.0, width=640, min_weight=0.5):
+        self.workers = workers
+        self.budget_per_second = budget_per_second
+        self.width = width
+        self.min_weight = min_weight
+        self.processed = 0
+        self.dropped = 0
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._tokens = budget_per_second
+        self._last_refill = time.monotonic()
+        self._is_running = False
+        self._threads = []
+
+    def start(self):
+        self._is_running = True
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Спира нишките и изчаква текущите проверки да завършат."""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def submit(self, client):
+        """Заявка за проверка на последния кадър на client (VideoWorker). Резултатът идва с client.report_person(брой)."""
+        with self._condition:
+            if client.cam_id in self._pending:
+                self.dropped += 1
+            self._pending[client.cam_id] = (client, time.monotonic())
+            self._condition.notify()
+
+    def remove(self, cam_id):
+        with self._condition:
+            self._pending.pop(cam_id, None)
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.budget_per_second, self._tokens + (now - self._last_refill) * self.budget_per_second)
+        self._last_refill = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return 0.0
+        return (1.0 - self._tokens) / self.budget_per_second
+
+    def _next_request(self):
+        """Най-старата заявка, щом бюджетът позволява; None при спиране."""
+        with self._condition:
+            while self._is_running:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                wait = self._take_token()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                cam_id = min(self._pending, key=lambda key: self._pending[key][1])
+                client, submitted = self._pending.pop(cam_id)
+                if time.monotonic() - submitted > self.MAX_AGE:
+                    self.dropped += 1
+                    self._tokens += 1.0
+                    continue
+                return client
+            return None
+
+    def _run(self):
+        # HOGDescriptor не е безопасен за няколко нишки, затова всяка има свой.
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        while True:
+            client = self._next_request()
+            if client is None:
+                break
+            frame = client.get_latest_frame()
+            if frame is None:
+                continue
+            try:
+                count = self.detect(hog, frame)
+            except cv2.error as e:
+                print(f"Грешка при търсене на хора: {e}")
+                continue
+            with self._condition:
+                self.processed += 1
+            if count:
+                client.report_person(count)
+
+    def detect(self, hog, frame):
+        """Брой намерени хора в кадъра, намален до ширина self.width."""
+        h, w = frame.shape[:2]
+        if w > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        rects, weights = hog.detectMultiScale(frame, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        # Без намерени хора OpenCV връща празни кортежи вместо масиви.
+        return int(sum(1 for weight in np.ravel(weights) if weight >= self.min_weight))
@@ -0,0 +1,255 @@
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+
+from frame_buffer import iter_pre_event_images
+from motion_index import MotionIndexWriter
+from storage_io import FSYNC_INTERVAL, FSYNC_NEVER, camera_fsync_policy, get_storage_io
+from video_timing import open_video_writer
+from video_worker import RecordingWorker, segment_filename
+
+
+def find_ffmpeg():
+    return shutil.which("ffmpeg")
+
+
+class FfmpegRemuxRecorder(QThread):
+    """
+    Запис без прекодиране: ffmpeg чете основния поток на камерата и копира H.264/H.265
+    пакетите директно в MP4 (-c copy). Не получава кадри от VideoWorker.
+
+    С segment_seconds ffmpeg (-f segment) започва нов файл на първия ключов кадър след
+    изтичане на сегмента и записва завършените сегменти в CSV списък, от който идват
+    SegmentStarted и SegmentFinished.
+
+    Файловете се пишат от ffmpeg, затова fsync (режим, секунди) се прави отвън през storage_io:
+    на всеки завършен файл, а при режим "interval" и на текущия файл на всеки N секунди.
+    """
+    Failed = Signal(str)
+    SegmentStarted = Signal(str, float)
+    SegmentFinished = Signal(str, float, float)
+
+    needs_frames = False
+
+    def __init__(self, source_url, filename, ffmpeg_path=None, pre_event=None, pre_event_fps=5, segment_seconds=None,
+                 fsync=None):
+        super().__init__()
+        self.source_url = source_url
+        self.fsync = fsync
+        self._fsync_mode, self._fsync_seconds = fsync or (FSYNC_NEVER, 0)
+        self.segment_seconds = segment_seconds
+        self._base_filename = str(filename)
+        self._segment = 0
+        self._segment_list = Path(filename).with_suffix(".segments.csv")
+        self._segment_lines = 0
+        self.filename = segment_filename(filename, 0) if segment_seconds else str(filename)
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        # Копираните пакети не могат да се предшестват от декодирани кадри, затова
+        # секундите преди събитието отиват в отделен файл до основния.
+        self._pre_event = pre_event or []
+        self._pre_event_fps = pre_event_fps
+        self.pre_event_filename = None
+        if self._pre_event:
+            path = Path(self.filename)
+            self.pre_event_filename = str(path.with_name(f"{path.stem}_pre{path.suffix}"))
+        self._is_running = True
+        self._stderr_tail = deque(maxlen=20)
+        # Индексът започва, когато ffmpeg създаде файла (виж _wait_for_output).
+        self.motion_index = MotionIndexWriter(self.filename)
+        self._recording_start = None
+
+    def _build_command(self):
+        command = [self.ffmpeg_path, "-hide_banner", "-nostats", "-loglevel", "error"]
+        if self.source_url.startswith("rtsp://"):
+            command += ["-rtsp_transport", "tcp"]
+        command += ["-i", self.source_url, "-map", "0:v:0", "-an", "-c", "copy"]
+        # Фрагментиран MP4 остава четим, дори ако процесът бъде прекъснат.
+        movflags = "+frag_keyframe+empty_moov+default_base_moof"
+        if not self.segment_seconds:
+            return command + ["-movflags", movflags, "-y", self.filename]
+        path = Path(self._base_filename)
+        return command + [
+            "-f", "segment", "-segment_time", str(self.segment_seconds), "-reset_timestamps", "1",
+            "-segment_format", "mp4", "-segment_format_options", f"movflags={movflags}",
+            "-segment_list", str(self._segment_list), "-segment_list_type", "csv",
+            "-y", str(path.with_name(f"{path.stem}_%03d{path.suffix}")),
+        ]
+
+    def _poll_segments(self, finished=False):
+        """
+        Съобщава сегментите, които ffmpeg е добавил в списъка. Ред се добавя, когато сегментът
+        е затворен; следващият е започнал, само ако файлът му вече съществува (ffmpeg пише
+        ред и за последния сегмент, преди да спре).
+        """
+        if self._recording_start is None:
+            return
+        try:
+            with open(self._segment_list, "r", encoding="utf-8") as f:
+                # Само завършените редове; последният може още да се записва.
+                lines = f.read().split("\n")[:-1]
+        except OSError:
+            lines = []
+        for line in lines[self._segment_lines:]:
+            try:
+                end_time = self._recording_start + float(line.rsplit(",", 1)[1])
+            except (IndexError, ValueError):
+                self._segment_lines += 1
+                continue
+            next_started = Path(segment_filename(self._base_filename, self._segment + 1)).exists()
+            if not next_started and not finished:
+                break
+            self._segment_lines += 1
+            self._finish_segment(self.motion_index.start_time, end_time)
+            if not next_started:
+                return
+            self.motion_index.flush(end_time)
+            self._segment += 1
+            self.filename = segment_filename(self._base_filename, self._segment)
+            self.motion_index = MotionIndexWriter(self.filename, end_time)
+            self.SegmentStarted.emit(self.filename, end_time)
+        if finished:
+            # ffmpeg е спрял, без да запише последния сегмент в списъка.
+            self._finish_segment(self.motion_index.start_time, time.time())
+
+    def _finish_segment(self, start_time, end_time):
+        if self._fsync_mode != FSYNC_NEVER and Path(self.filename).exists():
+            get_storage_io().fsync_file(self.filename)
+        self.SegmentFinished.emit(self.filename, start_time, end_time)
+
+    def _write_pre_event(self, until):
+        first = cv2.imdecode(np.frombuffer(self._pre_event[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+        if first is None:
+            return
+        size = (first.shape[1], first.shape[0])
+        writer = open_video_writer(self.pre_event_filename, self._pre_event_fps, size, self._pre_event[0][0], self.fsync)
+        if writer.isOpened():
+            last = None
+            for timestamp, frame in iter_pre_event_images(self._pre_event, size):
+                writer.write(frame, timestamp)
+                last = frame
+            # Последният кадър стои до момента, в който започва основният файл.
+            if last is not None:
+                writer.write(last, until)
+        writer.release()
+        self._pre_event = []
+
+    def _wait_for_output(self, process):
+        """
+        Нулата на файла и на индекса е моментът, в който ffmpeg създаде файла: той го отваря
+        след като се свърже и разчете потока, а не при стартиране на процеса.
+        """
+        while True:
+            exited = process.poll() is not None
+            if Path(self.filename).exists():
+                self._recording_start = time.time()
+                self.motion_index.start(self._recording_start)
+                self.SegmentStarted.emit(self.filename, self._recording_start)
+                return
+            if exited:
+                return
+            time.sleep(0.05)
+
+    def _read_stderr(self, stream):
+        for line in iter(stream.readline, b""):
+            self._stderr_tail.append(line.decode("utf-8", "replace").rstrip())
+
+    def run(self):
+        try:
+            process = subprocess.Popen(
+                self._build_command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        except OSError as e:
+            self.Failed.emit(str(e))
+            return
+        threading.Thread(target=self._read_stderr, args=(process.stderr,), daemon=True).start()
+        output_watcher = threading.Thread(target=self._wait_for_output, args=(process,), daemon=True)
+        output_watcher.start()
+        if self._pre_event:
+            # ffmpeg вече се свързва с камерата, докато се записват секундите преди събитието.
+            self._write_pre_event(time.time())
+
+        next_fsync = time.monotonic() + self._fsync_seconds
+        while self._is_running and process.poll() is None:
+            time.sleep(0.2)
+            if self.segment_seconds:
+                self._poll_segments()
+            self.motion_index.flush_if_due()
+            if self._fsync_mode == FSYNC_INTERVAL and time.monotonic() >= next_fsync:
+                next_fsync = time.monotonic() + self._fsync_seconds
+                if Path(self.filename).exists():
+                    get_storage_io().fsync_file(self.filename)
+
+        if process.poll() is None:
+            # "q" кара ffmpeg да завърши файла коректно.
+            try:
+                process.stdin.write(b"q")
+                process.stdin.flush()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        elif self._is_running:
+            error = "; ".join(self._stderr_tail) or f"ffmpeg exit code {process.returncode}"
+            print(f"Записът без прекодиране в {self.filename} спря неочаквано: {error}")
+            self.Failed.emit(error)
+        output_watcher.join()
+        # Ако ffmpeg не е създал файл, няма сегмент за завършване.
+        if self.segment_seconds:
+            self._poll_segments(finished=True)
+            self._segment_list.unlink(missing_ok=True)
+        elif self._recording_start is not None:
+            self._finish_segment(self._recording_start, time.time())
+        self.motion_index.close()
+        print("Нишката за запис приключи коректно.")
+
+    def add_frame(self, frame, timestamp=None):
+        pass
+
+    def stats(self):
+        # ffmpeg само копира пакетите - няма опашка от кадри и кодиране.
+        return {"queue_depth": 0, "dropped": 0, "encode_ms": 0.0}
+
+    def add_motion(self, score, timestamp=None):
+        self.motion_index.add(score, timestamp)
+
+    def stop(self):
+        self._is_running = False
+
+
+def create_recorder(worker, filename, backend="remux", adaptive=None, segment_seconds=None, encoder_pool=None):
+    """
+    Създава запис според настройката recording_backend. "remux" копира потока през ffmpeg,
+    а ако ffmpeg липсва, записът се прекодира с RecordingWorker с честотата на потока.
+
+    adaptive ({"idle_fps": ..., "idle_scale": ...}) иска адаптивен запис. Копираните пакети
+    не могат да се разредят, затова той винаги се прекодира.
+
+    segment_seconds разделя записа на файлове с тази дължина (виж segment_filename).
+    С encoder_pool прекодиращият запис кодира в процесите на пула (виж EncoderPool).
+    fsync политиката идва от настройките на камерата (camera_fsync_policy).
+    """
+    pre_event = worker.pre_event_frames()
+    fps = worker.recording_fps
+    fsync = camera_fsync_policy(worker.camera_data)
+    if adaptive:
+        return RecordingWorker(filename, fps, pre_event, adaptive["idle_fps"], adaptive["idle_scale"], segment_seconds,
+                               encoder_pool, fsync)
+    if backend == "remux":
+        ffmpeg_path = find_ffmpeg()
+        if ffmpeg_path:
+            pre_event_fps = worker.pre_event_buffer.fps if worker.pre_event_buffer is not None else 5
+            return FfmpegRemuxRecorder(worker.rtsp_url, filename, ffmpeg_path, pre_event, pre_event_fps, segment_seconds,
+                                       fsync)
+        print("ffmpeg не е намерен, записът ще бъде прекодиран.")
+    return RecordingWorker(filename, fps, pre_event, segment_seconds=segment_seconds, encoder_pool=encoder_pool,
+                           fsync=fsync)
@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# Режими на fsync за записите на камера: никога, при затваряне на всеки файл (сегмент)
+# или на всеки N секунди докато се записва.
+FSYNC_NEVER = "never"
+FSYNC_SEGMENT = "segment"
+FSYNC_INTERVAL = "interval"
+
+
+def camera_fsync_policy(camera_data):
+    """(режим, секунди) за fsync на записите на камерата според настройките ѝ."""
+    return camera_data.get("fsync_policy", FSYNC_NEVER), camera_data.get("fsync_seconds", 10)
+
+
+def _mount_point(path):
+    """Най-горната папка на пътя, която е на същия диск (за името на диска в статистиката)."""
+    path = Path(path).resolve()
+    device = path.stat().st_dev
+    while path.parent != path and path.parent.stat().st_dev == device:
+        path = path.parent
+    return str(path)
+
+
+def _write_at(fd, offset, data):
+    # pwrite липсва под Windows; файлът се пише само от нишката на диска, така че lseek е безопасен.
+    os.lseek(fd, offset, os.SEEK_SET)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class DiskWriter:
+    """
+    Нишка, която пише на един диск. Записите, fsync и затварянията на всички файлове на диска
+    минават през нея по реда на подаване, така че бавен диск забавя само нея, а не нишките,
+    които кодират или интерфейса. Опашката е ограничена до MAX_PENDING байта: над това
+    подаващият изчаква, а времето на изчакване се брои в stall_ms.
+    """
+    MAX_PENDING = 64 * 1024 ** 2
+    # Запис или fsync, по-бавен от това, се съобщава в конзолата.
+    SLOW_SECONDS = 1.0
+
+    def __init__(self, label):
+        self.label = label
+        self._ops = deque()
+        self._pending_bytes = 0
+        self._condition = threading.Condition()
+        self._is_running = True
+        self._stats = {"written_mb": 0.0, "writes": 0, "write_ms": 0.0, "write_max_ms": 0.0,
+                       "fsyncs": 0, "fsync_ms": 0.0, "fsync_max_ms": 0.0, "stall_ms": 0.0}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, nbytes, action, target=None):
+        """
+        Подава action() за изпълнение в нишката на диска. kind ("write", "fsync" или друго) определя
+        в коя статистика влиза времето. Грешка OSError се запомня в target.error, ако има target.
+        """
+        with self._condition:
+            if self._pending_bytes + nbytes > self.MAX_PENDING and self._pending_bytes:
+                started = time.perf_counter()
+                while self._pending_bytes + nbytes > self.MAX_PENDING and self._pending_bytes:
+                    self._condition.wait()
+                self._stats["stall_ms"] += (time.perf_counter() - started) * 1000
+            self._ops.append((kind, nbytes, action, target))
+            self._pending_bytes += nbytes
+            self._condition.notify_all()
+
+    def stop(self):
+        """Изпълнява всичко подадено и спира нишката."""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats, queue_mb=self._pending_bytes / 1024 ** 2)
+        return {key: round(value, 1) if isinstance(value, float) else value for key, value in stats.items()}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._ops and self._is_running:
+                    self._condition.wait()
+                if not self._ops:
+                    return
+                kind, nbytes, action, target = self._ops.popleft()
+            started = time.perf_counter()
+            try:
+                action()
+            except OSError as e:
+                print(f"Грешка при запис на диск {self.label}: {e}")
+                if target is not None:
+                    target.error = e
+            elapsed = time.perf_counter() - started
+            if elapsed > self.SLOW_SECONDS:
+                print(f"Бавен диск {self.label}: {kind} отне {elapsed:.1f} s")
+            with self._condition:
+                self._pending_bytes -= nbytes
+                self._account(kind, nbytes, elapsed * 1000)
+                self._condition.notify_all()
+
+    def _account(self, kind, nbytes, elapsed_ms):
+        stats = self._stats
+        if kind == "write":
+            stats["writes"] += 1
+            stats["written_mb"] += nbytes / 1024 ** 2
+            stats["write_ms"] = elapsed_ms if stats["writes"] == 1 else 0.95 * stats["write_ms"] + 0.05 * elapsed_ms
+            stats["write_max_ms"] = max(stats["write_max_ms"], elapsed_ms)
+        elif kind == "fsync":
+            stats["fsyncs"] += 1
+            stats["fsync_ms"] = elapsed_ms if stats["fsyncs"] == 1 else 0.8 * stats["fsync_ms"] + 0.2 * elapsed_ms
+            stats["fsync_max_ms"] = max(stats["fsync_max_ms"], elapsed_ms)
+
+
+class RecordingFile:
+    """
+    Файл за запис, който се пише от нишката на диска (DiskWriter). write() само добавя в буфер
+    от BUFFER_SIZE байта; пълният буфер отива на диска с един запис, така че последователните
+    данни се пишат на парчета, подравнени на BUFFER_SIZE (с "interval" буферът се изпраща и
+    когато е време за fsync). seek() назад (напр. MP4 мукс
+    поправя заглавие в края) изпраща буфера и продължава от новата позиция.
+
+    fsync е (режим, секунди) от camera_fsync_policy(); без него fsync не се прави.
+    """
+    BUFFER_SIZE = 1024 ** 2
+
+    def __init__(self, disk, path, fsync=None):
+        self.name = str(path)
+        self.error = None
+        self._disk = disk
+        self._fd = None
+        self._fsync_mode, self._fsync_seconds = fsync or (FSYNC_NEVER, 0)
+        self._next_fsync = time.monotonic() + self._fsync_seconds
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+        self._position = 0
+        self._size = 0
+        self._closed = False
+        disk.submit("open", 0, self._open, self)
+
+    def _open(self):
+        self._fd = os.open(self.name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+
+    # _open, _write_chunk, _fsync и затварянето се изпълняват в нишката на диска.
+    def _write_chunk(self, offset, data):
+        if self._fd is not None:
+            _write_at(self._fd, offset, data)
+
+    def _fsync(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        self._buffer += data
+        self._position += len(data)
+        self._size = max(self._size, self._position)
+        # При "interval" и бавен поток буферът се изпраща за fsync, преди да се напълни.
+        if len(self._buffer) >= self.BUFFER_SIZE or (
+                self._fsync_mode == FSYNC_INTERVAL and time.monotonic() >= self._next_fsync):
+            self.flush()
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset != self._position:
+            self.flush()
+            self._position = self._buffer_offset = offset
+        return offset
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        """Подава буфера на нишката на диска (без да чака записа)."""
+        if self._buffer:
+            data, offset = bytes(self._buffer), self._buffer_offset
+            self._buffer.clear()
+            self._disk.submit("write", len(data), lambda: self._write_chunk(offset, data), self)
+        self._buffer_offset = self._position
+        if self._fsync_mode == FSYNC_INTERVAL and time.monotonic() >= self._next_fsync:
+            self._next_fsync = time.monotonic() + self._fsync_seconds
+            self._disk.submit("fsync", 0, self._fsync, self)
+
+    def close(self):
+        """Изпраща остатъка и чака файлът да бъде записан и затворен (с fsync според режима)."""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        if self._fsync_mode != FSYNC_NEVER:
+            self._disk.submit("fsync", 0, self._fsync, self)
+        done = threading.Event()
+
+        def close_file():
+            try:
+                if self._fd is not None:
+                    os.close(self._fd)
+            finally:
+                done.set()
+        self._disk.submit("close", 0, close_file, self)
+        done.wait()
+
+
+class StorageIO:
+    """
+    Входно-изходният слой за записите и снимките в един процес: по една нишка DiskWriter
+    за всеки диск (по st_dev на папката), създадена при първия файл на диска.
+    """
+    def __init__(self):
+        self._disks = {}
+        self._lock = threading.Lock()
+
+    def disk_for(self, path):
+        folder = Path(path).parent
+        folder.mkdir(parents=True, exist_ok=True)
+        device = folder.stat().st_dev
+        with self._lock:
+            disk = self._disks.get(device)
+            if disk is None:
+                disk = self._disks[device] = DiskWriter(_mount_point(folder))
+            return disk
+
+    def open(self, path, fsync=None):
+        """RecordingFile за запис в path (файлов обект с write/seek/tell за PyAV)."""
+        return RecordingFile(self.disk_for(path), path, fsync)
+
+    def write_file(self, path, data):
+        """Записва data в path във фонов режим (напр. снимка); функцията не чака диска."""
+        def write():
+            with open(path, "wb") as f:
+                f.write(data)
+        self.disk_for(path).submit("write", len(data), write)
+
+    def fsync_file(self, path):
+        """fsync на файл, който се пише от друг (ffmpeg, cv2.VideoWriter), в нишката на диска."""
+        def fsync():
+            fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.disk_for(path).submit("fsync", 0, fsync)
+
+    def stats(self):
+        """{диск: статистика} - записани MB, средно и най-дълго време за запис и fsync, опашка, изчакване."""
+        with self._lock:
+            disks = list(self._disks.values())
+        return {disk.label: disk.stats() for disk in disks}
+
+    def stop(self):
+        with self._lock:
+            disks, self._disks = list(self._disks.values()), {}
+        for disk in disks:
+            disk.stop()
+
+
+_storage_io_instance = None
+_storage_io_lock = threading.Lock()
+def get_storage_io():
+    global _storage_io_instance
+    with _storage_io_lock:
+        if _storage_io_instance is None:
+            _storage_io_instance = StorageIO()
+        return _storage_io_instance
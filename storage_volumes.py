@@ -0,0 +1,83 @@
+import os
+import shutil
+from pathlib import Path
+
+
+def recording_volumes(settings):
+    """
+    Томовете за запис: основната папка recording_path (с лимит storage_limit_gb) и
+    допълнителните от recording_volumes ([{"path": ..., "limit_gb": ...}]). Лимит 0 означава без лимит.
+    """
+    volumes = [{"path": settings.get("recording_path"), "limit_gb": settings.get("storage_limit_gb", 0)}]
+    volumes += settings.get("recording_volumes", [])
+    unique, seen = [], set()
+    for volume in volumes:
+        if not volume.get("path"):
+            continue
+        key = os.path.normcase(os.path.abspath(volume["path"]))
+        if key not in seen:
+            seen.add(key)
+            unique.append(volume)
+    return unique
+
+
+def _contains(folder, file_path):
+    try:
+        Path(os.path.abspath(file_path)).relative_to(os.path.abspath(folder))
+        return True
+    except ValueError:
+        return False
+
+
+def volume_of(file_path, volumes):
+    """Томът, в който е файлът (при вложени папки - най-вътрешният), или None."""
+    matches = [volume for volume in volumes if file_path and _contains(volume["path"], file_path)]
+    return max(matches, key=lambda volume: len(os.path.abspath(volume["path"])), default=None)
+
+
+def volume_states(volumes, busy_files, folder_size):
+    """
+    Състоянието на всеки том: заето място (used), лимит (limit, 0 = без), свободно място за
+    запис (free - по-малкото от свободното на диска и оставащото до лимита) и брой текущи
+    записи (active). Том, чиято папка не може да се създаде (изключен диск), е с available False.
+
+    Свободното място идва от shutil.disk_usage; папката се обхожда с folder_size само при
+    том с лимит, а при останалите used е None.
+    """
+    states = []
+    for volume in volumes:
+        path = volume["path"]
+        limit = volume.get("limit_gb", 0) * 1024 ** 3
+        active = sum(1 for file_path in busy_files if volume_of(file_path, volumes) is volume)
+        state = {"path": path, "limit": limit, "used": None, "free": 0, "active": active, "available": False}
+        try:
+            Path(path).mkdir(parents=True, exist_ok=True)
+            disk_free = shutil.disk_usage(path).free
+        except OSError as e:
+            print(f"Томът за запис {path} не е достъпен: {e}")
+            states.append(state)
+            continue
+        if limit <= 0:
+            state["used"], state["free"] = None, disk_free
+        else:
+            state["used"] = folder_size(path)
+            state["free"] = min(disk_free, limit - state["used"])
+        state["available"] = True
+        states.append(state)
+    return states
+
+
+def choose_volume(states, preferred=None):
+    """
+    Томът за нов запис. Камера с фиксиран том (preferred) записва там, докато в него има място;
+    иначе се избира томът с най-много свободно място на текущ запис (free / (1 + active)), така
+    че едновременните записи се разпределят по дисковете. None, ако няма том с място.
+    """
+    usable = [state for state in states if state["available"] and state["free"] > 0]
+    if preferred:
+        key = os.path.normcase(os.path.abspath(preferred))
+        match = next((state for state in usable if os.path.normcase(os.path.abspath(state["path"])) == key), None)
+        if match is not None:
+            return match
+        print(f"Томът {preferred} е пълен или недостъпен, записът отива на друг том.")
+    return max(usable, key=lambda state: state["free"] / (1 + state["active"]), default=None)
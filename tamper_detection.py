@@ -0,0 +1,118 @@
+import time
+
+import cv2
+import numpy as np
+
+from frame_buffer import ScratchBuffers
+
+# Състояния на картината -> текст за StreamStatus.
+TAMPER_STATUS = {
+    "blackout": "Саботаж: черна картина",
+    "uniform": "Саботаж: покрита камера",
+    "defocus": "Саботаж: размазан фокус",
+    "scene_change": "Саботаж: преместена камера",
+}
+
+
+class TamperDetector:
+    """
+    Проверява картината за саботаж и лошо качество върху намален сив кадър (320 px като
+    анализа на движението), но само веднъж на interval секунди:
+
+      blackout     - тъмен кадър почти без детайл
+      uniform      - еднороден кадър (покрита или напръскана камера)
+      defocus      - рязкостта (дисперсия на Лапласиана) е паднала под DEFOCUS_RATIO от обичайната
+      scene_change - кадърът вече не прилича на запомнената сцена (корелация на 64x36 копие)
+
+    Проблемът се съобщава след CONFIRM_CHECKS поредни проверки, за да не го предизвика
+    минаващ обект. Обичайната рязкост и сцената се обновяват само от нормални кадри;
+    преместена камера става новата сцена след RESEED_CHECKS проверки.
+    """
+    BLACKOUT_MEAN = 20
+    UNIFORM_STD = 6
+    DEFOCUS_RATIO = 0.25
+    SCENE_CORRELATION = 0.4
+    CONFIRM_CHECKS = 2
+    RESEED_CHECKS = 10
+    REFERENCE_SIZE = (64, 36)
+
+    def __init__(self, interval=3.0, width=320):
+        self.interval = interval
+        self.width = width
+        self.state = ""
+        # Време за проверките, за да може разходът да се измери.
+        self.cpu_seconds = 0.0
+        self.checks = 0
+        self._scratch = ScratchBuffers()
+        self._next_check = 0.0
+        self._sharpness = None
+        self._reference = None
+        self._candidate = ""
+        self._candidate_count = 0
+        self._state_checks = 0
+
+    def check(self, frame, now=None):
+        """
+        Проверява кадъра, ако е време. Връща новото състояние при промяна ("" - картината
+        е нормална), иначе None.
+        """
+        now = time.monotonic() if now is None else now
+        if now < self._next_check:
+            return None
+        self._next_check = now + self.interval
+        started = time.perf_counter()
+        problem = self._classify(frame)
+        self.cpu_seconds += time.perf_counter() - started
+        self.checks += 1
+        return self._confirm(problem)
+
+    def _confirm(self, problem):
+        if problem == self.state:
+            self._candidate, self._candidate_count = "", 0
+            self._state_checks += 1
+            if problem == "scene_change" and self._state_checks >= self.RESEED_CHECKS:
+                self._reference = None
+            return None
+        if problem == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate, self._candidate_count = problem, 1
+        if self._candidate_count < self.CONFIRM_CHECKS:
+            return None
+        self.state, self._state_checks = problem, 0
+        self._candidate, self._candidate_count = "", 0
+        return problem
+
+    def _classify(self, frame):
+        src_h, src_w = frame.shape[:2]
+        w = min(self.width, src_w)
+        h = max(1, round(w * src_h / src_w))
+        small = cv2.resize(frame, (w, h), dst=self._scratch.get("small", (h, w, 3)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._scratch.get("gray", (h, w)))
+
+        mean, std = (float(v[0][0]) for v in cv2.meanStdDev(gray))
+        if std < self.UNIFORM_STD:
+            return "blackout" if mean < self.BLACKOUT_MEAN else "uniform"
+
+        tiny = cv2.resize(gray, self.REFERENCE_SIZE, dst=self._scratch.get("tiny", self.REFERENCE_SIZE[::-1]),
+                          interpolation=cv2.INTER_AREA)
+        if self._reference is not None:
+            correlation = cv2.matchTemplate(tiny, self._reference, cv2.TM_CCOEFF_NORMED)[0, 0]
+            if correlation < self.SCENE_CORRELATION:
+                return "scene_change"
+
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S, dst=self._scratch.get("laplacian", (h, w), np.int16))
+        sharpness = float(cv2.meanStdDev(laplacian)[1][0][0]) ** 2
+        if self._sharpness is not None and sharpness < self.DEFOCUS_RATIO * self._sharpness:
+            return "defocus"
+
+        # Нормален кадър: обичайната рязкост и сцената следват бавните промени (здрач, сезони).
+        if self._sharpness is None:
+            self._sharpness = sharpness
+        else:
+            self._sharpness = 0.9 * self._sharpness + 0.1 * sharpness
+        if self._reference is None:
+            self._reference = tiny.copy()
+        else:
+            cv2.addWeighted(self._reference, 0.8, tiny, 0.2, 0, dst=self._reference)
+        return ""
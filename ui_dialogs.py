@@ -1,15 +1,23 @@
+import copy
+
 from PySide6.QtWidgets import (
     QDialog, QDialogButtonBox, QVBoxLayout, QFormLayout, 
-    QLineEdit, QCheckBox, QLabel, QComboBox, QTimeEdit, QGroupBox, QHBoxLayout
+    QLineEdit, QCheckBox, QLabel, QComboBox, QTimeEdit, QGroupBox, QHBoxLayout, QSpinBox,
+    QPushButton, QListWidget
 )
 from PySide6.QtCore import QTime
+from PySide6.QtGui import QImage
 
-from data_manager import get_translator
+from data_manager import DataManager, get_translator
+from storage_volumes import recording_volumes
+from ui_widgets import ZoneEditorCanvas
 
 class CameraDialog(QDialog):
-    def __init__(self, camera_data=None, parent=None):
+    def __init__(self, camera_data=None, preview_frame=None, parent=None):
         super().__init__(parent)
         self.is_edit_mode = camera_data is not None
+        self.preview_frame = preview_frame
+        self.motion_zones = copy.deepcopy(camera_data.get("motion_zones", [])) if camera_data else []
         translator = get_translator()
         
         window_title_key = "edit_camera_title" if self.is_edit_mode else "add_camera_title"
@@ -21,8 +29,40 @@ class CameraDialog(QDialog):
 
         self.name_input = QLineEdit()
         self.url_input = QLineEdit()
+        self.substream_input = QLineEdit()
+        self.substream_input.setPlaceholderText(translator.get_string("substream_address_placeholder"))
         self.status_checkbox = QCheckBox(translator.get_string("active_checkbox"))
         self.motion_checkbox = QCheckBox(translator.get_string("motion_detection_checkbox"))
+        self.motion_recording_checkbox = QCheckBox(translator.get_string("motion_recording_checkbox"))
+        self.tamper_checkbox = QCheckBox(translator.get_string("tamper_detection_checkbox"))
+        self.post_motion_input = QSpinBox()
+        self.post_motion_input.setRange(1, 600)
+        self.post_motion_input.setSuffix(" s")
+        self.min_clip_input = QSpinBox()
+        self.min_clip_input.setRange(1, 600)
+        self.min_clip_input.setSuffix(" s")
+        self.sensitivity_input = QSpinBox()
+        self.sensitivity_input.setRange(1, 100)
+        self.detector_combo = QComboBox()
+        self.detector_combo.addItem(translator.get_string("motion_detector_background"), "background")
+        self.detector_combo.addItem(translator.get_string("motion_detector_mog2"), "mog2")
+        self.detector_combo.addItem(translator.get_string("motion_detector_frame_diff"), "frame_diff")
+        self.fsync_combo = QComboBox()
+        self.fsync_combo.addItem(translator.get_string("fsync_never"), "never")
+        self.fsync_combo.addItem(translator.get_string("fsync_segment"), "segment")
+        self.fsync_combo.addItem(translator.get_string("fsync_interval"), "interval")
+        self.fsync_seconds_input = QSpinBox()
+        self.fsync_seconds_input.setRange(1, 600)
+        self.fsync_seconds_input.setSuffix(" s")
+        self.fsync_combo.currentIndexChanged.connect(
+            lambda: self.fsync_seconds_input.setEnabled(self.fsync_combo.currentData() == "interval"))
+        self.volume_combo = QComboBox()
+        self.volume_combo.addItem(translator.get_string("recording_volume_auto"), "")
+        for volume in recording_volumes(DataManager.load_settings()):
+            self.volume_combo.addItem(volume["path"], volume["path"])
+        self.zones_button = QPushButton()
+        self.zones_button.clicked.connect(self.edit_motion_zones)
+        self.update_zones_button()
 
         self.username_input = QLineEdit()
         self.password_input = QLineEdit()
@@ -52,8 +92,24 @@ class CameraDialog(QDialog):
         if self.is_edit_mode:
             self.name_input.setText(camera_data.get("name", ""))
             self.url_input.setText(camera_data.get("rtsp_url", ""))
+            self.substream_input.setText(camera_data.get("substream_url", ""))
             self.status_checkbox.setChecked(camera_data.get("is_active", True))
             self.motion_checkbox.setChecked(camera_data.get("motion_enabled", True))
+            self.motion_recording_checkbox.setChecked(camera_data.get("motion_recording", False))
+            self.tamper_checkbox.setChecked(camera_data.get("tamper_detection", True))
+            self.post_motion_input.setValue(camera_data.get("post_motion_seconds", 10))
+            self.min_clip_input.setValue(camera_data.get("min_clip_seconds", 5))
+            self.sensitivity_input.setValue(camera_data.get("motion_sensitivity", 50))
+            index = self.detector_combo.findData(camera_data.get("motion_detector", "background"))
+            if index != -1: self.detector_combo.setCurrentIndex(index)
+            index = self.fsync_combo.findData(camera_data.get("fsync_policy", "never"))
+            if index != -1: self.fsync_combo.setCurrentIndex(index)
+            self.fsync_seconds_input.setValue(camera_data.get("fsync_seconds", 10))
+            volume = camera_data.get("recording_volume", "")
+            if volume and self.volume_combo.findData(volume) == -1:
+                # Томът е махнат от настройките - остава избран, докато не се смени.
+                self.volume_combo.addItem(volume, volume)
+            self.volume_combo.setCurrentIndex(self.volume_combo.findData(volume))
             self.username_input.setText(camera_data.get("username", ""))
             self.password_input.setText(camera_data.get("password", ""))
             
@@ -66,13 +122,30 @@ class CameraDialog(QDialog):
         else:
             self.status_checkbox.setChecked(True)
             self.motion_checkbox.setChecked(True)
+            self.tamper_checkbox.setChecked(True)
+            self.post_motion_input.setValue(10)
+            self.min_clip_input.setValue(5)
+            self.sensitivity_input.setValue(50)
+            self.fsync_seconds_input.setValue(10)
+        self.fsync_seconds_input.setEnabled(self.fsync_combo.currentData() == "interval")
 
         form_layout.addRow(translator.get_string("camera_name_label"), self.name_input)
         form_layout.addRow(translator.get_string("rtsp_address_label"), self.url_input)
+        form_layout.addRow(translator.get_string("substream_address_label"), self.substream_input)
         form_layout.addRow(translator.get_string("camera_username_label"), self.username_input)
         form_layout.addRow(translator.get_string("camera_password_label"), self.password_input)
         form_layout.addRow(self.status_checkbox)
         form_layout.addRow(self.motion_checkbox)
+        form_layout.addRow(translator.get_string("motion_sensitivity_label"), self.sensitivity_input)
+        form_layout.addRow(translator.get_string("motion_detector_label"), self.detector_combo)
+        form_layout.addRow(translator.get_string("motion_zones_label"), self.zones_button)
+        form_layout.addRow(self.motion_recording_checkbox)
+        form_layout.addRow(self.tamper_checkbox)
+        form_layout.addRow(translator.get_string("post_motion_label"), self.post_motion_input)
+        form_layout.addRow(translator.get_string("min_clip_label"), self.min_clip_input)
+        form_layout.addRow(translator.get_string("recording_volume_label"), self.volume_combo)
+        form_layout.addRow(translator.get_string("fsync_policy_label"), self.fsync_combo)
+        form_layout.addRow(translator.get_string("fsync_seconds_label"), self.fsync_seconds_input)
 
         self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         self.button_box.accepted.connect(self.accept)
@@ -82,6 +155,15 @@ class CameraDialog(QDialog):
         main_layout.addWidget(schedule_group)
         main_layout.addWidget(self.button_box)
 
+    def update_zones_button(self):
+        self.zones_button.setText(get_translator().get_string("motion_zones_button").format(count=len(self.motion_zones)))
+
+    def edit_motion_zones(self):
+        dialog = ZoneEditorDialog(self.motion_zones, self.preview_frame, parent=self)
+        if dialog.exec():
+            self.motion_zones = dialog.get_zones()
+            self.update_zones_button()
+
     def get_data(self):
         schedule_data = {}
         for day, widgets in self.schedule_widgets.items():
@@ -94,13 +176,116 @@ class CameraDialog(QDialog):
         return {
             "name": self.name_input.text().strip(),
             "rtsp_url": self.url_input.text().strip(),
+            "substream_url": self.substream_input.text().strip(),
             "is_active": self.status_checkbox.isChecked(),
             "motion_enabled": self.motion_checkbox.isChecked(),
+            "motion_sensitivity": self.sensitivity_input.value(),
+            "motion_detector": self.detector_combo.currentData(),
+            "motion_recording": self.motion_recording_checkbox.isChecked(),
+            "post_motion_seconds": self.post_motion_input.value(),
+            "min_clip_seconds": self.min_clip_input.value(),
+            "fsync_policy": self.fsync_combo.currentData(),
+            "fsync_seconds": self.fsync_seconds_input.value(),
+            "recording_volume": self.volume_combo.currentData(),
+            "motion_zones": self.motion_zones,
+            "tamper_detection": self.tamper_checkbox.isChecked(),
             "username": self.username_input.text().strip(),
             "password": self.password_input.text(),
             "schedule": schedule_data
         }
 
+class ZoneEditorDialog(QDialog):
+    """
+    Диалог за зоните на движение на камера: многоъгълниците се чертаят върху последния
+    кадър, а всяка зона има име и тип - включваща или изключваща.
+    """
+    def __init__(self, zones, preview_frame=None, parent=None):
+        super().__init__(parent)
+        translator = get_translator()
+        self.setWindowTitle(translator.get_string("motion_zones_title"))
+        self.setMinimumSize(760, 560)
+
+        image = None
+        if preview_frame is not None:
+            h, w = preview_frame.shape[:2]
+            image = QImage(preview_frame.data, w, h, preview_frame.strides[0], QImage.Format.Format_BGR888).copy()
+        self.canvas = ZoneEditorCanvas(image)
+        self.canvas.zones = copy.deepcopy(zones)
+        self.canvas.polygon_finished.connect(self.add_zone)
+
+        self.zone_list = QListWidget()
+        self.zone_list.currentRowChanged.connect(self.select_zone)
+        self.name_input = QLineEdit()
+        self.type_combo = QComboBox()
+        self.type_combo.addItem(translator.get_string("zone_type_include"), "include")
+        self.type_combo.addItem(translator.get_string("zone_type_exclude"), "exclude")
+        add_button = QPushButton(translator.get_string("zone_add_button"))
+        add_button.clicked.connect(self.add_zone)
+        clear_button = QPushButton(translator.get_string("zone_clear_points_button"))
+        clear_button.clicked.connect(self.canvas.clear_points)
+        delete_button = QPushButton(translator.get_string("zone_delete_button"))
+        delete_button.clicked.connect(self.delete_zone)
+
+        side_layout = QVBoxLayout()
+        form_layout = QFormLayout()
+        form_layout.addRow(translator.get_string("zone_name_label"), self.name_input)
+        form_layout.addRow(translator.get_string("zone_type_label"), self.type_combo)
+        side_layout.addLayout(form_layout)
+        side_layout.addWidget(add_button)
+        side_layout.addWidget(clear_button)
+        side_layout.addWidget(self.zone_list)
+        side_layout.addWidget(delete_button)
+
+        content_layout = QHBoxLayout()
+        content_layout.addWidget(self.canvas, 1)
+        content_layout.addLayout(side_layout)
+
+        hint = QLabel(translator.get_string("zone_editor_hint"))
+        hint.setWordWrap(True)
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.addWidget(hint)
+        main_layout.addLayout(content_layout, 1)
+        main_layout.addWidget(button_box)
+        self.refresh_zone_list()
+
+    def refresh_zone_list(self):
+        translator = get_translator()
+        self.zone_list.blockSignals(True)
+        self.zone_list.clear()
+        for zone in self.canvas.zones:
+            type_text = translator.get_string(f"zone_type_{zone.get('type', 'include')}")
+            self.zone_list.addItem(f"{zone.get('name') or '-'} ({type_text})")
+        self.zone_list.blockSignals(False)
+        self.canvas.selected_index = -1
+        self.canvas.update()
+
+    def select_zone(self, row):
+        self.canvas.selected_index = row
+        self.canvas.update()
+
+    def add_zone(self):
+        if len(self.canvas.points) < 3:
+            return
+        name = self.name_input.text().strip() or f"{get_translator().get_string('zone_default_name')} {len(self.canvas.zones) + 1}"
+        self.canvas.zones.append({"name": name, "type": self.type_combo.currentData(), "points": self.canvas.points})
+        self.canvas.points = []
+        self.name_input.clear()
+        self.refresh_zone_list()
+
+    def delete_zone(self):
+        row = self.zone_list.currentRow()
+        if 0 <= row < len(self.canvas.zones):
+            del self.canvas.zones[row]
+            self.refresh_zone_list()
+
+    def get_zones(self):
+        return self.canvas.zones
+
+
 class UserDialog(QDialog):
     """Диалогов прозорец за добавяне или редактиране на потребител."""
     def __init__(self, user_data=None, parent=None):
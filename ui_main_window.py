@@ -8,19 +8,30 @@ import cv2
 import numpy as np
 from queue import Empty, Full
 import threading
+import time
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
     QPushButton, QStackedWidget, QLabel, QMessageBox, QProgressDialog, QListWidgetItem, QFormLayout,
     QFileDialog
 )
 from PySide6.QtCore import QSize, Qt, QThread, QTimer, Signal, QTime
-from PySide6.QtGui import QIcon, QKeyEvent
+from PySide6.QtGui import QIcon, QKeyEvent, QGuiApplication
 
 from data_manager import DataManager, get_translator
 from ui_pages import CamerasPage, LiveViewPage, RecordingsPage, SettingsPage, UsersPage
 from ui_dialogs import CameraDialog, UserDialog
-from video_worker import VideoWorker, RecordingWorker
-from ui_widgets import VideoFrame
+from video_worker import VideoWorker
+from frame_buffer import FrameMailbox, PreEventPool
+from recording import FfmpegRemuxRecorder, create_recorder
+from motion_detection import BatchMotionAnalyzer
+from motion_events import MOTION_EVENT_TYPE, MotionEventTracker
+from person_detection import PERSON_DETECTION_ENABLED, PersonDetectorPool
+from encoder_pool import EncoderPool
+from storage_io import get_storage_io
+from storage_volumes import choose_volume, recording_volumes, volume_of, volume_states
+from motion_index import motion_index_path
+from tamper_detection import TAMPER_STATUS
+from ui_widgets import VideoFrame, LiveGridCompositor
 from network_scanner import NetworkScanner, get_local_subnet
 from ui_media_viewer import MediaViewerDialog
 from ui_info_dialog import InfoDialog
@@ -45,6 +56,9 @@ class DownloadWorker(QThread):
             progress_callback=self.progress.emit,
             check_cancel_callback=lambda: self._is_cancelled
         )
+        if success and not self._is_cancelled:
+            # Индексът на движението е по избор - ако го няма, прегледът сканира записа сам.
+            self.remote_client.download_file(str(motion_index_path(self.remote_path)), str(motion_index_path(self.local_path)))
         self.finished.emit(success, path_or_error)
 
     def cancel(self):
@@ -54,6 +68,16 @@ class MainWindow(QMainWindow):
     logout_requested = Signal()
     restart_requested = Signal()
 
+    # След отказан запис при движение (няма място) камерата не опитва отново толкова секунди.
+    MOTION_RECORDING_RETRY_SECONDS = 30
+
+    # Ключ на записа (и на заявката към основния поток) -> тип на събитието.
+    RECORDER_EVENT_TYPES = {
+        "manual_recording": "Ръчен запис",
+        "scheduled_recording": "Запис по график",
+        "motion_recording": "Запис при движение",
+    }
+
     def __init__(self, base_dir, user_role, command_queue):
         super().__init__()
         self.translator = get_translator()
@@ -66,7 +90,10 @@ class MainWindow(QMainWindow):
 
         self.video_workers = {}
         self.zombie_workers = [] # Списък за "изоставени" нишки, които да се самоизключат
+        # Спрените записи, които още довършват файла си (ffmpeg, кодиране в пула).
+        self.stopping_recorders = []
         self.active_video_widgets = {}
+        self.display_subscriptions = {}
         self.manual_recorders = {} 
         self.created_pages = {}
         
@@ -79,15 +106,65 @@ class MainWindow(QMainWindow):
         
         self.is_fullscreen = False
         self.fullscreen_widget = None
+        self.fullscreen_cam_id = None
+        self.live_compositor = None
+        self.visible_video_widgets = []
+
+        self.subscription_timer = QTimer(self)
+        self.subscription_timer.setSingleShot(True)
+        self.subscription_timer.timeout.connect(self.update_display_subscriptions)
+
+        # Worker-ите оставят последния си кадър тук, а един таймер ги показва всички наведнъж.
+        self.frame_mailbox = FrameMailbox()
+        self.display_timer = QTimer(self)
+        self.display_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.display_timer.timeout.connect(self.drain_frame_mailbox)
+        self.apply_display_rate()
+
+        # Общ бюджет памет за секундите преди събитие на всички камери.
+        settings = DataManager.load_settings()
+        self.pre_event_pool = PreEventPool(settings.get("preroll_seconds", 5), settings.get("preroll_memory_mb", 256) * 1024 ** 2)
+        # Един анализ на движението за всички камери вместо отделен във всеки worker.
+        self.motion_analyzer = None
+        if settings.get("batched_motion_analysis", True):
+            self.motion_analyzer = BatchMotionAnalyzer()
+            self.motion_analyzer.start()
+        # Проверка за хора в кадрите с движение, обща за всички камери.
+        self.person_detector = None
+        if settings.get("person_detection", False) and PERSON_DETECTION_ENABLED:
+            self.person_detector = PersonDetectorPool(budget_per_second=settings.get("person_detection_budget", 4))
+            self.person_detector.start()
+        # Прекодиращите записи кодират в общ пул от процеси, а не в нишки на този процес.
+        self.encoder_pool = None
+        if settings.get("encoder_pool", True):
+            self.encoder_pool = EncoderPool()
+            self.encoder_pool.start()
 
         self.command_timer = QTimer(self)
         self.command_timer.timeout.connect(self.process_command_queue)
         self.command_timer.start(250)
         
         self.scheduled_recorders = {}
+        # Записи при движение: кога е започнал записът и кога е засечено последното движение.
+        self.motion_recorders = {}
+        self.motion_recording_started = {}
+        self.last_motion_time = {}
+        self.motion_recording_refused = {}
+        self.motion_recording_timer = QTimer(self)
+        self.motion_recording_timer.timeout.connect(self.check_motion_recordings)
+        self.motion_recording_timer.start(1000)
+        # Сегментите движение се пазят в паметта и се записват в events.json на порции.
+        self.motion_events = MotionEventTracker()
+        self.motion_events_timer = QTimer(self)
+        self.motion_events_timer.timeout.connect(self.flush_motion_events)
+        self.motion_events_timer.start(10000)
         self.schedule_check_timer = QTimer(self)
         self.schedule_check_timer.timeout.connect(self.check_schedules)
         self.schedule_check_timer.start(30000)
+        # Статистиката на записите в настройките се опреснява, докато страницата е отворена.
+        self.recording_stats_timer = QTimer(self)
+        self.recording_stats_timer.timeout.connect(self.refresh_recording_stats)
+        self.recording_stats_timer.start(2000)
 
         main_widget = QWidget()
         main_layout = QHBoxLayout(main_widget)
@@ -167,13 +244,26 @@ class MainWindow(QMainWindow):
         if is_entering_fullscreen:
             self.fullscreen_widget = target_widget
             if self.fullscreen_widget:
-                for widget in self.active_video_widgets.values():
-                    if widget != self.fullscreen_widget:
-                        widget.hide()
-                        widget.setParent(None)
+                if self.live_compositor:
+                    self.live_compositor.set_layout([self.fullscreen_widget], 1)
+                else:
+                    for widget in self.active_video_widgets.values():
+                        if widget != self.fullscreen_widget:
+                            widget.hide()
+                            widget.setParent(None)
+                self.visible_video_widgets = [self.fullscreen_widget]
+                # На цял екран една камера се показва от основния поток.
+                self.fullscreen_cam_id = self.fullscreen_widget.camera_id
+                worker = self.video_workers.get(self.fullscreen_cam_id)
+                if worker: worker.acquire_main_stream("fullscreen")
             self.setWindowState(self.windowState() | Qt.WindowFullScreen)
+            self.update_display_subscriptions()
         else:
             self.setWindowState(self.windowState() & ~Qt.WindowFullScreen)
+            if self.fullscreen_cam_id:
+                worker = self.video_workers.get(self.fullscreen_cam_id)
+                if worker: worker.release_main_stream("fullscreen")
+                self.fullscreen_cam_id = None
             self.fullscreen_widget = None
             self.update_grid_layout()
             
@@ -296,13 +386,15 @@ class MainWindow(QMainWindow):
         page.path_edit.setVisible(is_admin_local)
         page.browse_button.setVisible(is_admin_local)
         page.recording_structure_combo.setVisible(is_admin_local)
+        page.recording_backend_combo.setVisible(is_admin_local)
         page.save_button.setVisible(is_admin_local)
         form_layout = page.layout().itemAt(1)
         for i in range(form_layout.rowCount()):
             label_item = form_layout.itemAt(i, QFormLayout.ItemRole.LabelRole)
             if label_item:
                 label_widget = label_item.widget()
-                if label_widget.text() in [self.translator.get_string("recordings_folder_label"), self.translator.get_string("recording_structure_label")]:
+                if label_widget.text() in [self.translator.get_string("recordings_folder_label"), self.translator.get_string("recording_structure_label"),
+                                           self.translator.get_string("recording_backend_label")]:
                     label_widget.setVisible(is_admin_local)
 
     def show_users_page(self):
@@ -321,6 +413,8 @@ class MainWindow(QMainWindow):
         
         page.camera_filter.currentIndexChanged.connect(self.apply_event_filters)
         page.event_type_filter.currentIndexChanged.connect(self.apply_event_filters)
+        page.zone_filter.currentIndexChanged.connect(self.apply_event_filters)
+        page.person_filter_checkbox.toggled.connect(self.apply_event_filters)
         
         if self.user_role == "Administrator":
             page.delete_button.show()
@@ -388,6 +482,25 @@ class MainWindow(QMainWindow):
         action = settings_data.get("storage_action", "stop")
         index = page.storage_action_combo.findData(action)
         if index != -1: page.storage_action_combo.setCurrentIndex(index)
+        index = page.live_renderer_combo.findData(settings_data.get("live_renderer", "widgets"))
+        if index != -1: page.live_renderer_combo.setCurrentIndex(index)
+        page.display_fps_input.setText(str(settings_data.get("display_fps", 0)))
+        index = page.recording_backend_combo.findData(settings_data.get("recording_backend", "remux"))
+        if index != -1: page.recording_backend_combo.setCurrentIndex(index)
+        page.preroll_seconds_input.setText(str(settings_data.get("preroll_seconds", 5)))
+        page.preroll_memory_input.setText(str(settings_data.get("preroll_memory_mb", 256)))
+        page.batched_motion_checkbox.setChecked(settings_data.get("batched_motion_analysis", True))
+        page.adaptive_recording_checkbox.setChecked(settings_data.get("adaptive_recording", False))
+        page.adaptive_idle_fps_input.setText(str(settings_data.get("adaptive_idle_fps", 1)))
+        page.adaptive_idle_scale_input.setText(str(settings_data.get("adaptive_idle_scale", 50)))
+        page.segment_minutes_input.setText(str(settings_data.get("segment_minutes", 15)))
+        page.person_detection_checkbox.setChecked(settings_data.get("person_detection", False))
+        page.person_detection_checkbox.setEnabled(PERSON_DETECTION_ENABLED)
+        page.person_budget_input.setText(str(settings_data.get("person_detection_budget", 4)))
+        page.encoder_pool_checkbox.setChecked(settings_data.get("encoder_pool", True))
+        page.set_recording_volumes(settings_data.get("recording_volumes", []))
+        page.storage_usage_label.setText(self.format_storage_usage())
+        self.refresh_recording_stats()
 
     def apply_theme(self, theme_name):
         style_file_name = "style.qss" if theme_name == "dark" else "style_light.qss"
@@ -407,17 +520,34 @@ class MainWindow(QMainWindow):
         new_theme = "dark" if page.theme_combo.currentText() == self.translator.get_string("dark_theme") else "light"
         new_lang = page.lang_combo.currentData()
         new_structure = page.recording_structure_combo.currentData()
-        new_settings = {
+        new_settings = dict(current_settings)
+        new_settings.update({
             "theme": new_theme,
             "default_grid": page.grid_combo.currentText(),
             "recording_path": page.path_edit.text(),
             "language": new_lang,
             "recording_structure": new_structure,
             "storage_limit_gb": int(page.storage_limit_input.text() or 0),
-            "storage_action": page.storage_action_combo.currentData()
-        }
+            "storage_action": page.storage_action_combo.currentData(),
+            "live_renderer": page.live_renderer_combo.currentData(),
+            "display_fps": int(page.display_fps_input.text() or 0),
+            "recording_backend": page.recording_backend_combo.currentData(),
+            "preroll_seconds": int(page.preroll_seconds_input.text() or 0),
+            "preroll_memory_mb": int(page.preroll_memory_input.text() or 0),
+            "batched_motion_analysis": page.batched_motion_checkbox.isChecked(),
+            "adaptive_recording": page.adaptive_recording_checkbox.isChecked(),
+            "adaptive_idle_fps": int(page.adaptive_idle_fps_input.text() or 1),
+            "adaptive_idle_scale": int(page.adaptive_idle_scale_input.text() or 100),
+            "segment_minutes": int(page.segment_minutes_input.text() or 0),
+            "person_detection": page.person_detection_checkbox.isChecked(),
+            "person_detection_budget": int(page.person_budget_input.text() or 1),
+            "encoder_pool": page.encoder_pool_checkbox.isChecked(),
+            "recording_volumes": page.get_recording_volumes()
+        })
         DataManager.save_settings(new_settings)
         self.apply_theme(new_theme)
+        self.apply_display_rate()
+        self.pre_event_pool.configure(new_settings["preroll_seconds"], new_settings["preroll_memory_mb"] * 1024 ** 2)
         if old_lang != new_lang: self.restart_requested.emit()
         else: QMessageBox.information(self, "Успех", "Настройките бяха запазени успешно!")
         
@@ -434,44 +564,87 @@ class MainWindow(QMainWindow):
         return total_size
 
     def check_storage_limit(self):
-        if self.is_remote_mode: return True
+        """
+        Прилага лимита на всеки том за запис поотделно: при "overwrite" изтрива най-старите записи
+        на пълния том, при "stop" томът спира да получава нови записи. Връща състоянието на томовете
+        (volume_states) за get_recording_path_for_camera, за да не се обхождат папките повторно,
+        или None, ако не е останал том с място.
+        """
+        if self.is_remote_mode: return []
 
         settings = DataManager.load_settings()
-        limit_gb = settings.get("storage_limit_gb", 0)
         action = settings.get("storage_action", "stop")
-        recordings_path = settings.get("recording_path")
-
-        if not recordings_path or limit_gb <= 0:
-            return True
-
-        limit_bytes = limit_gb * (1024**3)
-        current_size_bytes = self.get_folder_size(recordings_path)
-
-        if current_size_bytes < limit_bytes:
-            return True
-
-        print(f"Лимитът на съхранение ({limit_gb}GB) е достигнат.")
-        
-        if action == "stop":
-            print("Действие: Спиране на нови записи.")
-            return False
-        
-        elif action == "overwrite":
-            print("Действие: Презаписване на най-старите файлове...")
-            all_events = DataManager.load_events()
-            all_events.sort(key=lambda x: x.get("timestamp"))
-
-            while self.get_folder_size(recordings_path) >= limit_bytes:
-                if not all_events:
-                    print("Няма повече събития за изтриване.")
-                    break
+        volumes = recording_volumes(settings)
+        if not volumes:
+            return []
+
+        states = self._volume_states(volumes)
+        freed = False
+        for volume, state in zip(volumes, states):
+            if state["used"] is None or state["used"] < state["limit"]:
+                continue
+            print(f"Лимитът на съхранение ({volume['limit_gb']}GB) на {volume['path']} е достигнат.")
+            if action == "stop":
+                print("Действие: Спиране на нови записи в този том.")
+            elif action == "overwrite":
+                print("Действие: Презаписване на най-старите файлове...")
+                self._free_volume(volume, volumes, state["limit"])
+                freed = True
+        if freed:
+            states = self._volume_states(volumes)
+
+        if choose_volume(states) is None:
+            print("Няма том за запис със свободно място.")
+            return None
+        return states
+
+    def _free_volume(self, volume, volumes, limit_bytes):
+        """Изтрива най-старите записи на тома, докато заетото място падне под лимита."""
+        # Сегментираните записи се изтриват сегмент по сегмент, а останалите - по събитие.
+        # Събитията за движение нямат собствен файл и се махат заедно със записа си.
+        units = [(datetime.strptime(e["timestamp"], "%Y-%m-%d %H:%M:%S").timestamp(), e, None)
+                 for e in DataManager.load_events()
+                 if not e.get("recording_id") and e.get("event_type") != MOTION_EVENT_TYPE
+                 and volume_of(e.get("file_path"), volumes) is volume]
+        units += [(segment.get("start", 0), None, segment) for segment in DataManager.load_segments()
+                  if volume_of(segment.get("file_path"), volumes) is volume]
+        units.sort(key=lambda unit: unit[0])
+
+        while self.get_folder_size(volume["path"]) >= limit_bytes:
+            if not units:
+                print("Няма повече събития за изтриване.")
+                break
 
-                oldest_event = all_events.pop(0)
+            _, oldest_event, segment = units.pop(0)
+            if oldest_event is not None:
                 self._perform_delete(oldest_event)
-            
-            return True
-
-        return False
+            else:
+                deleted = self._delete_segments([segment])
+                if deleted:
+                    self._remove_empty_segmented_events(deleted)
+
+    def _volume_states(self, volumes):
+        return volume_states(volumes, self._recording_files(), self.get_folder_size)
+
+    def storage_usage(self):
+        """Заетото и свободното място и текущите записи по томове (виж volume_states)."""
+        return self._volume_states(recording_volumes(DataManager.load_settings()))
+
+    def format_storage_usage(self):
+        lines = []
+        for state in self.storage_usage():
+            if not state["available"]:
+                lines.append(self.translator.get_string("storage_volume_unavailable").format(path=state["path"]))
+                continue
+            if state["used"] is None:
+                # Том без лимит: папката не се обхожда, показва се само свободното на диска.
+                lines.append(self.translator.get_string("storage_volume_free").format(
+                    path=state["path"], free=state["free"] / 1024**3, active=state["active"]))
+                continue
+            lines.append(self.translator.get_string("storage_volume_usage").format(
+                path=state["path"], used=state["used"] / 1024**3, free=max(0, state["free"]) / 1024**3,
+                active=state["active"]))
+        return "\n".join(lines)
 
     def start_backend_workers(self):
         if self.video_workers: return
@@ -493,13 +666,22 @@ class MainWindow(QMainWindow):
         cameras_data = self.load_cameras()
         if not cameras_data: return
 
+        # "compositor" рисува цялата мрежа в един уиджет вместо по един VideoFrame на камера.
+        if DataManager.load_settings().get("live_renderer") == "compositor":
+            self.live_compositor = LiveGridCompositor()
+            page.grid_layout.addWidget(self.live_compositor, 0, 0)
+
         active_cameras = [cam for cam in cameras_data if cam.get("is_active")]
         for cam_data in active_cameras:
             cam_id = cam_data.get("id")
             page.camera_selector.addItem(cam_data["name"], cam_id)
             
-            frame_widget = VideoFrame(camera_name=cam_data.get("name"), camera_id=cam_id)
+            if self.live_compositor:
+                frame_widget = self.live_compositor.add_tile(cam_data.get("name"), cam_id)
+            else:
+                frame_widget = VideoFrame(camera_name=cam_data.get("name"), camera_id=cam_id)
             frame_widget.double_clicked.connect(lambda widget=frame_widget: self.toggle_fullscreen(widget))
+            frame_widget.resized.connect(self.subscription_timer.start)
             self.active_video_widgets[cam_id] = frame_widget
         
         self.update_grid_layout()
@@ -511,8 +693,42 @@ class MainWindow(QMainWindow):
                 child = page.grid_layout.takeAt(0)
                 if child.widget():
                     child.widget().deleteLater()
+        self.live_compositor = None
         self.active_video_widgets.clear()
-        
+        self.visible_video_widgets = []
+        self.update_display_subscriptions()
+
+    def update_display_subscriptions(self):
+        """Съобщава на всеки worker дали камерата му се вижда и в какъв размер.
+
+        Невидимите камери пропускат преоразмеряването и създаването на QImage изцяло.
+        """
+        page = self.created_pages.get("live_view")
+        subscriptions = {}
+        if page and self.pages.currentWidget() == page:
+            for cam_id, widget in self.active_video_widgets.items():
+                if widget.isVisible():
+                    width, height = widget.display_size()
+                    if width < 16 or height < 16:
+                        width, height = 1280, 720
+                    subscriptions[cam_id] = (width, height)
+        self.display_subscriptions = subscriptions
+        for cam_id, worker in self.video_workers.items():
+            worker.set_display_size(subscriptions.get(cam_id))
+
+    def apply_display_rate(self):
+        """Настройва таймера за показване според display_fps (0 = честотата на екрана)."""
+        fps = DataManager.load_settings().get("display_fps", 0)
+        if fps <= 0:
+            screen = self.screen() or QGuiApplication.primaryScreen()
+            fps = screen.refreshRate() if screen else 0
+            if fps <= 0: fps = 60
+        self.display_timer.start(max(1, round(1000 / fps)))
+
+    def drain_frame_mailbox(self):
+        for cam_id, q_image in self.frame_mailbox.take_all().items():
+            self.dispatch_image_update(cam_id, q_image)
+
     def dispatch_image_update(self, cam_id, q_image):
         if cam_id in self.active_video_widgets:
             self.active_video_widgets[cam_id].update_frame(q_image)
@@ -521,11 +737,6 @@ class MainWindow(QMainWindow):
         if cam_id in self.active_video_widgets:
             self.active_video_widgets[cam_id].update_status(status)
 
-    def dispatch_frame_for_recording(self, cam_id, frame):
-        recorder = self.manual_recorders.get(cam_id) or self.scheduled_recorders.get(cam_id)
-        if recorder and recorder.isRunning():
-            recorder.add_frame(frame)
-    
     def check_schedules(self):
         if self.is_remote_mode: return
 
@@ -557,36 +768,35 @@ class MainWindow(QMainWindow):
             if not worker: continue
 
             if should_record and not is_currently_recording:
-                if not self.check_storage_limit():
+                states = self.check_storage_limit()
+                if states is None:
                     print(f"Лимитът е достигнат, записът по график за {cam_id} няма да стартира.")
                     continue
 
-                recording_path = self.get_recording_path_for_camera(worker)
+                recording_path = self.get_recording_path_for_camera(worker, states)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 safe_name = self.sanitize_filename(worker.camera_data['name'])
                 filename = recording_path / f"sched_{safe_name}_{timestamp}.mp4"
                 
-                frame = worker.get_latest_frame()
-                if frame is None: continue
-                height, width, _ = frame.shape
+                if not worker.has_frame(): continue
                 
-                recorder = RecordingWorker(str(filename), width, height, 20.0)
-                recorder.start()
-                self.scheduled_recorders[cam_id] = recorder
+                segment_minutes = DataManager.load_settings().get("segment_minutes", 15)
+                recorder = self._start_recorder(worker, "scheduled_recording", filename, adaptive=self._adaptive_recording_options(worker),
+                                                segment_seconds=segment_minutes * 60 if segment_minutes > 0 else None)
                 
                 widget = self.active_video_widgets.get(cam_id)
                 if widget: widget.set_recording_state(True)
                 
-                self.add_event(cam_id, "Запис по график", str(filename))
+                self.add_event(cam_id, "Запис по график", recorder.filename, recording_id=getattr(recorder, "recording_id", None))
                 print(f"Запис по график стартиран за {cam_id}")
 
             elif not should_record and is_currently_recording:
                 recorder = self.scheduled_recorders.pop(cam_id, None)
                 if recorder:
-                    recorder.stop()
-                    recorder.wait()
+                    worker.detach_recorder("scheduled_recording")
+                    self._stop_recorder(recorder)
                     widget = self.active_video_widgets.get(cam_id)
-                    if widget: widget.set_recording_state(False)
+                    if widget: widget.set_recording_state(bool(self._active_recorders(cam_id)))
                     print(f"Запис по график спрян за {cam_id}")
 
     def handle_worker_finished(self, cam_id):
@@ -604,11 +814,20 @@ class MainWindow(QMainWindow):
         cam_id = cam_data.get("id")
         if cam_id in self.video_workers: return
         
-        worker = VideoWorker(camera_data=cam_data)
+        worker = VideoWorker(camera_data=cam_data, frame_mailbox=self.frame_mailbox, pre_event_pool=self.pre_event_pool,
+                             motion_analyzer=self.motion_analyzer, person_detector=self.person_detector)
         worker.ImageUpdate.connect(self.dispatch_image_update)
         worker.StreamStatus.connect(self.dispatch_stream_status)
-        worker.FrameForRecording.connect(self.dispatch_frame_for_recording)
+        worker.MotionDetected.connect(self.on_motion_detected)
+        worker.TamperDetected.connect(self.on_tamper_detected)
+        worker.PersonDetected.connect(self.on_person_detected)
+        worker.MainFrameReady.connect(self.on_snapshot_frame)
         worker.finished.connect(lambda cid=cam_id: self.handle_worker_finished(cid))
+        for key in self.RECORDER_EVENT_TYPES:
+            recorder = self._recorders_for(key).get(cam_id)
+            if recorder and recorder.needs_frames: worker.attach_recorder(key, recorder)
+        if cam_id == self.fullscreen_cam_id: worker.acquire_main_stream("fullscreen")
+        worker.set_display_size(self.display_subscriptions.get(cam_id))
         worker.start()
         self.video_workers[cam_id] = worker
         print(f"Рестартиран е worker за {cam_data.get('name')}")
@@ -627,6 +846,16 @@ class MainWindow(QMainWindow):
             rec.stop()
             rec.wait()
         self.scheduled_recorders.clear()
+
+        for rec in list(self.motion_recorders.values()):
+            rec.stop()
+            rec.wait()
+        self.motion_recorders.clear()
+
+        for rec in self.stopping_recorders:
+            rec.wait()
+        self.stopping_recorders.clear()
+        self.flush_motion_events(close_all=True)
         
         # Signal all video workers to stop and move them to a zombie list
         # to prevent them from being garbage collected while running.
@@ -704,16 +933,23 @@ class MainWindow(QMainWindow):
             
         cameras = sorted(list(set(event.get("camera_name") for event in all_events)))
         event_types = sorted(list(set(event.get("event_type") for event in all_events)))
+        zones = sorted(list(set(event["zone"] for event in all_events if event.get("zone"))))
         page.camera_filter.blockSignals(True)
         page.event_type_filter.blockSignals(True)
+        page.zone_filter.blockSignals(True)
         page.camera_filter.clear()
         page.event_type_filter.clear()
+        page.zone_filter.clear()
         page.camera_filter.addItem(self.translator.get_string("all_cameras_filter"))
         page.event_type_filter.addItem(self.translator.get_string("all_types_filter"))
+        page.zone_filter.addItem(self.translator.get_string("all_zones_filter"))
         page.camera_filter.addItems(cameras)
         page.event_type_filter.addItems(event_types)
+        page.zone_filter.addItems(zones)
+        page.zone_filter.setVisible(bool(zones))
         page.camera_filter.blockSignals(False)
         page.event_type_filter.blockSignals(False)
+        page.zone_filter.blockSignals(False)
         self.apply_event_filters()
 
     def apply_event_filters(self):
@@ -723,6 +959,8 @@ class MainWindow(QMainWindow):
         type_filter = page.event_type_filter.currentText()
         if cam_filter == self.translator.get_string("all_cameras_filter"): cam_filter = ""
         if type_filter == self.translator.get_string("all_types_filter"): type_filter = ""
+        zone_filter = page.zone_filter.currentText()
+        if zone_filter == self.translator.get_string("all_zones_filter"): zone_filter = ""
         page.list_widget.clear()
 
         all_events = self.load_events()
@@ -731,8 +969,16 @@ class MainWindow(QMainWindow):
         for event in all_events:
             cam_match = cam_filter == "" or cam_filter == event.get("camera_name")
             type_match = type_filter == "" or type_filter == event.get("event_type")
-            if cam_match and type_match:
+            zone_match = zone_filter == "" or zone_filter == event.get("zone")
+            person_match = not page.person_filter_checkbox.isChecked() or event.get("person")
+            if cam_match and type_match and zone_match and person_match:
                 item_text = f"{event['timestamp']} - {event['camera_name']} ({event['event_type']})"
+                if "duration" in event:
+                    item_text += f" {event['duration']:.0f} s"
+                if event.get("zone"):
+                    item_text += f" - {self.translator.get_string('motion_zone_event').format(zone=event['zone'])}"
+                if event.get("person"):
+                    item_text += f" - {self.translator.get_string('person_event_tag')}"
                 item = QListWidgetItem(item_text)
                 item.setData(Qt.ItemDataRole.UserRole, event)
                 page.list_widget.addItem(item)
@@ -766,6 +1012,15 @@ class MainWindow(QMainWindow):
             
             return
 
+        recording_id = event_data.get("recording_id")
+        if recording_id:
+            # Сегментите на записа се пускат един след друг.
+            playlist = [s["file_path"] for s in DataManager.load_segments()
+                        if s.get("recording_id") == recording_id and os.path.exists(s["file_path"])]
+            if playlist:
+                MediaViewerDialog(playlist[0], parent=self, playlist=playlist).exec()
+                return
+
         if not remote_file_path or not os.path.exists(remote_file_path):
             QMessageBox.warning(self, "Грешка", f"Файлът не е намерен:\n{remote_file_path}")
             return
@@ -876,12 +1131,28 @@ class MainWindow(QMainWindow):
     def _perform_delete(self, event_to_delete):
         all_events = DataManager.load_events()
         updated_events = [e for e in all_events if e.get("event_id") != event_to_delete.get("event_id")]
+
+        recording_id = event_to_delete.get("recording_id")
+        if recording_id:
+            deleted = self._delete_segments([s for s in DataManager.load_segments() if s.get("recording_id") == recording_id])
+            DataManager.save_events(self._without_motion_events(updated_events, deleted))
+            if "recordings" in self.created_pages and self.pages.currentWidget() == self.created_pages["recordings"]:
+                self.refresh_recordings_view()
+            return
         
         try:
             file_to_delete = event_to_delete.get("file_path")
-            if file_to_delete and os.path.exists(file_to_delete):
-                os.remove(file_to_delete)
-                print(f"Изтрит файл: {file_to_delete}")
+            # Събитията за движение само сочат записа (или сегмента), по време на който са засечени,
+            # и никога не изтриват файла. Файлът на запис се изтрива, само ако не се записва в момента,
+            # не е сегмент от индекса и никое друго събитие на запис не го използва.
+            still_used = (event_to_delete.get("event_type") == MOTION_EVENT_TYPE
+                          or file_to_delete in self._recording_files()
+                          or any(s.get("file_path") == file_to_delete for s in DataManager.load_segments())
+                          or any(e.get("file_path") == file_to_delete and e.get("event_type") != MOTION_EVENT_TYPE
+                                 for e in updated_events))
+            if file_to_delete and not still_used and os.path.exists(file_to_delete):
+                self._delete_recording_file(file_to_delete)
+                updated_events = self._without_motion_events(updated_events, [file_to_delete])
         except Exception as e:
             print(f"Грешка при изтриване на файл: {e}")
 
@@ -916,7 +1187,9 @@ class MainWindow(QMainWindow):
         selected_items = page.list_widget.selectedItems()
         if not selected_items: return
         camera_to_edit = selected_items[0].data(Qt.ItemDataRole.UserRole)
-        dialog = CameraDialog(camera_data=camera_to_edit, parent=self)
+        worker = self.video_workers.get(camera_to_edit.get("id"))
+        preview_frame = worker.get_latest_frame() if worker else None
+        dialog = CameraDialog(camera_data=camera_to_edit, preview_frame=preview_frame, parent=self)
 
         if dialog.exec():
             updated_data = dialog.get_data()
@@ -938,8 +1211,10 @@ class MainWindow(QMainWindow):
                     break
             DataManager.save_cameras(cameras_data)
             
-            if updated_data.get("is_active"):
-                self.start_single_backend_worker(updated_data)
+            # Worker-ът получава пълните данни на камерата, включително полетата извън диалога.
+            camera = next((cam for cam in cameras_data if cam.get("id") == cam_id_to_edit), updated_data)
+            if camera.get("is_active"):
+                self.start_single_backend_worker(camera)
 
             self.refresh_cameras_view()
             if "live_view" in self.created_pages and self.pages.currentWidget() == self.created_pages["live_view"]:
@@ -1044,6 +1319,11 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.stop_backend_workers()
+        if self.motion_analyzer: self.motion_analyzer.stop()
+        if self.person_detector: self.person_detector.stop()
+        if self.encoder_pool: self.encoder_pool.stop()
+        # Довършва записите на снимки и файлове, които още са в опашките на дисковете.
+        get_storage_io().stop()
         if self.scanner: self.scanner.cancel()
         event.accept()
     
@@ -1051,9 +1331,10 @@ class MainWindow(QMainWindow):
         page = self.created_pages.get("live_view")
         if not page: return
         
-        for widget in self.active_video_widgets.values():
-            widget.hide()
-            widget.setParent(None)
+        if not self.live_compositor:
+            for widget in self.active_video_widgets.values():
+                widget.hide()
+                widget.setParent(None)
 
         all_widgets = list(self.active_video_widgets.values())
         widgets_to_show = []
@@ -1071,7 +1352,15 @@ class MainWindow(QMainWindow):
             limit = 4 if page.grid_2x2_button.isChecked() else 9
             widgets_to_show = all_widgets[:limit]
 
-        if not widgets_to_show: return
+        self.visible_video_widgets = widgets_to_show
+        if self.live_compositor:
+            self.live_compositor.set_layout(widgets_to_show, cols)
+            self.update_display_subscriptions()
+            return
+
+        if not widgets_to_show:
+            self.update_display_subscriptions()
+            return
 
         while page.grid_layout.count():
             child = page.grid_layout.takeAt(0)
@@ -1082,11 +1371,90 @@ class MainWindow(QMainWindow):
             row, col = idx // cols, idx % cols
             page.grid_layout.addWidget(widget, row, col)
             widget.show()
+        self.update_display_subscriptions()
     
-    def on_motion_detected(self, cam_id):
+    def on_motion_detected(self, cam_id, score=1.0, zone="", timestamp=None):
         widget = self.active_video_widgets.get(cam_id)
         if widget:
             widget.set_motion_state(True)
+
+        self.last_motion_time[cam_id] = time.monotonic()
+        worker = self.video_workers.get(cam_id)
+        if not worker: return
+        if (worker.camera_data.get("motion_recording") and cam_id not in self.motion_recorders and worker.has_frame()
+                and time.monotonic() >= self.motion_recording_refused.get(cam_id, 0)):
+            self.start_motion_recording(worker, zone)
+        recorders = self._active_recorders(cam_id)
+        for recorder in recorders:
+            recorder.add_motion(score, timestamp)
+        self.motion_events.update(cam_id, worker.camera_data.get("name"), score, zone,
+                                  file_path=recorders[0].filename if recorders else "")
+
+    def start_motion_recording(self, worker, zone=""):
+        cam_id = worker.cam_id
+        states = self.check_storage_limit()
+        if states is None:
+            # Всяко засичане би обхождало томовете отново - следващ опит след MOTION_RECORDING_RETRY_SECONDS.
+            self.motion_recording_refused[cam_id] = time.monotonic() + self.MOTION_RECORDING_RETRY_SECONDS
+            self.dispatch_stream_status(cam_id, "Няма място за запис")
+            return
+        self.motion_recording_refused.pop(cam_id, None)
+
+        recording_path = self.get_recording_path_for_camera(worker, states)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_name = self.sanitize_filename(worker.camera_data['name'])
+        filename = recording_path / f"motion_{safe_name}_{timestamp}.mp4"
+        self._start_recorder(worker, "motion_recording", filename)
+        self.motion_recording_started[cam_id] = time.monotonic()
+        widget = self.active_video_widgets.get(cam_id)
+        if widget: widget.set_recording_state(True)
+        self.add_event(cam_id, "Запис при движение", str(filename), zone=zone)
+        zone_text = f" (движение в зона {zone})" if zone else ""
+        print(f"Запис при движение стартиран за {safe_name}{zone_text}: {filename}")
+
+    def on_person_detected(self, cam_id, count):
+        self.motion_events.mark_person(cam_id, count)
+
+    def on_tamper_detected(self, cam_id, problem):
+        worker = self.video_workers.get(cam_id)
+        name = worker.camera_data.get("name") if worker else cam_id
+        if problem:
+            print(f"Камера {name}: {TAMPER_STATUS[problem]}")
+            self.add_event(cam_id, "Саботаж на камерата", "", tamper=problem)
+        else:
+            print(f"Камера {name}: картината е възстановена")
+            self.add_event(cam_id, "Възстановена картина", "")
+
+    def _active_recorders(self, cam_id):
+        """Текущите записи на камерата: ръчен, по график и при движение."""
+        recorders = (self._recorders_for(key).get(cam_id) for key in self.RECORDER_EVENT_TYPES)
+        return [recorder for recorder in recorders if recorder is not None]
+
+    def flush_motion_events(self, close_all=False):
+        """Записва приключилите сегменти движение в events.json с едно записване."""
+        events = self.motion_events.collect(close_all=close_all)
+        if not events: return
+        DataManager.append_events(events)
+        if "recordings" in self.created_pages and self.pages.currentWidget() == self.created_pages["recordings"]:
+            self.refresh_recordings_view()
+
+    def check_motion_recordings(self):
+        """Спира записите при движение, след като движението е спряло за post_motion_seconds."""
+        now = time.monotonic()
+        for cam_id, recorder in list(self.motion_recorders.items()):
+            worker = self.video_workers.get(cam_id)
+            camera_data = worker.camera_data if worker else {}
+            quiet_for = now - self.last_motion_time.get(cam_id, 0)
+            recorded_for = now - self.motion_recording_started.get(cam_id, 0)
+            if quiet_for < camera_data.get("post_motion_seconds", 10) or recorded_for < camera_data.get("min_clip_seconds", 5):
+                continue
+            self.motion_recorders.pop(cam_id)
+            self.motion_recording_started.pop(cam_id, None)
+            if worker: worker.detach_recorder("motion_recording")
+            self._stop_recorder(recorder)
+            widget = self.active_video_widgets.get(cam_id)
+            if widget: widget.set_recording_state(bool(self._active_recorders(cam_id)))
+            print(f"Запис при движение спрян за {cam_id}")
             
     def get_camera_to_control(self, remote_camera_id=None):
         if remote_camera_id:
@@ -1105,12 +1473,9 @@ class MainWindow(QMainWindow):
         if page.grid_1x1_button.isChecked():
             cam_id = page.camera_selector.currentData()
         else:
-            if self.active_video_widgets:
-                for i in range(page.grid_layout.count()):
-                    widget = page.grid_layout.itemAt(i).widget()
-                    if widget and widget.isVisible():
-                        cam_id = widget.camera_id
-                        break
+            visible_widgets = self.get_visible_widgets()
+            if visible_widgets:
+                cam_id = visible_widgets[0].camera_id
         if cam_id:
             return self.video_workers.get(cam_id), self.active_video_widgets.get(cam_id)
         return None, None
@@ -1119,13 +1484,27 @@ class MainWindow(QMainWindow):
         """Премахва невалидни символи от низ, за да стане валидно име на файл."""
         return "".join(c for c in name if c.isalnum() or c in (' ', '.', '_')).rstrip()
 
-    def get_recording_path_for_camera(self, worker):
-        """Определя пътя за запис спрямо текущите настройки."""
+    def get_recording_path_for_camera(self, worker, states=None):
+        """
+        Определя пътя за запис спрямо текущите настройки: томът е фиксираният за камерата
+        (recording_volume) или този с най-много свободно място на текущ запис (choose_volume).
+        Без worker (снимка на мрежата) връща папката на избрания том.
+
+        states е резултатът от check_storage_limit(); без него състоянието се изчислява отново.
+        Новият запис се брои в active на избрания том, така че няколко записа, стартирани с едно
+        и също states, се разпределят по томовете.
+        """
         settings = DataManager.load_settings()
-        base_path = Path(settings.get("recording_path"))
+        preferred = worker.camera_data.get("recording_volume") if worker else None
+        if not states:
+            states = self._volume_states(recording_volumes(settings))
+        state = choose_volume(states, preferred)
+        if state is not None:
+            state["active"] += 1
+        base_path = Path(state["path"] if state else settings.get("recording_path"))
         structure = settings.get("recording_structure", "single")
         
-        if structure == "per_camera":
+        if structure == "per_camera" and worker:
             safe_camera_name = self.sanitize_filename(worker.camera_data['name'])
             camera_path = base_path / safe_camera_name
             camera_path.mkdir(parents=True, exist_ok=True)
@@ -1135,17 +1514,11 @@ class MainWindow(QMainWindow):
             return base_path
 
     def get_visible_widgets(self):
-        visible_widgets = []
-        page = self.created_pages.get("live_view")
-        if not page: return visible_widgets
-        for i in range(page.grid_layout.count()):
-            widget = page.grid_layout.itemAt(i).widget()
-            if widget and widget.isVisible():
-                visible_widgets.append(widget)
-        return visible_widgets
+        if not self.created_pages.get("live_view"): return []
+        return [widget for widget in self.visible_video_widgets if widget.isVisible()]
 
     def take_snapshot(self, remote_camera_id=None):
-        if not self.check_storage_limit():
+        if self.check_storage_limit() is None:
             return
 
         is_remote_call = remote_camera_id is not None
@@ -1186,16 +1559,32 @@ class MainWindow(QMainWindow):
         if not worker:
             print(f"Грешка: Не е намерен worker за снимка на камера ID {cam_id}")
             return
+        # При двоен поток основният може да се отваря секунди - снимката се записва в on_snapshot_frame.
+        worker.request_main_frame()
 
-        frame = worker.get_latest_frame()
-        if frame is not None:
-            recording_path = self.get_recording_path_for_camera(worker)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_name = self.sanitize_filename(worker.camera_data['name'])
-            filename = recording_path / f"snap_{safe_name}_{timestamp}.jpg"
-            cv2.imwrite(str(filename), frame)
+    def on_snapshot_frame(self, cam_id, frame, is_main):
+        worker = self.video_workers.get(cam_id)
+        if frame is None or not worker: return
+        if not is_main:
+            print(f"Основният поток на {worker.camera_data['name']} не се отвори навреме, "
+                  f"снимката е от подпотока (по-ниска резолюция).")
+        recording_path = self.get_recording_path_for_camera(worker)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_name = self.sanitize_filename(worker.camera_data['name'])
+        filename = recording_path / f"snap_{safe_name}_{timestamp}.jpg"
+        if self._save_snapshot(filename, frame):
             print(f"Снимка запазена: {filename}")
-            self.add_event(worker.camera_data['id'], "Снимка", str(filename))
+            # Снимката от подпотока се отбелязва и в списъка със записи.
+            self.add_event(worker.camera_data['id'], "Снимка" if is_main else "Снимка (подпоток)", str(filename))
+
+    def _save_snapshot(self, filename, image):
+        """Кодира снимката като JPEG и я записва във фонов режим през storage_io, без да чака диска."""
+        ok, data = cv2.imencode(".jpg", image)
+        if not ok:
+            print(f"Грешка при кодиране на снимка {filename}")
+            return False
+        get_storage_io().write_file(str(filename), data.tobytes())
+        return True
 
     def _take_grid_snapshot(self, is_remote):
         workers_to_snap = []
@@ -1246,16 +1635,16 @@ class MainWindow(QMainWindow):
                 except cv2.error as e:
                     print(f"Грешка при оразмеряване на кадър за {worker.camera_data['name']}: {e}")
 
-        settings = DataManager.load_settings()
-        recording_path = Path(settings.get("recording_path"))
+        recording_path = self.get_recording_path_for_camera(None)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = recording_path / f"snap_grid_{timestamp}.jpg"
-        cv2.imwrite(str(filename), canvas)
-        print(f"Снимка на мрежата е запазена: {filename}")
-        self.add_event("grid", "Снимка (мрежа)", str(filename))
+        if self._save_snapshot(filename, canvas):
+            print(f"Снимка на мрежата е запазена: {filename}")
+            self.add_event("grid", "Снимка (мрежа)", str(filename))
 
     def toggle_manual_recording(self, is_recording, remote_camera_id=None):
-        if is_recording and not self.check_storage_limit():
+        states = self.check_storage_limit() if is_recording else None
+        if is_recording and states is None:
             page = self.created_pages.get("live_view")
             if page: page.record_button.setChecked(False)
             return
@@ -1267,15 +1656,15 @@ class MainWindow(QMainWindow):
             is_grid_view = not page.grid_1x1_button.isChecked()
 
         if remote_camera_id and remote_camera_id != "grid":
-             self.toggle_single_camera_recording(is_recording, remote_camera_id=remote_camera_id)
+             self.toggle_single_camera_recording(is_recording, remote_camera_id=remote_camera_id, states=states)
         elif is_grid_view:
             widgets_to_record = self.get_visible_widgets()
             for widget in widgets_to_record:
-                self.toggle_single_camera_recording(is_recording, remote_camera_id=widget.camera_id)
+                self.toggle_single_camera_recording(is_recording, remote_camera_id=widget.camera_id, states=states)
         else:
             cam_id = page.camera_selector.currentData() if page else None
             if cam_id:
-                self.toggle_single_camera_recording(is_recording, remote_camera_id=cam_id)
+                self.toggle_single_camera_recording(is_recording, remote_camera_id=cam_id, states=states)
         
         if page:
             if is_recording:
@@ -1284,7 +1673,7 @@ class MainWindow(QMainWindow):
                 page.record_button.setText(self.translator.get_string("record_button"))
 
 
-    def toggle_single_camera_recording(self, is_recording, remote_camera_id=None):
+    def toggle_single_camera_recording(self, is_recording, remote_camera_id=None, states=None):
         worker = self.video_workers.get(remote_camera_id)
         widget = self.active_video_widgets.get(remote_camera_id)
         
@@ -1303,22 +1692,16 @@ class MainWindow(QMainWindow):
         if is_recording:
             if cam_id in self.manual_recorders: return
 
-            recording_path = self.get_recording_path_for_camera(worker)
+            recording_path = self.get_recording_path_for_camera(worker, states)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             safe_name = self.sanitize_filename(worker.camera_data['name'])
             filename = recording_path / f"rec_{safe_name}_{timestamp}.mp4"
             
-            frame = worker.get_latest_frame()
-            if frame is None:
+            if not worker.has_frame():
                 print(f"Грешка: Не може да се вземе кадър от {safe_name} за стартиране на записа.")
                 return
             
-            height, width, _ = frame.shape
-            recording_fps = 25.0
-            
-            recorder = RecordingWorker(str(filename), width, height, recording_fps)
-            recorder.start()
-            self.manual_recorders[cam_id] = recorder
+            self._start_recorder(worker, "manual_recording", filename)
             
             if widget:
                 widget.set_recording_state(True)
@@ -1328,13 +1711,177 @@ class MainWindow(QMainWindow):
         else:
             if cam_id in self.manual_recorders:
                 recorder = self.manual_recorders.pop(cam_id)
-                recorder.stop()
-                recorder.wait()
+                worker.detach_recorder("manual_recording")
+                self._stop_recorder(recorder)
                 if widget:
-                    widget.set_recording_state(False)
+                    # Записът по график или при движение на камерата може да продължава.
+                    widget.set_recording_state(bool(self._active_recorders(cam_id)))
                 print(f"Ръчен запис спрян за {worker.camera_data['name']}.")
 
-    def add_event(self, camera_id, event_type, file_path):
+    def _stop_recorder(self, recorder):
+        """
+        Спира записа, без да чака GUI нишката: ffmpeg и пулът за кодиране довършват файла за
+        секунди. Записът остава в stopping_recorders, докато нишката му не приключи.
+        """
+        self.stopping_recorders = [r for r in self.stopping_recorders if not r.isFinished()]
+        recorder.stop()
+        self.stopping_recorders.append(recorder)
+
+    def _recorders_for(self, key):
+        return {"manual_recording": self.manual_recorders,
+                "scheduled_recording": self.scheduled_recorders,
+                "motion_recording": self.motion_recorders}[key]
+
+    def _adaptive_recording_options(self, worker):
+        """Настройките за адаптивен запис по график или None. Без засичане на движение записът би бил винаги с ниска честота."""
+        settings = DataManager.load_settings()
+        if not settings.get("adaptive_recording", False) or not worker.motion_enabled:
+            return None
+        return {"idle_fps": max(1, settings.get("adaptive_idle_fps", 1)),
+                "idle_scale": min(100, max(10, settings.get("adaptive_idle_scale", 50))) / 100}
+
+    def _start_recorder(self, worker, key, filename, backend=None, adaptive=None, segment_seconds=None):
+        """
+        Стартира запис според recording_backend. Прекодиращият запис получава кадрите от worker-а.
+        При segment_seconds всеки сегмент се вписва в индекса на сегментите под recorder.recording_id.
+        """
+        if backend is None:
+            backend = DataManager.load_settings().get("recording_backend", "remux")
+        cam_id = worker.camera_data.get("id")
+        recorder = create_recorder(worker, str(filename), backend, adaptive, segment_seconds, self.encoder_pool)
+        if segment_seconds:
+            recorder.recording_id = str(uuid.uuid4())
+            camera_name = worker.camera_data.get("name")
+            # Индексът се допълва направо от нишката на записа, за да се впише и краят на
+            # последния сегмент, докато GUI нишката чака записа да спре.
+            recorder.SegmentStarted.connect(
+                lambda path, start, rid=recorder.recording_id: self.on_segment_started(cam_id, camera_name, rid, path, start),
+                Qt.ConnectionType.DirectConnection)
+            recorder.SegmentFinished.connect(self.on_segment_finished, Qt.ConnectionType.DirectConnection)
+        if isinstance(recorder, FfmpegRemuxRecorder):
+            recorder.Failed.connect(lambda error, r=recorder: self._fall_back_to_reencode(cam_id, key, r))
+        else:
+            recorder.Backpressure.connect(lambda congested, r=recorder: self.on_recording_backpressure(cam_id, r, congested))
+        self._recorders_for(key)[cam_id] = recorder
+        if recorder.needs_frames:
+            worker.attach_recorder(key, recorder)
+        recorder.start()
+        if getattr(recorder, "pre_event_filename", None):
+            self.add_event(cam_id, "Запис преди събитие", recorder.pre_event_filename)
+        return recorder
+
+    def _fall_back_to_reencode(self, cam_id, key, failed_recorder):
+        """ffmpeg не успя да запише потока: записът продължава с прекодиране в нов файл."""
+        recorders = self._recorders_for(key)
+        worker = self.video_workers.get(cam_id)
+        if recorders.get(cam_id) is not failed_recorder or not worker: return
+        failed_recorder.wait()
+        filename = Path(failed_recorder.filename)
+        filename = filename.with_name(f"{filename.stem}_enc{filename.suffix}")
+        recorder = self._start_recorder(worker, key, filename, backend="reencode", segment_seconds=failed_recorder.segment_seconds)
+        self.add_event(cam_id, self.RECORDER_EVENT_TYPES[key], recorder.filename, recording_id=getattr(recorder, "recording_id", None))
+        print(f"Записът на {worker.camera_data['name']} продължава с прекодиране: {filename}")
+
+    def on_segment_started(self, cam_id, camera_name, recording_id, file_path, start):
+        DataManager.append_segment({"file_path": file_path, "recording_id": recording_id, "camera_id": cam_id,
+                                    "camera_name": camera_name, "start": start, "end": None})
+
+    def on_segment_finished(self, file_path, start, end):
+        DataManager.append_segment({"file_path": file_path, "end": end})
+
+    def on_recording_backpressure(self, cam_id, recorder, congested):
+        """Кодирането на записа не смогва: камерата показва това, докато опашката не се изпразни."""
+        if congested:
+            stats = recorder.stats()
+            print(f"Записът {recorder.filename} изостава: опашка {stats['queue_depth']}, "
+                  f"изпуснати кадри {stats['dropped']}, {stats['encode_ms']} ms/кадър")
+        self.dispatch_stream_status(cam_id, "Записът изостава" if congested else "Свързан")
+
+    def recording_stats(self):
+        """{камера: {вид запис: статистика}} за текущите записи (виж RecordingWorker.stats)."""
+        stats = {}
+        for key in self.RECORDER_EVENT_TYPES:
+            for cam_id, recorder in self._recorders_for(key).items():
+                stats.setdefault(cam_id, {})[key] = recorder.stats()
+        return stats
+
+    def storage_stats(self):
+        """
+        {диск: статистика} на записа на диска (виж StorageIO.stats) - от основния процес
+        и от процесите за кодиране.
+        """
+        stats = get_storage_io().stats()
+        if self.encoder_pool:
+            stats.update(self.encoder_pool.io_stats())
+        return stats
+
+    def format_recording_stats(self):
+        lines = []
+        for cam_id, recorders in self.recording_stats().items():
+            worker = self.video_workers.get(cam_id)
+            camera = worker.camera_data.get("name") if worker else cam_id
+            for key, stats in recorders.items():
+                lines.append(self.translator.get_string("recording_stats_line").format(
+                    camera=camera, kind=self.RECORDER_EVENT_TYPES[key], **stats))
+        return "\n".join(lines) or self.translator.get_string("recording_stats_none")
+
+    def format_storage_stats(self):
+        lines = [self.translator.get_string("storage_stats_line").format(disk=disk, **stats)
+                 for disk, stats in sorted(self.storage_stats().items())]
+        return "\n".join(lines) or self.translator.get_string("storage_stats_none")
+
+    def refresh_recording_stats(self):
+        """Опреснява статистиката на записите и на дисковете в настройките, ако страницата е отворена."""
+        page = self.created_pages.get("settings")
+        if not page or self.pages.currentWidget() is not page: return
+        page.recording_stats_label.setText(self.format_recording_stats())
+        page.storage_stats_label.setText(self.format_storage_stats())
+
+    def _recording_files(self):
+        """Файловете, в които в момента се записва или които спрените записи още довършват (те не се изтриват)."""
+        files = {recorder.filename for key in self.RECORDER_EVENT_TYPES for recorder in self._recorders_for(key).values()}
+        return files | {recorder.filename for recorder in self.stopping_recorders if not recorder.isFinished()}
+
+    def _delete_recording_file(self, file_path):
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+            print(f"Изтрит файл: {file_path}")
+        motion_index_path(file_path).unlink(missing_ok=True)
+
+    def _without_motion_events(self, events, deleted_files):
+        """Събитията без тези за движение, които сочат някой от изтритите файлове."""
+        deleted_files = set(deleted_files)
+        return [e for e in events if e.get("event_type") != MOTION_EVENT_TYPE or e.get("file_path") not in deleted_files]
+
+    def _remove_empty_segmented_events(self, deleted_files=()):
+        """
+        Маха събитията на сегментирани записи, от които не е останал нито един сегмент, и
+        събитията за движение в изтритите сегменти.
+        """
+        remaining = {s.get("recording_id") for s in DataManager.load_segments()}
+        all_events = DataManager.load_events()
+        kept = [e for e in self._without_motion_events(all_events, deleted_files)
+                if not e.get("recording_id") or e["recording_id"] in remaining]
+        if len(kept) != len(all_events):
+            DataManager.save_events(kept)
+
+    def _delete_segments(self, segments):
+        """Изтрива файловете на завършените сегменти и ги маха от индекса. Връща изтритите."""
+        busy = self._recording_files()
+        deleted = []
+        for segment in segments:
+            if segment["file_path"] in busy:
+                continue
+            try:
+                self._delete_recording_file(segment["file_path"])
+            except OSError as e:
+                print(f"Грешка при изтриване на сегмент: {e}")
+                continue
+            deleted.append(segment["file_path"])
+        DataManager.remove_segments(deleted)
+        return deleted
+
+    def add_event(self, camera_id, event_type, file_path, zone=None, tamper=None, recording_id=None):
         cameras = self.load_cameras()
         if cameras is None: return
         
@@ -1353,6 +1900,13 @@ class MainWindow(QMainWindow):
             "event_type": event_type,
             "file_path": str(file_path)
         }
+        if zone:
+            new_event["zone"] = zone
+        if tamper:
+            new_event["tamper"] = tamper
+        if recording_id:
+            # Сегментиран запис: файловете са в индекса на сегментите под този recording_id.
+            new_event["recording_id"] = recording_id
         all_events = DataManager.load_events()
         all_events.insert(0, new_event)
         DataManager.save_events(all_events)
@@ -2,21 +2,48 @@ import cv2
 import numpy as np
 from pathlib import Path
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider, QCheckBox
 )
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtGui import QImage, QPixmap
 
 from data_manager import get_translator
-from ui_widgets import AspectRatioLabel
+from motion_index import load_motion_index, motion_segments, save_motion_index, scan_motion_levels
+from ui_widgets import AspectRatioLabel, MotionHeatStrip
+from video_timing import load_frame_times
+
+
+class MotionScanWorker(QThread):
+    """Сканира запис без индекс на движението и записва резултата до файла за следващото отваряне."""
+    progress = Signal(int)
+    finished = Signal(object)
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self._is_cancelled = False
+
+    def run(self):
+        levels = scan_motion_levels(self.file_path, progress_callback=self.progress.emit,
+                                    check_cancel_callback=lambda: self._is_cancelled)
+        if levels is not None:
+            save_motion_index(self.file_path, levels)
+        self.finished.emit(levels)
+
+    def cancel(self):
+        self._is_cancelled = True
+
 
 class MediaViewerDialog(QDialog):
     """
     Диалогов прозорец за преглед на снимки и видео записи с лента за превъртане.
+    playlist е списък от файлове (сегментите на един запис), които се пускат един след друг.
     """
-    def __init__(self, file_path, parent=None):
+    def __init__(self, file_path, parent=None, playlist=None):
         super().__init__(parent)
         self.file_path = file_path
+        self.playlist = playlist or [file_path]
+        self.playlist_index = self.playlist.index(file_path) if file_path in self.playlist else 0
         self.translator = get_translator()
         
         self.is_video = str(self.file_path).lower().endswith(('.mp4', '.avi', '.mov'))
@@ -25,8 +52,15 @@ class MediaViewerDialog(QDialog):
         self.video_timer = QTimer(self)
         self.is_playing = False
         self.is_slider_pressed = False
+        self.fps = 25.0
+        self.duration = 0.0
+        # Времето на всеки кадър при записи с променлива честота (None - постоянна честота).
+        self.frame_times = None
+        self.motion_levels = None
+        self.motion_segments = []
+        self.scan_worker = None
 
-        self.setWindowTitle(f"{self.translator.get_string('view_recording_button')}: {Path(self.file_path).name}")
+        self.update_title()
         self.setMinimumSize(800, 600)
 
         main_layout = QVBoxLayout(self)
@@ -40,19 +74,46 @@ class MediaViewerDialog(QDialog):
         self.slider.sliderPressed.connect(self.slider_pressed)
         self.slider.sliderReleased.connect(self.slider_released)
         self.slider.sliderMoved.connect(self.seek_video)
+        self.heat_strip = MotionHeatStrip()
+        self.heat_strip.seek_requested.connect(self.seek_to_fraction)
+        self.heat_strip.hide()
         
         controls_layout = QHBoxLayout()
         self.play_pause_button = QPushButton()
         self.close_button = QPushButton("Затвори")
+        self.prev_motion_button = QPushButton(self.translator.get_string("previous_motion_button"))
+        self.next_motion_button = QPushButton(self.translator.get_string("next_motion_button"))
+        self.prev_motion_button.clicked.connect(self.seek_previous_motion)
+        self.next_motion_button.clicked.connect(self.seek_next_motion)
+        self.prev_motion_button.hide()
+        self.next_motion_button.hide()
+        self.motion_only_checkbox = QCheckBox(self.translator.get_string("motion_only_checkbox"))
+        self.motion_only_checkbox.toggled.connect(self.toggle_motion_only)
+        self.motion_status_label = QLabel()
+        self.prev_segment_button = QPushButton(self.translator.get_string("previous_segment_button"))
+        self.next_segment_button = QPushButton(self.translator.get_string("next_segment_button"))
+        self.prev_segment_button.clicked.connect(lambda: self.open_segment(self.playlist_index - 1))
+        self.next_segment_button.clicked.connect(lambda: self.open_segment(self.playlist_index + 1))
+        self.prev_segment_button.setEnabled(self.playlist_index > 0)
+        self.next_segment_button.setEnabled(self.playlist_index + 1 < len(self.playlist))
 
         controls_layout.addStretch()
+        if self.is_video and len(self.playlist) > 1:
+            controls_layout.addWidget(self.prev_segment_button)
         if self.is_video:
+            controls_layout.addWidget(self.prev_motion_button)
             controls_layout.addWidget(self.play_pause_button)
+            controls_layout.addWidget(self.next_motion_button)
+            controls_layout.addWidget(self.motion_only_checkbox)
+            controls_layout.addWidget(self.motion_status_label)
+        if self.is_video and len(self.playlist) > 1:
+            controls_layout.addWidget(self.next_segment_button)
         controls_layout.addWidget(self.close_button)
         controls_layout.addStretch()
 
         main_layout.addWidget(self.media_label, 1)
         if self.is_video:
+            main_layout.addWidget(self.heat_strip)
             main_layout.addWidget(self.slider)
         main_layout.addLayout(controls_layout)
 
@@ -65,6 +126,12 @@ class MediaViewerDialog(QDialog):
         else:
             self.load_image()
 
+    def update_title(self):
+        title = f"{self.translator.get_string('view_recording_button')}: {Path(self.file_path).name}"
+        if len(self.playlist) > 1:
+            title += f" ({self.playlist_index + 1}/{len(self.playlist)})"
+        self.setWindowTitle(title)
+
     def load_image(self):
         """По-надеждно зареждане на изображение, което работи и с не-ASCII пътища."""
         try:
@@ -88,6 +155,37 @@ class MediaViewerDialog(QDialog):
             self.media_label.setText("Грешка при зареждане на изображението.")
 
 
+    def open_segment(self, index):
+        """Превключва на друг файл от playlist и го пуска от началото."""
+        if not 0 <= index < len(self.playlist):
+            return
+        self.cancel_motion_scan()
+        self.video_timer.stop()
+        self.is_playing = False
+        if self.video_capture:
+            self.video_capture.release()
+        self.playlist_index = index
+        self.file_path = self.playlist[index]
+        self.update_title()
+        self.motion_levels = None
+        self.motion_segments = []
+        self.heat_strip.hide()
+        self.prev_motion_button.hide()
+        self.next_motion_button.hide()
+        self.motion_status_label.clear()
+        self.load_video()
+        self.prev_segment_button.setEnabled(index > 0)
+        self.next_segment_button.setEnabled(index + 1 < len(self.playlist))
+        if self.motion_only_checkbox.isChecked():
+            self.toggle_motion_only(True)
+
+    def cancel_motion_scan(self):
+        if self.scan_worker is not None:
+            self.scan_worker.finished.disconnect(self.on_motion_scan_finished)
+            self.scan_worker.cancel()
+            self.scan_worker.wait()
+            self.scan_worker = None
+
     def load_video(self):
         self.video_capture = cv2.VideoCapture(str(self.file_path))
         if not self.video_capture.isOpened():
@@ -102,12 +200,92 @@ class MediaViewerDialog(QDialog):
         self.slider.setRange(0, total_frames - 1)
         
         if fps > 0:
+            self.fps = fps
             self.video_timer.setInterval(int(1000 / fps))
         else:
             self.video_timer.setInterval(40)
 
+        self.duration = total_frames / self.fps
+        self.frame_times = load_frame_times(self.file_path)
+        if self.frame_times is not None and len(self.frame_times) != total_frames:
+            self.frame_times = None
+        index = load_motion_index(self.file_path)
+        if index is not None:
+            self.apply_motion_levels(index[1])
         self.toggle_play_pause()
 
+    def apply_motion_levels(self, levels):
+        """Показва индекса на движението (от .motion файла или от сканиране)."""
+        self.motion_levels = levels
+        self.motion_segments = motion_segments(levels)
+        self.heat_strip.set_levels(levels, self.duration)
+        self.heat_strip.show()
+        self.prev_motion_button.setVisible(bool(self.motion_segments))
+        self.next_motion_button.setVisible(bool(self.motion_segments))
+        if not self.motion_segments:
+            self.motion_status_label.setText(self.translator.get_string("no_motion_found"))
+
+    def toggle_motion_only(self, checked):
+        if checked and self.motion_levels is None and self.scan_worker is None:
+            self.scan_worker = MotionScanWorker(self.file_path)
+            self.scan_worker.progress.connect(
+                lambda value: self.motion_status_label.setText(self.translator.get_string("motion_scan_progress").format(progress=value)))
+            self.scan_worker.finished.connect(self.on_motion_scan_finished)
+            self.motion_status_label.setText(self.translator.get_string("motion_scan_progress").format(progress=0))
+            self.scan_worker.start()
+
+    def on_motion_scan_finished(self, levels):
+        self.scan_worker.wait()
+        self.scan_worker = None
+        self.motion_status_label.clear()
+        if levels is not None:
+            self.apply_motion_levels(levels)
+
+    def motion_only_target(self, position):
+        """Кадърът, от който да продължи показването в режим "само движение", или None след последното движение."""
+        second = self.frame_second(position)
+        for start, end in self.motion_segments:
+            # По секунда преди и след отрязъка, за да се види как започва и свършва движението.
+            if second < end + 1:
+                return max(position, self.second_frame(start - 1))
+        return None
+
+    def frame_second(self, frame_number):
+        """Секундата от началото на записа, в която се показва кадърът."""
+        if self.frame_times is None:
+            return frame_number / self.fps
+        return float(self.frame_times[min(max(0, frame_number), len(self.frame_times) - 1)])
+
+    def second_frame(self, second):
+        """Първият кадър, показван в тази секунда или след нея."""
+        if self.frame_times is None:
+            return int(second * self.fps)
+        return int(np.searchsorted(self.frame_times, second))
+
+    def current_second(self):
+        return self.frame_second(self.slider.value())
+
+    def seek_to_second(self, second):
+        frame_number = min(max(0, self.second_frame(second)), self.slider.maximum())
+        self.slider.setValue(frame_number)
+        self.seek_video(frame_number)
+
+    def seek_to_fraction(self, fraction):
+        self.seek_to_second(fraction * self.duration)
+
+    def seek_next_motion(self):
+        now = self.current_second()
+        start = next((start for start, _ in self.motion_segments if start > now + 0.5), None)
+        if start is not None:
+            self.seek_to_second(start)
+
+    def seek_previous_motion(self):
+        # Повторно натискане в началото на отрязък отива на предишния.
+        now = self.current_second()
+        start = next((start for start, _ in reversed(self.motion_segments) if start < now - 1.0), None)
+        if start is not None:
+            self.seek_to_second(start)
+
     def toggle_play_pause(self):
         if self.is_playing:
             self.video_timer.stop()
@@ -116,24 +294,58 @@ class MediaViewerDialog(QDialog):
         else:
             current_frame = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES))
             total_frames = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-            if current_frame >= total_frames -1:
+            at_end = current_frame >= total_frames - 1
+            if self.motion_only_checkbox.isChecked() and self.motion_segments:
+                at_end = at_end or self.motion_only_target(current_frame) is None
+            if at_end:
                 self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
             self.video_timer.start()
             self.is_playing = True
             self.play_pause_button.setText("Пауза")
 
+    def skip_idle_frames(self):
+        """
+        В режим "само движение" прескача тихите участъци преди следващия кадър. Кратки
+        паузи се минават с grab() без преобразуване на кадрите, а дългите - с търсене.
+        Връща False, ако след текущата позиция няма повече движение.
+        """
+        position = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES))
+        target = self.motion_only_target(position)
+        if target is None:
+            return False
+        if target - position > 2 * self.fps:
+            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+        else:
+            for _ in range(target - position):
+                if not self.video_capture.grab():
+                    break
+        return True
+
+    def finish_playback(self):
+        if self.playlist_index + 1 < len(self.playlist):
+            self.open_segment(self.playlist_index + 1)
+            return
+        self.video_timer.stop()
+        self.is_playing = False
+        self.play_pause_button.setText(self.translator.get_string("replay_button"))
+
     def display_next_frame(self):
+        if self.motion_only_checkbox.isChecked() and self.motion_segments and not self.skip_idle_frames():
+            self.finish_playback()
+            return
         ret, frame = self.video_capture.read()
         if not ret:
-            self.video_timer.stop()
-            self.is_playing = False
-            self.play_pause_button.setText(self.translator.get_string("replay_button"))
+            self.finish_playback()
             return
 
+        current_frame = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES))
         if not self.is_slider_pressed:
-            current_frame = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES))
             self.slider.setValue(current_frame)
+        if self.frame_times is not None and current_frame < len(self.frame_times):
+            # При променлива честота всеки кадър стои на екрана до времето на следващия.
+            gap = self.frame_times[current_frame] - self.frame_times[current_frame - 1]
+            self.video_timer.setInterval(max(1, int(1000 * gap)))
 
         rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         h, w, ch = rgb_image.shape
@@ -162,6 +374,7 @@ class MediaViewerDialog(QDialog):
             self.media_label.setPixmap(QPixmap.fromImage(qt_image))
 
     def closeEvent(self, event):
+        self.cancel_motion_scan()
         if self.video_timer.isActive():
             self.video_timer.stop()
         if self.video_capture:
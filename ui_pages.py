@@ -1,7 +1,7 @@
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QPushButton, QLineEdit, QSpacerItem, QSizePolicy,
-    QGridLayout, QComboBox, QListWidget, QFormLayout, QFileDialog
+    QGridLayout, QComboBox, QListWidget, QListWidgetItem, QFormLayout, QFileDialog, QCheckBox
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QIntValidator
@@ -143,8 +143,12 @@ class RecordingsPage(QWidget):
         filters_layout.addWidget(QLabel(translator.get_string("filters_label")))
         self.camera_filter = QComboBox()
         self.event_type_filter = QComboBox()
+        self.zone_filter = QComboBox()
+        self.person_filter_checkbox = QCheckBox(translator.get_string("person_filter_checkbox"))
         filters_layout.addWidget(self.camera_filter)
         filters_layout.addWidget(self.event_type_filter)
+        filters_layout.addWidget(self.zone_filter)
+        filters_layout.addWidget(self.person_filter_checkbox)
         filters_layout.addStretch()
         
         self.list_widget = QListWidget()
@@ -207,19 +211,89 @@ class SettingsPage(QWidget):
         path_layout.addWidget(self.path_edit, 1)
         path_layout.addWidget(self.browse_button)
 
+        self.recording_backend_combo = QComboBox()
+        self.recording_backend_combo.addItem(translator.get_string("recording_backend_remux_option"), "remux")
+        self.recording_backend_combo.addItem(translator.get_string("recording_backend_reencode_option"), "reencode")
+
+        self.preroll_seconds_input = QLineEdit("5")
+        self.preroll_seconds_input.setValidator(QIntValidator(0, 60))
+        self.preroll_memory_input = QLineEdit("256")
+        self.preroll_memory_input.setValidator(QIntValidator(0, 8192))
+
+        self.batched_motion_checkbox = QCheckBox(translator.get_string("batched_motion_checkbox"))
+        self.encoder_pool_checkbox = QCheckBox(translator.get_string("encoder_pool_checkbox"))
+
+        self.adaptive_recording_checkbox = QCheckBox(translator.get_string("adaptive_recording_checkbox"))
+        self.adaptive_idle_fps_input = QLineEdit("1")
+        self.adaptive_idle_fps_input.setValidator(QIntValidator(1, 10))
+        self.adaptive_idle_scale_input = QLineEdit("50")
+        self.adaptive_idle_scale_input.setValidator(QIntValidator(10, 100))
+
+        self.segment_minutes_input = QLineEdit("15")
+        self.segment_minutes_input.setValidator(QIntValidator(0, 240))
+
+        self.person_detection_checkbox = QCheckBox(translator.get_string("person_detection_checkbox"))
+        self.person_budget_input = QLineEdit("4")
+        self.person_budget_input.setValidator(QIntValidator(1, 100))
+
         self.storage_limit_input = QLineEdit("0")
         self.storage_limit_input.setValidator(QIntValidator(0, 10000))
         self.storage_action_combo = QComboBox()
         self.storage_action_combo.addItem(translator.get_string("storage_action_stop"), "stop")
         self.storage_action_combo.addItem(translator.get_string("storage_action_overwrite"), "overwrite")
 
+        # Допълнителни томове за запис (папки на други дискове) с лимит за всеки.
+        self.volumes_list = QListWidget()
+        self.volumes_list.setMaximumHeight(90)
+        volume_buttons_layout = QHBoxLayout()
+        self.volume_limit_input = QLineEdit("0")
+        self.volume_limit_input.setValidator(QIntValidator(0, 100000))
+        self.add_volume_button = QPushButton(translator.get_string("add_volume_button"))
+        self.add_volume_button.clicked.connect(self.add_recording_volume)
+        self.remove_volume_button = QPushButton(translator.get_string("remove_volume_button"))
+        self.remove_volume_button.clicked.connect(lambda: self.volumes_list.takeItem(self.volumes_list.currentRow()))
+        volume_buttons_layout.addWidget(QLabel(translator.get_string("volume_limit_label")))
+        volume_buttons_layout.addWidget(self.volume_limit_input)
+        volume_buttons_layout.addWidget(self.add_volume_button)
+        volume_buttons_layout.addWidget(self.remove_volume_button)
+        self.storage_usage_label = QLabel()
+        self.storage_usage_label.setWordWrap(True)
+        self.recording_stats_label = QLabel()
+        self.recording_stats_label.setWordWrap(True)
+        self.storage_stats_label = QLabel()
+        self.storage_stats_label.setWordWrap(True)
+
+        self.live_renderer_combo = QComboBox()
+        self.live_renderer_combo.addItem(translator.get_string("live_renderer_widgets_option"), "widgets")
+        self.live_renderer_combo.addItem(translator.get_string("live_renderer_compositor_option"), "compositor")
+        self.display_fps_input = QLineEdit("0")
+        self.display_fps_input.setValidator(QIntValidator(0, 240))
+
         form_layout.addRow(translator.get_string("app_theme_label"), self.theme_combo)
         form_layout.addRow(translator.get_string("default_view_label"), self.grid_combo)
         form_layout.addRow(translator.get_string("language_label"), self.lang_combo)
         form_layout.addRow(translator.get_string("recordings_folder_label"), path_layout)
         form_layout.addRow(translator.get_string("recording_structure_label"), self.recording_structure_combo)
+        form_layout.addRow(translator.get_string("recording_backend_label"), self.recording_backend_combo)
+        form_layout.addRow(translator.get_string("preroll_seconds_label"), self.preroll_seconds_input)
+        form_layout.addRow(translator.get_string("preroll_memory_label"), self.preroll_memory_input)
+        form_layout.addRow(self.batched_motion_checkbox)
+        form_layout.addRow(self.encoder_pool_checkbox)
+        form_layout.addRow(translator.get_string("segment_minutes_label"), self.segment_minutes_input)
+        form_layout.addRow(self.adaptive_recording_checkbox)
+        form_layout.addRow(translator.get_string("adaptive_idle_fps_label"), self.adaptive_idle_fps_input)
+        form_layout.addRow(translator.get_string("adaptive_idle_scale_label"), self.adaptive_idle_scale_input)
+        form_layout.addRow(self.person_detection_checkbox)
+        form_layout.addRow(translator.get_string("person_budget_label"), self.person_budget_input)
         form_layout.addRow(translator.get_string("storage_limit_label"), self.storage_limit_input)
         form_layout.addRow(translator.get_string("storage_action_label"), self.storage_action_combo)
+        form_layout.addRow(translator.get_string("recording_volumes_label"), self.volumes_list)
+        form_layout.addRow("", volume_buttons_layout)
+        form_layout.addRow(translator.get_string("storage_usage_label"), self.storage_usage_label)
+        form_layout.addRow(translator.get_string("recording_stats_label"), self.recording_stats_label)
+        form_layout.addRow(translator.get_string("storage_stats_label"), self.storage_stats_label)
+        form_layout.addRow(translator.get_string("live_renderer_label"), self.live_renderer_combo)
+        form_layout.addRow(translator.get_string("display_fps_label"), self.display_fps_input)
         
         self.save_button = QPushButton(translator.get_string("save_changes_button"))
         self.save_button.setObjectName("AccentButton")
@@ -234,6 +308,25 @@ class SettingsPage(QWidget):
         if directory:
             self.path_edit.setText(directory)
 
+    def add_recording_volume(self):
+        directory = QFileDialog.getExistingDirectory(self, "Изберете папка за записи")
+        if directory:
+            self._add_volume_item({"path": directory, "limit_gb": int(self.volume_limit_input.text() or 0)})
+
+    def _add_volume_item(self, volume):
+        limit = volume.get("limit_gb", 0)
+        item = QListWidgetItem(f"{volume['path']} ({limit} GB)" if limit else volume["path"])
+        item.setData(Qt.ItemDataRole.UserRole, volume)
+        self.volumes_list.addItem(item)
+
+    def set_recording_volumes(self, volumes):
+        self.volumes_list.clear()
+        for volume in volumes:
+            self._add_volume_item(volume)
+
+    def get_recording_volumes(self):
+        return [self.volumes_list.item(i).data(Qt.ItemDataRole.UserRole) for i in range(self.volumes_list.count())]
+
 class UsersPage(QWidget):
     def __init__(self):
         super().__init__()
@@ -1,6 +1,11 @@
-from PySide6.QtWidgets import QFrame, QVBoxLayout, QLabel, QSizePolicy
-from PySide6.QtCore import Qt, Signal, QTimer
-from PySide6.QtGui import QPixmap, QPainter
+import math
+import time
+
+import numpy as np
+
+from PySide6.QtWidgets import QFrame, QVBoxLayout, QLabel, QSizePolicy, QWidget
+from PySide6.QtCore import Qt, Signal, QTimer, QObject, QRect, QSize, QPointF
+from PySide6.QtGui import QPixmap, QPainter, QColor, QPen, QPolygonF, QImage
 
 class AspectRatioLabel(QLabel):
     """QLabel, който запазва пропорциите на изображението."""
@@ -14,6 +19,9 @@ class AspectRatioLabel(QLabel):
             self._pixmap = pixmap
             self.update()
 
+    def has_image(self):
+        return not self._pixmap.isNull()
+
     def paintEvent(self, event):
         if self._pixmap.isNull():
             super().paintEvent(event)
@@ -28,6 +36,7 @@ class AspectRatioLabel(QLabel):
 class VideoFrame(QFrame):
     """Уиджет, който показва видео поток от една камера."""
     double_clicked = Signal()
+    resized = Signal()
 
     def __init__(self, camera_name, camera_id):
         super().__init__()
@@ -62,6 +71,16 @@ class VideoFrame(QFrame):
     def mouseDoubleClickEvent(self, event):
         self.double_clicked.emit()
         super().mouseDoubleClickEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit()
+
+    def display_size(self):
+        """Размер на видео областта във физически пиксели."""
+        ratio = self.devicePixelRatioF()
+        size = self.video_label.size()
+        return int(size.width() * ratio), int(size.height() * ratio)
         
     def set_recording_state(self, is_recording):
         self._is_recording = is_recording
@@ -85,4 +104,377 @@ class VideoFrame(QFrame):
         self.video_label.setPixmap(QPixmap.fromImage(q_image))
 
     def update_status(self, status_text):
-        self.video_label.setText(status_text)
\ No newline at end of file
+        # След първия кадър текстът в video_label не се вижда, затова статусът отива до името.
+        if not self.video_label.has_image():
+            self.video_label.setText(status_text)
+        elif status_text == "Свързан":
+            self.name_label.setText(self.camera_name)
+        else:
+            self.name_label.setText(f"{self.camera_name} - {status_text}")
+
+
+BORDER_COLOR_IDLE = QColor("#3E3E42")
+BORDER_COLOR_RECORDING = QColor("#D13438")
+BORDER_COLOR_MOTION = QColor("#E81123")
+
+
+class CompositorTile(QObject):
+    """
+    Плочка от LiveGridCompositor. Няма собствен уиджет, но има интерфейса на VideoFrame,
+    така че MainWindow работи с нея по същия начин.
+    """
+    double_clicked = Signal()
+    resized = Signal()
+
+    def __init__(self, compositor, camera_name, camera_id):
+        super().__init__(compositor)
+        self._compositor = compositor
+        self.camera_name = camera_name
+        self.camera_id = camera_id
+        self.image = None
+        self.status_text = "Свързване..."
+        self.is_recording = False
+        self.motion_until = 0.0
+        # Цялата плочка (с рамката и името) и видео областта в нея; празни, докато не се показва.
+        self.rect = QRect()
+        self.video_rect = QRect()
+        self._pixmap = QPixmap()
+        self._pixmap_key = None
+
+    def isVisible(self):
+        return not self.rect.isEmpty() and self._compositor.isVisible()
+
+    def display_size(self):
+        """Размер на видео областта във физически пиксели."""
+        ratio = self._compositor.devicePixelRatioF()
+        return int(self.video_rect.width() * ratio), int(self.video_rect.height() * ratio)
+
+    def set_recording_state(self, is_recording):
+        if self.is_recording != is_recording:
+            self.is_recording = is_recording
+            self._compositor.update(self.rect)
+
+    def set_motion_state(self, is_motion):
+        self._compositor.set_tile_motion(self, is_motion)
+
+    def update_frame(self, q_image):
+        self.image = q_image
+        self._pixmap_key = None
+        self._compositor.update(self.video_rect)
+
+    def update_status(self, status_text):
+        self.status_text = status_text
+        self._compositor.update(self.video_rect)
+
+    def border_color(self):
+        if self.is_recording:
+            return BORDER_COLOR_RECORDING
+        if self.motion_until:
+            return BORDER_COLOR_MOTION
+        return BORDER_COLOR_IDLE
+
+    def scaled_pixmap(self, ratio):
+        """
+        Кадърът, вписан във видео областта. Мащабира се веднъж на кадър и размер, а не при
+        всяко прерисуване; ако worker-ът вече е подал кадър с размера на плочката, не се мащабира.
+        """
+        if self.image is None or self.image.isNull() or self.video_rect.isEmpty():
+            return None
+        key = (self.image.cacheKey(), self.video_rect.size(), ratio)
+        if key == self._pixmap_key:
+            return self._pixmap
+        target_w = self.video_rect.width() * ratio
+        target_h = self.video_rect.height() * ratio
+        scale = min(target_w / self.image.width(), target_h / self.image.height())
+        fit = QSize(max(1, round(self.image.width() * scale)), max(1, round(self.image.height() * scale)))
+        if abs(fit.width() - self.image.width()) <= 1 and abs(fit.height() - self.image.height()) <= 1:
+            image = self.image
+        else:
+            image = self.image.scaled(fit, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.FastTransformation)
+        self._pixmap = QPixmap.fromImage(image)
+        self._pixmap.setDevicePixelRatio(ratio)
+        self._pixmap_key = key
+        return self._pixmap
+
+    def clear_layout(self):
+        self.rect = QRect()
+        self.video_rect = QRect()
+        self._pixmap = QPixmap()
+        self._pixmap_key = None
+
+
+class LiveGridCompositor(QWidget):
+    """
+    Рисува цялата мрежа от камери в един paintEvent: кадри, рамки, имена и статус.
+    Нов кадър обновява само своята плочка, а мащабираните кадри се пазят до следващия.
+    """
+    SPACING = 5
+    BORDER = 2
+    MOTION_HOLD = 1.0
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self._tiles = {}
+        self._visible_tiles = []
+        self._columns = 1
+        # Един таймер за изтичането на движението във всички плочки.
+        self._motion_timer = QTimer(self)
+        self._motion_timer.setInterval(250)
+        self._motion_timer.timeout.connect(self._expire_motion)
+
+    def add_tile(self, camera_name, camera_id):
+        tile = CompositorTile(self, camera_name, camera_id)
+        self._tiles[camera_id] = tile
+        tile.destroyed.connect(lambda _=None, cam_id=camera_id: self._forget_tile(cam_id))
+        return tile
+
+    def _forget_tile(self, camera_id):
+        self._tiles.pop(camera_id, None)
+        self._visible_tiles = [t for t in self._visible_tiles if t.camera_id != camera_id]
+
+    def set_layout(self, tiles, columns):
+        """Показва дадените плочки в мрежа с columns колони; останалите се скриват."""
+        for tile in self._visible_tiles:
+            if tile not in tiles:
+                tile.clear_layout()
+        self._visible_tiles = list(tiles)
+        self._columns = max(1, columns)
+        self._relayout()
+        self.update()
+
+    def _relayout(self):
+        count = len(self._visible_tiles)
+        if not count:
+            return
+        cols = min(self._columns, count)
+        rows = math.ceil(count / cols)
+        tile_w = (self.width() - self.SPACING * (cols - 1)) // cols
+        tile_h = (self.height() - self.SPACING * (rows - 1)) // rows
+        name_h = self.fontMetrics().height() + 8
+        for idx, tile in enumerate(self._visible_tiles):
+            row, col = idx // cols, idx % cols
+            rect = QRect(col * (tile_w + self.SPACING), row * (tile_h + self.SPACING), max(0, tile_w), max(0, tile_h))
+            inner = rect.adjusted(self.BORDER, self.BORDER, -self.BORDER, -self.BORDER)
+            video_rect = inner.adjusted(0, 0, 0, -name_h)
+            old_size = tile.video_rect.size()
+            tile.rect = rect
+            tile.video_rect = video_rect
+            if video_rect.size() != old_size:
+                tile.resized.emit()
+
+    def set_tile_motion(self, tile, is_motion):
+        was_motion = bool(tile.motion_until)
+        tile.motion_until = time.monotonic() + self.MOTION_HOLD if is_motion else 0.0
+        if is_motion and not self._motion_timer.isActive():
+            self._motion_timer.start()
+        if was_motion != is_motion:
+            self.update(tile.rect)
+
+    def _expire_motion(self):
+        now = time.monotonic()
+        active = False
+        for tile in self._tiles.values():
+            if not tile.motion_until:
+                continue
+            if tile.motion_until <= now:
+                tile.motion_until = 0.0
+                self.update(tile.rect)
+            else:
+                active = True
+        if not active:
+            self._motion_timer.stop()
+
+    def tile_at(self, pos):
+        for tile in self._visible_tiles:
+            if tile.rect.contains(pos):
+                return tile
+        return None
+
+    def mouseDoubleClickEvent(self, event):
+        tile = self.tile_at(event.position().toPoint())
+        if tile:
+            tile.double_clicked.emit()
+        super().mouseDoubleClickEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._relayout()
+
+    def paintEvent(self, event):
+        dirty = event.rect()
+        painter = QPainter(self)
+        painter.fillRect(dirty, self.palette().window())
+        ratio = self.devicePixelRatioF()
+        for tile in self._visible_tiles:
+            if tile.rect.intersects(dirty):
+                self._paint_tile(painter, tile, ratio)
+
+    def _paint_tile(self, painter, tile, ratio):
+        painter.fillRect(tile.rect, tile.border_color())
+        inner = tile.rect.adjusted(self.BORDER, self.BORDER, -self.BORDER, -self.BORDER)
+        painter.fillRect(inner, Qt.GlobalColor.black)
+
+        video_rect = tile.video_rect
+        pixmap = tile.scaled_pixmap(ratio)
+        painter.setPen(Qt.GlobalColor.white)
+        if pixmap is not None:
+            size = pixmap.deviceIndependentSize().toSize()
+            x = video_rect.x() + (video_rect.width() - size.width()) // 2
+            y = video_rect.y() + (video_rect.height() - size.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+            if tile.status_text != "Свързан":
+                # При прекъсване последният кадър остава, а статусът се показва в ъгъла.
+                status_rect = painter.fontMetrics().boundingRect(tile.status_text).adjusted(-4, -2, 4, 2)
+                status_rect.moveTopLeft(video_rect.topLeft())
+                painter.fillRect(status_rect, QColor(0, 0, 0, 153))
+                painter.drawText(status_rect, Qt.AlignmentFlag.AlignCenter, tile.status_text)
+        else:
+            painter.drawText(video_rect, Qt.AlignmentFlag.AlignCenter, tile.status_text)
+
+        name_rect = QRect(inner.left(), video_rect.bottom() + 1, inner.width(), inner.bottom() - video_rect.bottom())
+        painter.fillRect(name_rect, QColor(0, 0, 0, 153))
+        painter.drawText(name_rect, Qt.AlignmentFlag.AlignCenter, tile.camera_name)
+
+
+ZONE_COLORS = {"include": QColor(16, 185, 129), "exclude": QColor(232, 17, 35)}
+
+
+class ZoneEditorCanvas(QWidget):
+    """
+    Кадър от камерата с нарисуваните зони на движение. Ляв бутон добавя връх към текущия
+    многоъгълник, десен маха последния връх, двоен клик завършва многоъгълника.
+    Върховете се пазят в относителни координати 0-1 спрямо кадъра.
+    """
+    polygon_finished = Signal()
+
+    def __init__(self, image=None, parent=None):
+        super().__init__(parent)
+        self.image = image
+        self.zones = []
+        self.points = []
+        self.selected_index = -1
+        self.setMinimumSize(480, 270)
+
+    def image_rect(self):
+        """Правоъгълникът, в който е вписан кадърът (16:9, ако няма кадър)."""
+        if self.image is not None and not self.image.isNull():
+            src_w, src_h = self.image.width(), self.image.height()
+        else:
+            src_w, src_h = 16, 9
+        scale = min(self.width() / src_w, self.height() / src_h)
+        w, h = int(src_w * scale), int(src_h * scale)
+        return QRect((self.width() - w) // 2, (self.height() - h) // 2, w, h)
+
+    def _to_relative(self, pos):
+        rect = self.image_rect()
+        x = min(max((pos.x() - rect.x()) / max(1, rect.width() - 1), 0.0), 1.0)
+        y = min(max((pos.y() - rect.y()) / max(1, rect.height() - 1), 0.0), 1.0)
+        return [round(x, 4), round(y, 4)]
+
+    def _to_widget(self, points):
+        rect = self.image_rect()
+        return QPolygonF([QPointF(rect.x() + x * (rect.width() - 1), rect.y() + y * (rect.height() - 1))
+                          for x, y in points])
+
+    def clear_points(self):
+        self.points = []
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.points.append(self._to_relative(event.position()))
+        elif event.button() == Qt.MouseButton.RightButton and self.points:
+            self.points.pop()
+        self.update()
+
+    def mouseDoubleClickEvent(self, event):
+        # Двойният клик идва след натискане, което вече е добавило връх на същото място.
+        if self.points:
+            self.points.pop()
+        if len(self.points) >= 3:
+            self.polygon_finished.emit()
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#1E1E1E"))
+        rect = self.image_rect()
+        if self.image is not None and not self.image.isNull():
+            painter.drawImage(rect, self.image)
+        else:
+            painter.fillRect(rect, QColor("#000000"))
+
+        for index, zone in enumerate(self.zones):
+            color = QColor(ZONE_COLORS.get(zone.get("type"), ZONE_COLORS["include"]))
+            polygon = self._to_widget(zone["points"])
+            painter.setPen(QPen(color, 3 if index == self.selected_index else 1.5))
+            color.setAlpha(90 if index == self.selected_index else 50)
+            painter.setBrush(color)
+            painter.drawPolygon(polygon)
+            if zone.get("name"):
+                painter.setPen(QColor("#FFFFFF"))
+                painter.drawText(polygon.boundingRect().center(), zone["name"])
+
+        if self.points:
+            painter.setPen(QPen(QColor("#FFC83D"), 2, Qt.PenStyle.DashLine))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            polygon = self._to_widget(self.points)
+            painter.drawPolyline(polygon)
+            painter.setBrush(QColor("#FFC83D"))
+            for point in polygon:
+                painter.drawEllipse(point, 3, 3)
+
+
+class MotionHeatStrip(QWidget):
+    """
+    Лента над плъзгача на MediaViewerDialog с активността от индекса на движението:
+    всяка колона е най-високото ниво в съответните секунди. Клик върху лентата
+    иска превъртане до тази точка (дял 0-1 от записа).
+    """
+    seek_requested = Signal(float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._levels = None
+        self._duration = 0.0
+        self._strip = None
+        self.setFixedHeight(10)
+
+    def set_levels(self, levels, duration):
+        self._levels = levels
+        self._duration = duration
+        self._strip = None
+        self.update()
+
+    def _build_strip(self, width):
+        """Едноредово изображение с по един пиксел за колона; мащабира се по височина при рисуването."""
+        seconds = max(1, int(math.ceil(self._duration)))
+        levels = np.zeros(seconds, dtype=np.uint8)
+        count = min(seconds, len(self._levels))
+        levels[:count] = self._levels[:count]
+        edges = np.minimum((np.arange(width) * seconds) // width, seconds - 1)
+        columns = np.maximum.reduceat(levels, edges) if seconds >= width else levels[edges]
+        row = np.zeros((1, width, 4), dtype=np.uint8)
+        row[0, :, 0] = 35
+        row[0, :, 1] = 140
+        row[0, :, 2] = 255
+        # Всяко засечено движение се вижда, а по-силното е по-наситено.
+        row[0, :, 3] = np.where(columns > 0, 110 + columns.astype(np.uint16) * 145 // 255, 0)
+        image = QImage(row.data, width, 1, width * 4, QImage.Format.Format_ARGB32).copy()
+        return width, image
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#2D2D30"))
+        if self._levels is None or self._duration <= 0 or self.width() <= 0:
+            return
+        if self._strip is None or self._strip[0] != self.width():
+            self._strip = self._build_strip(self.width())
+        painter.drawImage(self.rect(), self._strip[1])
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton and self.width() > 0:
+            self.seek_requested.emit(min(max(event.position().x() / self.width(), 0.0), 1.0))
@@ -0,0 +1,193 @@
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+from storage_io import FSYNC_NEVER, get_storage_io
+
+try:
+    import av
+    AV_ENABLED = True
+except ImportError:
+    AV_ENABLED = False
+
+# Когато потокът не съобщава честота (или съобщава невъзможна).
+DEFAULT_FPS = 25.0
+_TIME_BASE = Fraction(1, 1000)
+
+
+def stream_frame_rate(capture):
+    """Честотата, която потокът обявява, или None, ако стойността е безсмислена (0, 90000 и т.н.)."""
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    return fps if 1.0 <= fps <= 120.0 else None
+
+
+class CaptureClock:
+    """
+    Времето на заснемане (секунди от епохата) на кадрите от един поток. Ако потокът има
+    собствено време (CAP_PROP_POS_MSEC), то се закотвя към часовника с най-малкото
+    забавяне досега, така че кадри, пристигнали наведнъж след мрежово забавяне, запазват
+    реалните си интервали. Без време в потока, при скок назад или при разминаване над
+    MAX_DRIFT секунди се използва часовникът в момента на grab().
+    """
+    MAX_DRIFT = 1.0
+
+    def __init__(self):
+        self._offset = None
+        self._last_position = 0.0
+
+    def stamp(self, capture, grabbed_at):
+        position = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if position <= self._last_position:
+            self._offset = None
+            self._last_position = position
+            return grabbed_at
+        self._last_position = position
+        delay = grabbed_at - position
+        if self._offset is None or delay < self._offset or delay - self._offset > self.MAX_DRIFT:
+            self._offset = delay
+        return position + self._offset
+
+
+class TimestampedVideoWriter:
+    """
+    MP4 с реалното време на всеки кадър (променлива честота) чрез PyAV. Кадрите не се
+    повтарят, за да се запази времето: паузите остават паузи и не се кодират. Кодекът
+    и качеството са като на cv2.VideoWriter с 'mp4v'. Файлът се пише през storage_io
+    (буфериран запис в нишката на диска, fsync според fsync).
+    """
+    def __init__(self, filename, fps, size, start_time, fsync=None):
+        self._start_time = start_time
+        self._last_pts = -1
+        # Файлът се отваря чак при първия пакет; след грешка записът спира като при cv2.VideoWriter.
+        self._is_open = True
+        self._file = get_storage_io().open(filename, fsync)
+        try:
+            self._container = av.open(self._file, "w", format="mp4")
+        except (av.FFmpegError, ValueError):
+            self._file.close()
+            raise
+        try:
+            self._stream = self._container.add_stream("mpeg4", rate=Fraction(fps).limit_denominator(1000))
+            # yuv420p изисква четни размери.
+            self._size = (size[0] & ~1, size[1] & ~1)
+            self._stream.width, self._stream.height = self._size
+            self._stream.pix_fmt = "yuv420p"
+            context = self._stream.codec_context
+            context.time_base = _TIME_BASE
+            context.bit_rate = 2 ** 30
+            context.qmin = context.qmax = 3
+        except (av.FFmpegError, ValueError):
+            self._container.close()
+            self._file.close()
+            raise
+
+    def isOpened(self):
+        return self._is_open
+
+    def write(self, frame, timestamp):
+        """Записва кадъра с времето му. Кадър, който не е след предишния, се пропуска (връща False)."""
+        pts = int(round((timestamp - self._start_time) * 1000))
+        if pts <= self._last_pts:
+            return False
+        self._last_pts = pts
+        if (frame.shape[1], frame.shape[0]) != self._size:
+            frame = frame[:self._size[1], :self._size[0]]
+        video_frame = av.VideoFrame.from_ndarray(np.ascontiguousarray(frame), format="bgr24")
+        video_frame.pts = pts
+        video_frame.time_base = _TIME_BASE
+        try:
+            for packet in self._stream.encode(video_frame):
+                self._container.mux(packet)
+        except (av.FFmpegError, OSError) as e:
+            print(f"Грешка при кодиране на кадър: {e}")
+            self._is_open = False
+            return False
+        return True
+
+    def release(self):
+        try:
+            for packet in self._stream.encode():
+                self._container.mux(packet)
+        except (av.FFmpegError, OSError) as e:
+            print(f"Грешка при завършване на записа: {e}")
+        finally:
+            try:
+                self._container.close()
+            except (av.FFmpegError, OSError) as e:
+                print(f"Грешка при затваряне на записа: {e}")
+            self._file.close()
+
+
+class ConstantRateVideoWriter:
+    """
+    cv2.VideoWriter с постоянна честота, когато PyAV липсва. Всеки кадър отива на
+    мястото, което времето му определя: по-чести кадри се пропускат, а празнина
+    (прекъсване на потока, адаптивен запис) се запълва с предишния кадър. Файлът се пише
+    от OpenCV, затова от fsync се спазва само fsync при затваряне.
+    """
+    def __init__(self, filename, fps, size, start_time, fsync=None):
+        self.filename = filename
+        self.fps = fps
+        self._fsync_mode = (fsync or (FSYNC_NEVER, 0))[0]
+        self._start_time = start_time
+        self._written = 0
+        self._last_frame = None
+        self._writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+    def isOpened(self):
+        return self._writer.isOpened()
+
+    def write(self, frame, timestamp):
+        slot = int((timestamp - self._start_time) * self.fps)
+        if slot < self._written:
+            return False
+        previous = self._last_frame if self._last_frame is not None else frame
+        for _ in range(slot - self._written):
+            self._writer.write(previous)
+        self._writer.write(frame)
+        self._written = slot + 1
+        self._last_frame = frame
+        return True
+
+    def release(self):
+        self._writer.release()
+        if self._fsync_mode != FSYNC_NEVER:
+            get_storage_io().fsync_file(self.filename)
+
+
+def open_video_writer(filename, fps, size, start_time, fsync=None):
+    """
+    Записващ обект с write(кадър, време): с реалното време на кадрите, ако има PyAV, иначе с
+    постоянна честота. fsync е (режим, секунди) от storage_io.camera_fsync_policy().
+    """
+    if AV_ENABLED:
+        try:
+            return TimestampedVideoWriter(filename, fps, size, start_time, fsync)
+        except (av.FFmpegError, ValueError, OSError) as e:
+            print(f"PyAV не може да създаде {filename} ({e}), записът ще бъде с постоянна честота.")
+    return ConstantRateVideoWriter(filename, fps, size, start_time, fsync)
+
+
+def load_frame_times(video_path):
+    """
+    Времето на всеки кадър в секунди от началото на файла (масив по реда на кадрите) или
+    None, ако PyAV липсва или файлът не може да се прочете. Чете само пакетите, без декодиране.
+
+    Времената се връщат както са във файла (pts), без да се изместват към първия кадър:
+    нулата на файла е и нулата на .motion индекса (MotionIndexWriter.start_time).
+    """
+    if not AV_ENABLED:
+        return None
+    try:
+        with av.open(str(video_path)) as container:
+            stream = container.streams.video[0]
+            times = [packet.pts for packet in container.demux(stream) if packet.pts is not None]
+            time_base = float(stream.time_base)
+    except (av.FFmpegError, IndexError, OSError):
+        return None
+    if not times:
+        return None
+    times = np.sort(np.asarray(times, dtype=np.float64)) * time_base
+    # Отрицателни pts (напр. от edit list) се изместват, за да няма кадри преди нулата.
+    return times - min(times[0], 0.0)
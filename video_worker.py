@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 import time
 import uuid
 from pathlib import Path
@@ -8,52 +9,190 @@ import threading
 from PySide6.QtCore import QThread, Signal, QTimer, QTime
 from PySide6.QtGui import QImage
 
+from frame_buffer import FrameRing, iter_pre_event_images
+from motion_detection import BackgroundModelDetector, create_motion_detector
+from motion_index import MotionIndexWriter
+from tamper_detection import TAMPER_STATUS, TamperDetector
+from video_timing import DEFAULT_FPS, CaptureClock, open_video_writer, stream_frame_rate
+
+def segment_filename(filename, index):
+    """Името на сегмент index от сегментиран запис: <име>_000.mp4, <име>_001.mp4, ..."""
+    path = Path(filename)
+    return str(path.with_name(f"{path.stem}_{index:03d}{path.suffix}"))
+
+
 class RecordingWorker(QThread):
     """
-    "Умна" нишка за запис, която поддържа постоянен FPS чрез дублиране/пропускане на кадри.
+    Нишка за запис с прекодиране. Всеки кадър идва с времето на заснемането си и се записва
+    с него (open_video_writer): с PyAV файлът е с променлива честота и повторени кадри не
+    се кодират, а без PyAV празнините се запълват с предишния кадър до постоянна честота.
+    fps е честотата на потока и е само номинална за файла.
+
+    С idle_fps записът е адаптивен: докато няма движение (add_motion), се записват само
+    idle_fps кадъра в секунда, а времето във файла остава реално. idle_scale < 1
+    допълнително намалява детайла на тези кадри.
+
+    С segment_seconds записът е сегментиран: кадърът, с който изтича сегментът, започва
+    нов файл (segment_filename) с нов кодер, т.е. от ключов кадър, без да се губят кадри.
+    Всеки сегмент се съобщава със SegmentStarted и SegmentFinished.
+
+    С encoder_pool кадрите се кодират в процес от EncoderPool, а тази нишка само ги
+    разпределя. Когато кодирането изостава и опашката се напълни, новите кадри се изпускват
+    и се излъчва Backpressure(True); Backpressure(False) идва, щом опашката се изпразни
+    наполовина. stats() дава дълбочината на опашката, изпуснатите кадри и ms за кадър.
+
+    fsync е (режим, секунди) от storage_io.camera_fsync_policy() и се прилага за всеки файл.
     """
-    def __init__(self, filename, width, height, fps):
+    SegmentStarted = Signal(str, float)
+    SegmentFinished = Signal(str, float, float)
+    Backpressure = Signal(bool)
+
+    needs_frames = True
+    # Толкова секунди след последното движение записът остава с пълна честота.
+    IDLE_AFTER = 3.0
+
+    def __init__(self, filename, fps, pre_event=None, idle_fps=None, idle_scale=1.0, segment_seconds=None,
+                 encoder_pool=None, fsync=None):
         super().__init__()
         self.frame_queue = Queue(maxsize=10)
         self._is_running = True
-        self.target_fps = fps
-        self.frame_duration = 1.0 / self.target_fps
-        
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        self._video_writer = cv2.VideoWriter(str(filename), fourcc, self.target_fps, (width, height))
+        self.encoder_pool = encoder_pool
+        self.fsync = fsync
+        self.dropped = 0
+        self._congested = False
+        self._encode_ms = 0.0
+        self.segment_seconds = segment_seconds
+        self._base_filename = str(filename)
+        self._segment = 0
+        # Текущият файл; при сегментиран запис - текущият сегмент.
+        self.filename = segment_filename(filename, 0) if segment_seconds else str(filename)
+        self.fps = fps
+        # Файлът се създава при първия кадър, за да съвпада размерът с потока, от който идва записът.
+        self._video_writer = None
+        # Кадрите от PreEventBuffer, с които започва файлът.
+        self._pre_event = pre_event or []
+        # Началото на индекса на движението е и нулевото време на видеото.
+        self.motion_index = MotionIndexWriter(self.filename, self._pre_event[0][0] if self._pre_event else None)
+        self.idle_fps = idle_fps
+        self.idle_scale = idle_scale
+        # Време на заснемане, като времената на кадрите.
+        self._last_motion = time.time()
+        self._next_idle_frame = 0.0
 
-    def run(self):
-        last_frame = None
-        next_frame_time = time.time()
+    def _open_writer(self, frame, timestamp):
+        # Без кадри преди събитието нулата на файла и на индекса е първият записан кадър.
+        self.motion_index.start(timestamp)
+        height, width = frame.shape[:2]
+        if self.encoder_pool is not None:
+            try:
+                self._video_writer = self.encoder_pool.open_writer(self.filename, self.fps, (width, height), self.motion_index.start_time,
+                                                                 self.fsync)
+            except OSError as e:
+                print(f"Пулът за кодиране не е достъпен ({e}), записът се кодира в тази нишка.")
+                self.encoder_pool = None
+        if self.encoder_pool is None:
+            self._video_writer = open_video_writer(self.filename, self.fps, (width, height), self.motion_index.start_time,
+                                                   self.fsync)
+        if self._pre_event and self._video_writer.isOpened():
+            for timestamp, pre_frame in iter_pre_event_images(self._pre_event, (width, height)):
+                self._video_writer.write(pre_frame, timestamp)
+        self._pre_event = []
+        self.SegmentStarted.emit(self.filename, self.motion_index.start_time)
+
+    def _close_writer(self, skipped, end_time):
+        # Последният пропуснат кадър затваря файла, за да не се скъси продължителността.
+        if skipped is not None:
+            self._write(*skipped)
+        self._video_writer.release()
+        self.motion_index.close()
+        self.SegmentFinished.emit(self.filename, self.motion_index.start_time, end_time)
+
+    def _next_segment(self, timestamp):
+        self._segment += 1
+        self.filename = segment_filename(self._base_filename, self._segment)
+        self.motion_index = MotionIndexWriter(self.filename, timestamp)
+        # Всеки сегмент започва с кадър, дори по време на адаптивен запис.
+        self._next_idle_frame = 0.0
 
+    def run(self):
+        skipped = None
+        last_timestamp = None
         while self._is_running or not self.frame_queue.empty():
             try:
-                frame = self.frame_queue.get(timeout=self.frame_duration)
-                if frame is not None:
-                    last_frame = frame
+                timestamp, frame = self.frame_queue.get(timeout=0.5)
             except Empty:
-                if not self._is_running:
-                    break
-            
-            if last_frame is not None and self._video_writer.isOpened():
-                current_time = time.time()
-                while next_frame_time <= current_time:
-                    try:
-                        self._video_writer.write(last_frame)
-                    except cv2.error as e:
-                        print(f"Грешка при запис на кадър: {e}")
-                    next_frame_time += self.frame_duration
-        
-        if self._video_writer.isOpened():
-            self._video_writer.release()
+                self.motion_index.flush_if_due()
+                continue
+            if self._congested and self.frame_queue.qsize() <= self.frame_queue.maxsize // 2:
+                self._congested = False
+                self.Backpressure.emit(False)
+            if self._video_writer is None:
+                self._open_writer(frame, timestamp)
+            elif self.segment_seconds and timestamp - self.motion_index.start_time >= self.segment_seconds:
+                self._close_writer(skipped, timestamp)
+                skipped = None
+                self._next_segment(timestamp)
+                self._open_writer(frame, timestamp)
+            last_timestamp = timestamp
+            if self.idle_fps and timestamp - self._last_motion > self.IDLE_AFTER:
+                skipped = (frame, timestamp)
+                frame = self._idle_frame(frame, timestamp)
+            if frame is not None:
+                skipped = None
+                self._write(frame, timestamp)
+            self.motion_index.flush_if_due()
+
+        if self._video_writer is not None:
+            self._close_writer(skipped, last_timestamp)
+        else:
+            self.motion_index.close()
         print("Нишката за запис приключи коректно.")
 
-    def add_frame(self, frame):
-        if frame is not None:
+    def _write(self, frame, timestamp):
+        if not self._video_writer.isOpened():
+            return
+        started = time.perf_counter()
+        try:
+            self._video_writer.write(frame, timestamp)
+        except (cv2.error, ValueError) as e:
+            print(f"Грешка при запис на кадър: {e}")
+        if self.encoder_pool is None:
+            encode_ms = (time.perf_counter() - started) * 1000
+            self._encode_ms = 0.9 * self._encode_ms + 0.1 * encode_ms if self._encode_ms else encode_ms
+
+    def _idle_frame(self, frame, timestamp):
+        """Кадърът за записа без движение или None, ако до следващия не се записва нищо."""
+        if timestamp < self._next_idle_frame:
+            return None
+        self._next_idle_frame = timestamp + 1.0 / self.idle_fps
+        if self.idle_scale >= 1.0:
+            return frame
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, None, fx=self.idle_scale, fy=self.idle_scale, interpolation=cv2.INTER_AREA)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    def add_frame(self, frame, timestamp=None):
+        # След stop() се дописват само кадрите, които вече са в опашката.
+        if frame is not None and self._is_running:
             try:
-                self.frame_queue.put_nowait(frame)
+                self.frame_queue.put_nowait((time.time() if timestamp is None else timestamp, frame))
             except Full:
-                pass
+                self.dropped += 1
+                if not self._congested:
+                    self._congested = True
+                    self.Backpressure.emit(True)
+
+    def stats(self):
+        """Кадри в опашката (и в процеса за кодиране), изпуснати кадри и средно ms за кодиране на кадър."""
+        writer = self._video_writer
+        pooled = self.encoder_pool is not None and writer is not None
+        return {"queue_depth": self.frame_queue.qsize() + (writer.pending if pooled else 0),
+                "dropped": self.dropped,
+                "encode_ms": round(writer.encode_ms if pooled else self._encode_ms, 1)}
+
+    def add_motion(self, score, timestamp=None):
+        self._last_motion = time.time() if timestamp is None else timestamp
+        self.motion_index.add(score, timestamp)
 
     def stop(self):
         self._is_running = False
@@ -61,36 +200,69 @@ class RecordingWorker(QThread):
 class VideoWorker(QThread):
     ImageUpdate = Signal(str, QImage)
     StreamStatus = Signal(str, str)
-    MotionDetected = Signal(str)
-    FrameForRecording = Signal(str, object)
+    # (камера, оценка, зона, време на заснемане на кадъра)
+    MotionDetected = Signal(str, float, str, float)
+    TamperDetected = Signal(str, str)
+    PersonDetected = Signal(str, int)
+    # (камера, кадър, от основния поток ли е) - отговор на request_main_frame().
+    MainFrameReady = Signal(str, object, bool)
     
-    def __init__(self, camera_data):
+    def __init__(self, camera_data, frame_mailbox=None, pre_event_pool=None, motion_analyzer=None, person_detector=None):
         super().__init__()
         self.camera_data = camera_data
         self.cam_id = self.camera_data.get("id")
         
-        user = camera_data.get("username")
-        pwd = camera_data.get("password")
-        url = camera_data.get("rtsp_url", "")
-        
-        if user and pwd and "rtsp://" in url:
-            url_parts = url.split("rtsp://")
-            self.rtsp_url = f"rtsp://{user}:{pwd}@{url_parts[1]}"
-        else:
-            self.rtsp_url = url
+        self.rtsp_url = self._build_stream_url(camera_data.get("rtsp_url", ""))
+        substream_url = camera_data.get("substream_url", "")
+        # При зададен подпоток мрежата се захранва от него, а основният поток се отваря само при нужда.
+        self.substream_url = self._build_stream_url(substream_url) if substream_url else None
+        self.is_dual_stream = bool(self.substream_url)
 
         self.frame_queue = Queue(maxsize=2)
         self.motion_enabled = camera_data.get("motion_enabled", True)
-        self.motion_sensitivity = 500
+        self.motion_detector = create_motion_detector(camera_data)
+        # Моделът на фона може да се смята общо за всички камери от BatchMotionAnalyzer.
+        self.motion_analyzer = motion_analyzer if isinstance(self.motion_detector, BackgroundModelDetector) else None
+        self.tamper_detector = TamperDetector() if camera_data.get("tamper_detection", True) else None
+        # Общият PersonDetectorPool проверява за хора само кадрите, в които има движение.
+        self.person_detector = person_detector
         self._is_running = True
-        self._prev_frame_gray = None
-        self.latest_frame = None
-        self.frame_lock = threading.Lock()
+        self._frame_counter = 0
+        # Честотата, която обявяват подпотокът и основният поток (None, докато не са отворени).
+        self.preview_fps = None
+        self.main_fps = None
+        # Пълните кадри (основният поток) и, при двоен поток, кадрите от подпотока.
+        self.frame_ring = FrameRing()
+        self.preview_ring = FrameRing() if self.is_dual_stream else self.frame_ring
         self.processing_thread = threading.Thread(target=self._process_frames, daemon=True)
 
+        self._main_stream_demand = set()
+        self._demand_lock = threading.Lock()
+        self._main_stream_wanted = threading.Event()
+        self._main_frame_event = threading.Event()
+        self._main_stream_live = False
+        # Закачените записи като (ключ, запис). Кортежът се подменя цял при промяна, така че
+        # нишката за обработка го чете без заключване.
+        self._recorders = ()
+        # Размер на плочката, в която се показва камерата; None означава, че никой не я гледа.
+        self._display_size = None
+        # При зададена пощенска кутия кадрите за показване се оставят в нея вместо да се изпраща ImageUpdate.
+        self.frame_mailbox = frame_mailbox
+        self._pre_event_pool = pre_event_pool
+        self.pre_event_buffer = pre_event_pool.create_buffer() if pre_event_pool else None
+        self.main_stream_thread = threading.Thread(target=self._read_main_stream, daemon=True)
+
+    def _build_stream_url(self, url):
+        user = self.camera_data.get("username")
+        pwd = self.camera_data.get("password")
+        if user and pwd and "rtsp://" in url:
+            url_parts = url.split("rtsp://")
+            return f"rtsp://{user}:{pwd}@{url_parts[1]}"
+        return url
+
     def run(self):
         self.StreamStatus.emit(self.cam_id, "Свързване...")
-        cap = cv2.VideoCapture(self.rtsp_url)
+        cap = cv2.VideoCapture(self.substream_url if self.is_dual_stream else self.rtsp_url)
         if not cap.isOpened():
             self.StreamStatus.emit(self.cam_id, "Грешка")
             self._is_running = False
@@ -98,13 +270,22 @@ class VideoWorker(QThread):
             
         self.StreamStatus.emit(self.cam_id, "Свързан")
         
+        self.preview_fps = stream_frame_rate(cap)
+        if not self.is_dual_stream:
+            self.main_fps = self.preview_fps
+        clock = CaptureClock()
+        ring = self.preview_ring
         while self._is_running:
-            ret, frame = cap.read()
+            index, buffer = ring.acquire_write_slot()
+            ret, frame, timestamp = self._read_frame(cap, clock, buffer)
             if not ret:
                 self.StreamStatus.emit(self.cam_id, "Прекъсване")
                 break
+            if index < 0:
+                continue
+            seq = ring.publish(index, frame)
             try:
-                self.frame_queue.put(frame, block=False)
+                self.frame_queue.put((index, seq, timestamp), block=False)
             except Full:
                 pass
             time.sleep(0.005)
@@ -112,52 +293,234 @@ class VideoWorker(QThread):
         self.frame_queue.put(None)
         print(f"Нишката за четене на {self.camera_data.get('name')} приключи.")
 
+    def _read_main_stream(self):
+        """Чете основния поток само докато има заявка за него (запис, снимка, цял екран)."""
+        while self._is_running:
+            if not self._main_stream_wanted.wait(timeout=0.5):
+                continue
+            cap = cv2.VideoCapture(self.rtsp_url)
+            if not cap.isOpened():
+                print(f"Основният поток на {self.camera_data.get('name')} не може да бъде отворен.")
+                cap.release()
+                time.sleep(2)
+                continue
+            print(f"Основният поток на {self.camera_data.get('name')} е отворен.")
+            self.main_fps = stream_frame_rate(cap) or self.main_fps
+            clock = CaptureClock()
+            failed = False
+            while self._is_running and self._main_stream_wanted.is_set():
+                index, buffer = self.frame_ring.acquire_write_slot()
+                ret, frame, timestamp = self._read_frame(cap, clock, buffer)
+                if not ret:
+                    failed = True
+                    break
+                if index < 0:
+                    continue
+                self.frame_ring.publish(index, frame)
+                self._main_stream_live = True
+                self._main_frame_event.set()
+                self._feed_recorders(frame, timestamp)
+                display_size = self._display_size
+                if display_size is not None and "fullscreen" in self._main_stream_demand:
+                    self._emit_display_frame(frame, display_size)
+            self._main_stream_live = False
+            cap.release()
+            print(f"Основният поток на {self.camera_data.get('name')} е затворен.")
+            if failed:
+                # Както при неуспешно отваряне - без пауза прекъснат поток се отваря отново в цикъл.
+                time.sleep(2)
+
+    def _read_frame(self, cap, clock, buffer):
+        """(успех, кадър, време на заснемане). Времето се взима при grab(), преди декодирането."""
+        if not cap.grab():
+            return False, None, None
+        timestamp = clock.stamp(cap, time.time())
+        ret, frame = cap.retrieve(buffer) if buffer is not None else cap.retrieve()
+        return ret, frame, timestamp
+
     def _process_frames(self):
-        frame_counter = 0
+        ring = self.preview_ring
         while self._is_running:
-            frame = self.frame_queue.get()
-            if frame is None: break
-            with self.frame_lock:
-                self.latest_frame = frame.copy()
-            
-            self.FrameForRecording.emit(self.cam_id, frame)
-            
-            display_frame = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
-            frame_counter += 1
-            if self.motion_enabled and frame_counter % 3 == 0:
-                self.handle_motion_detection(display_frame)
-            rgb_image = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-            self.ImageUpdate.emit(self.cam_id, qt_image)
+            item = self.frame_queue.get()
+            if item is None: break
+            index, seq, timestamp = item
+            frame = ring.lease(index, seq)
+            if frame is None:
+                continue
+            try:
+                self._process_frame(frame, timestamp)
+            finally:
+                ring.release(index)
         print(f"Нишката за обработка на {self.camera_data.get('name')} приключи.")
 
-    def handle_motion_detection(self, processed_frame):
-        gray = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2GRAY)
-        if self._prev_frame_gray is None:
-            self._prev_frame_gray = gray
+    def _process_frame(self, frame, timestamp):
+        if not self.is_dual_stream:
+            self._feed_recorders(frame, timestamp)
+
+        if self.pre_event_buffer is not None:
+            self.pre_event_buffer.add(frame, timestamp)
+
+        self._frame_counter += 1
+        if self.motion_enabled and self._frame_counter % 3 == 0:
+            self.handle_motion_detection(frame, timestamp)
+
+        if self.tamper_detector is not None:
+            problem = self.tamper_detector.check(frame)
+            if problem is not None:
+                self.report_tamper(problem)
+
+        display_size = self._display_size
+        if display_size is None:
+            return
+        if self.is_dual_stream and self._main_stream_live and "fullscreen" in self._main_stream_demand:
+            return
+        self._emit_display_frame(frame, display_size)
+
+    def _feed_recorders(self, frame, timestamp):
+        recorders = self._recorders
+        if not recorders:
+            return
+        # Слотът ще бъде презаписан, затова записите получават едно общо копие.
+        frame_copy = frame.copy()
+        for _, recorder in recorders:
+            recorder.add_frame(frame_copy, timestamp)
+
+    def _emit_display_frame(self, frame, display_size):
+        w, h = self._fit_display_size(frame, display_size)
+        # QImage притежава паметта си, така че остава валиден и след като кадърът бъде
+        # презаписан. Преоразмеряването пише направо в него във формата на OpenCV (BGR).
+        qt_image = QImage(w, h, QImage.Format.Format_BGR888)
+        image_view = self._image_view(qt_image)
+        if (w, h) != (frame.shape[1], frame.shape[0]):
+            cv2.resize(frame, (w, h), dst=image_view, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(image_view, frame)
+        if self.frame_mailbox is not None:
+            self.frame_mailbox.post(self.cam_id, qt_image)
+        else:
+            self.ImageUpdate.emit(self.cam_id, qt_image)
+
+    def _image_view(self, qt_image):
+        """NumPy изглед върху паметта на QImage (редовете може да са подравнени с допълнителни байтове)."""
+        h, w = qt_image.height(), qt_image.width()
+        return np.ndarray((h, w, 3), dtype=np.uint8, buffer=qt_image.bits(), strides=(qt_image.bytesPerLine(), 3, 1))
+
+    def _fit_display_size(self, frame, display_size):
+        """Вписва кадъра в плочката, без да го уголемява."""
+        src_h, src_w = frame.shape[:2]
+        scale = min(display_size[0] / src_w, display_size[1] / src_h, 1.0)
+        return max(1, int(src_w * scale)), max(1, int(src_h * scale))
+
+    def handle_motion_detection(self, frame, timestamp):
+        if self.motion_analyzer is not None:
+            self.motion_analyzer.submit(self, self.motion_detector.prepare(frame), timestamp)
             return
-        frame_delta = cv2.absdiff(self._prev_frame_gray, gray)
-        thresh = cv2.threshold(frame_delta, 30, 255, cv2.THRESH_BINARY)[1]
-        motion_pixels = cv2.countNonZero(thresh)
-        if motion_pixels > self.motion_sensitivity / 4: 
-            self.MotionDetected.emit(self.cam_id)
-        self._prev_frame_gray = gray
+        is_motion, score, zone = self.motion_detector.detect(frame)
+        if is_motion:
+            self.report_motion(score, zone, timestamp)
+
+    def report_motion(self, score, zone="", timestamp=None):
+        # Времето на кадъра, за да съвпадне с времената на кадрите в записа и индекса.
+        self.MotionDetected.emit(self.cam_id, score, zone, time.time() if timestamp is None else timestamp)
+        if self.person_detector is not None:
+            self.person_detector.submit(self)
+
+    def report_person(self, count):
+        self.PersonDetected.emit(self.cam_id, count)
+
+    def report_tamper(self, problem):
+        """problem е ключ от TAMPER_STATUS или "", когато картината отново е нормална."""
+        self.StreamStatus.emit(self.cam_id, TAMPER_STATUS.get(problem, "Свързан"))
+        self.TamperDetected.emit(self.cam_id, problem)
 
     def start(self):
         self._is_running = True
         self.processing_thread.start()
+        if self.is_dual_stream:
+            self.main_stream_thread.start()
         super().start()
 
     def stop(self):
         print(f"Подадена команда за спиране на нишките за {self.camera_data.get('name')}")
         self._is_running = False
+        if self.pre_event_buffer is not None:
+            self._pre_event_pool.remove_buffer(self.pre_event_buffer)
+        if self.motion_analyzer is not None:
+            self.motion_analyzer.remove(self.cam_id)
+        if self.person_detector is not None:
+            self.person_detector.remove(self.cam_id)
         try:
             self.frame_queue.put_nowait(None)
         except Full:
             pass
 
+    def set_display_size(self, size):
+        """Абонира камерата за показване в плочка с размер (ширина, височина) или я отписва с None."""
+        self._display_size = tuple(size) if size else None
+
+    def has_frame(self):
+        return self.preview_ring.has_frame()
+
     def get_latest_frame(self):
-        with self.frame_lock:
-            return self.latest_frame.copy() if self.latest_frame is not None else None
\ No newline at end of file
+        """Връща копие на последния пълен кадър (или на кадъра от подпотока, докато основният е затворен)."""
+        ring = self.frame_ring if self._main_stream_live else self.preview_ring
+        return ring.copy_latest()
+
+    def acquire_main_stream(self, reason):
+        """Регистрира нужда от основния поток. Без подпоток основният поток винаги е отворен."""
+        with self._demand_lock:
+            self._main_stream_demand.add(reason)
+            if self.is_dual_stream:
+                self._main_stream_wanted.set()
+
+    def release_main_stream(self, reason):
+        """Освобождава заявката. Основният поток се затваря, когато не остане нито една."""
+        with self._demand_lock:
+            self._main_stream_demand.discard(reason)
+            if self.is_dual_stream and not self._main_stream_demand:
+                self._main_stream_wanted.clear()
+                self._main_frame_event.clear()
+
+    @property
+    def recording_fps(self):
+        """Честотата за запис: на основния поток или, докато той не е отварян, на подпотока."""
+        return self.main_fps or self.preview_fps or DEFAULT_FPS
+
+    def pre_event_frames(self):
+        """Кадрите от последните секунди преди момента на извикване (може да е празен списък)."""
+        return self.pre_event_buffer.snapshot() if self.pre_event_buffer is not None else []
+
+    def attach_recorder(self, key, recorder):
+        """Подава кадрите от основния поток с времето им директно на recorder.add_frame() от нишката на worker-а."""
+        with self._demand_lock:
+            self._recorders = tuple(item for item in self._recorders if item[0] != key) + ((key, recorder),)
+        self.acquire_main_stream(key)
+
+    def detach_recorder(self, key):
+        with self._demand_lock:
+            self._recorders = tuple(item for item in self._recorders if item[0] != key)
+        self.release_main_stream(key)
+
+    def grab_main_frame(self, timeout=5.0):
+        """
+        (кадър, от основния поток ли е), като отваря основния поток временно при нужда. Блокира
+        до timeout секунди; ако потокът не се отвори, кадърът е от подпотока.
+        """
+        if not self.is_dual_stream or self._main_stream_live:
+            return self.get_latest_frame(), True
+        # Отделен ключ за всяка снимка, за да не освободи едновременна снимка потока на другата.
+        reason = f"snapshot-{uuid.uuid4()}"
+        self.acquire_main_stream(reason)
+        try:
+            self._main_frame_event.clear()
+            is_main = self._main_frame_event.wait(timeout)
+            return self.get_latest_frame(), is_main
+        finally:
+            self.release_main_stream(reason)
+
+    def request_main_frame(self, timeout=5.0):
+        """grab_main_frame() във фонова нишка; резултатът идва с MainFrameReady."""
+        def grab():
+            frame, is_main = self.grab_main_frame(timeout)
+            self.MainFrameReady.emit(self.cam_id, frame, is_main)
+        threading.Thread(target=grab, daemon=True).start()
\ No newline at end of file